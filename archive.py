@@ -0,0 +1,48 @@
+from threading import Lock
+import os
+
+SEPARATOR = '\t'
+
+class ArchiveError(IOError): pass
+
+class archive:
+    """
+    Append only index of finished downloads, one 'id<TAB>itag<TAB>path'
+    line per video. The whole index is kept in a dict for O(1) lookups.
+    """
+
+    def __init__(self, path:str) -> None:
+        self.__path:str = path
+        self.__lock:Lock = Lock()
+        self.__entries:dict = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split(SEPARATOR, 2)
+                    if not parts[0]: continue
+                    parts += [None] * (3 - len(parts))
+                    self.__entries[parts[0]] = (parts[1], parts[2])
+        except FileNotFoundError:
+            pass
+        except (OSError, UnicodeDecodeError) as e:
+            raise ArchiveError(f'Unable to read archive {path}: {e}') from e
+
+    @property
+    def path(self) -> str: return self.__path
+
+    def __contains__(self, vid:str) -> bool: return vid in self.__entries
+
+    def __len__(self) -> int: return len(self.__entries)
+
+    def __getitem__(self, vid:str) -> tuple: return self.__entries[vid]
+
+    def add(self, vid:str, itag, path:str) -> None:
+        line = SEPARATOR.join([vid, str(itag), path.replace('\n', ' ')]) + '\n'
+        with self.__lock:
+            try:
+                directory = os.path.dirname(self.__path)
+                if directory: os.makedirs(directory, exist_ok=True)
+                with open(self.__path, 'a', encoding='utf-8') as f: f.write(line)
+            except OSError as e:
+                raise ArchiveError(f'Unable to write archive {self.__path}: {e}') from e
+            self.__entries[vid] = (str(itag), path)
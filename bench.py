@@ -0,0 +1,106 @@
+from argparse import ArgumentParser
+import platform
+import json
+import sys
+import os
+
+DEFAULT_TOLERANCE = 0.25
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baselines.json')
+
+# Metrics where a bigger number is better, everything else should shrink
+HIGHER_IS_BETTER = ['mb_per_s', 'ops_per_s']
+
+class BenchError(ValueError): pass
+
+def load_baselines(path:str=BASELINE_FILE) -> dict:
+    try:
+        with open(path, 'r') as f: return json.load(f)
+    except FileNotFoundError: return {}
+    except (OSError, ValueError) as e:
+        raise BenchError(f'Unable to read baselines {path}: {e}') from e
+
+def save_baselines(suite:str, results:dict, path:str=BASELINE_FILE) -> None:
+    baselines = load_baselines(path)
+    baselines[suite] = {'machine': machine(), 'results': results}
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f: json.dump(baselines, f, indent=1, sort_keys=True); f.write('\n')
+    os.replace(tmp, path)
+
+def machine() -> dict:
+    return {'python': platform.python_version(), 'system': platform.system(), \
+        'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+def compare(results:dict, baseline:dict, tolerance:float=DEFAULT_TOLERANCE) -> list:
+    """
+    Return (scenario, metric, baseline, current) for every metric that got
+    worse than its baseline by more than tolerance.
+    """
+    regressions = []
+    for scenario, current in results.items():
+        for metric, value in current.items():
+            base = baseline.get(scenario, {}).get(metric)
+            if not isinstance(base, (int, float)) or not isinstance(value, (int, float)) or not base:
+                continue
+            change = (base - value) / base if metric in HIGHER_IS_BETTER else (value - base) / base
+            if change > tolerance: regressions.append((scenario, metric, base, value))
+    return regressions
+
+def median(runs:list) -> dict:
+    """
+    Merge the results of repeated runs, keeping the median of each metric.
+    """
+    merged = {}
+    for metric in runs[0]:
+        values = sorted(r[metric] for r in runs if r.get(metric) is not None)
+        merged[metric] = values[len(values) // 2] if values else None
+    return merged
+
+def table(results:dict) -> str:
+    metrics = []
+    for current in results.values():
+        metrics += [m for m in current if m not in metrics]
+    rows = [['scenario'] + metrics]
+    for scenario, current in results.items():
+        rows.append([scenario] + [_format(current.get(m)) for m in metrics])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return '\n'.join('  '.join(cell.rjust(w) if i else cell.ljust(w) \
+        for i, (cell, w) in enumerate(zip(row, widths))) for row in rows)
+
+def _format(value) -> str:
+    if value is None: return '-'
+    if isinstance(value, float): return f'{value:.4g}'
+    return str(value)
+
+def arguments(description:str) -> ArgumentParser:
+    parser = ArgumentParser(description=description)
+    parser.add_argument('scenarios', nargs='*', help='scenarios to run (default: all)')
+    parser.add_argument('--json', metavar='PATH', help='write the results as JSON ("-" for stdout)')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--baseline', metavar='PATH', default=BASELINE_FILE, help='baseline file')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scenario, the median is kept')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, \
+        help='allowed slowdown before a result counts as a regression (default 0.25)')
+    return parser
+
+def report(suite:str, results:dict, args) -> int:
+    """
+    Print results, store or compare them with the baseline and return the
+    exit status, 1 when something regressed.
+    """
+    document = {'suite': suite, 'machine': machine(), 'results': results}
+    if args.json == '-': json.dump(document, sys.stdout, indent=1); print()
+    else:
+        print(table(results))
+        if args.json:
+            with open(args.json, 'w') as f: json.dump(document, f, indent=1)
+    if args.save:
+        save_baselines(suite, results, args.baseline)
+        return 0
+    stored = load_baselines(args.baseline).get(suite)
+    if not stored: return 0
+    if stored.get('machine') != machine():
+        print('note: baseline was recorded on a different machine', file=sys.stderr)
+    regressions = compare(results, stored['results'], args.tolerance)
+    for scenario, metric, base, value in regressions:
+        print(f'REGRESSION {scenario} {metric}: {_format(base)} -> {_format(value)}', file=sys.stderr)
+    return 1 if regressions else 0
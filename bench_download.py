@@ -0,0 +1,187 @@
+"""
+Offline benchmark of the download path: ytdl runs against a local HTTP
+server serving synthetic videos, with pytube's extractor and playlist
+pages replaced by stubs. Every scenario runs in a fresh interpreter so
+peak memory is measured per scenario.
+
+    python3 bench_download.py [scenario ...] [--json PATH] [--save] [--repeat N]
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+import contextlib
+import subprocess
+import tempfile
+import json
+import time
+import sys
+import io
+import os
+import bench
+
+BLOCK_SIZE = 64 << 10
+MiB = 1 << 20
+
+# name -> videos, size of each, server latency and per-connection rate,
+# extractor latency, ytdl arguments and whether links come from a playlist
+SCENARIOS = {
+    'single': {'videos': 1, 'size': 64*MiB, 'latency': 0.01, 'argv': []},
+    'single-throttled': {'videos': 1, 'size': 16*MiB, 'latency': 0.01, 'rate': 8*MiB, 'argv': []},
+    'batch': {'videos': 32, 'size': 2*MiB, 'latency': 0.01, 'extract': 0.02, 'argv': ['-j', '4']},
+    'playlist': {'videos': 48, 'size': MiB // 2, 'latency': 0.02, 'extract': 0.02, \
+        'playlist': True, 'argv': ['-j', '4']},
+}
+
+_PATTERN = memoryview(bytes(range(256)) * (BLOCK_SIZE // 256))
+
+class _handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args): pass
+
+    def do_GET(self):
+        # /v/<id>/<size>
+        try: size = int(self.path.split('?')[0].rsplit('/', 1)[1])
+        except (IndexError, ValueError):
+            self.send_error(404); return
+        time.sleep(self.server.latency)
+        start, end = 0, size - 1
+        if self.headers.get('Range', '').startswith('bytes='):
+            first, _, last = self.headers['Range'][6:].partition('-')
+            start, end = int(first), min(int(last) if last else end, end)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        left = end - start + 1
+        try:
+            while left:
+                block = _PATTERN[:min(left, BLOCK_SIZE)]
+                self.wfile.write(block)
+                left -= len(block)
+                if self.server.rate: time.sleep(len(block) / self.server.rate)
+        except (ConnectionError, BrokenPipeError):
+            pass
+
+def serve(latency:float=0.0, rate:float=None) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _handler)
+    server.daemon_threads = True
+    server.latency = latency; server.rate = rate
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _video_id(index:int) -> str: return f'bench{index:06d}'
+
+def install_stubs(base:str, size:int, extract:float=0.0, page:int=100) -> None:
+    """
+    Replace pytube.YouTube and pytube.Playlist with stand-ins that answer
+    from base after extract seconds, without talking to YouTube.
+    """
+    import pytube
+    from pytube.monostate import Monostate
+
+    class youtube:
+        def __init__(self, url:str, *args, **kwargs) -> None:
+            time.sleep(extract)
+            self.video_id = pytube.extract.video_id(url)
+            self.title = f'Video {self.video_id}'
+            self.length = 60
+            monostate = Monostate(None, None, self.title, self.length)
+            self.streams = pytube.StreamQuery([pytube.Stream({
+                'url': f'{base}/v/{self.video_id}/{size}?expire={int(time.time()) + 3600}',
+                'itag': 22, 'mimeType': 'video/mp4; codecs="avc1.64001F, mp4a.40.2"',
+                'is_otf': False, 'bitrate': 1000, 'contentLength': size}, monostate)])
+
+    class playlist:
+        def __init__(self, url:str, *args, **kwargs) -> None:
+            self.count = int(url.rsplit('=', 1)[1].split('-')[1])
+
+        def url_generator(self):
+            for i in range(self.count):
+                if i % page == 0: time.sleep(extract)
+                yield f'https://www.youtube.com/watch?v={_video_id(i)}'
+
+    pytube.YouTube = youtube
+    pytube.Playlist = playlist
+
+def worker(config:dict) -> dict:
+    """
+    Run ytdl once inside this process and measure it.
+    """
+    import resource
+    import metrics
+    import options
+    import ytdl
+
+    install_stubs(config['base'], config['size'], config.get('extract', 0.0))
+    first = []
+    received = metrics.transfer.__call__
+    def first_byte(self, *args):
+        first.append(time.perf_counter())
+        metrics.transfer.__call__ = received
+        received(self, *args)
+    metrics.transfer.__call__ = first_byte
+
+    sys.argv = ['ytdl.py', '-N', '-t', config['target']] + config['argv']
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        options.exec()
+        ytdl.main()
+    elapsed = time.perf_counter() - start
+
+    snap = ytdl.stats.snapshot()
+    done = snap['stages']['download']['count']
+    other = sum(s['seconds_total'] for name, s in snap['stages'].items() if name != 'download')
+    return {
+        'mb_per_s': snap['bytes_received'] / MiB / elapsed,
+        'ttfb_ms': (first[0] - start) * 1000 if first else None,
+        'item_overhead_ms': other / done * 1000 if done else None,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'seconds': elapsed,
+        'videos': done,
+    }
+
+def run(name:str, scenario:dict) -> dict:
+    server = serve(scenario.get('latency', 0.0), scenario.get('rate'))
+    try:
+        with tempfile.TemporaryDirectory() as target:
+            count = scenario['videos']
+            argv = list(scenario['argv'])
+            if scenario.get('playlist'):
+                argv += ['-p', f'youtube.com/playlist?list=bench-{count}']
+            elif count == 1:
+                argv += ['-s', _video_id(0)]
+            else:
+                links = os.path.join(target, 'links.txt')
+                with open(links, 'w') as f: f.writelines(f'{_video_id(i)}\n' for i in range(count))
+                argv += ['-f', links]
+            config = {'base': f'http://127.0.0.1:{server.server_port}', 'size': scenario['size'], \
+                'extract': scenario.get('extract', 0.0), 'target': target, 'argv': argv}
+            env = dict(os.environ, XDG_CACHE_HOME=target, XDG_DATA_HOME=target)
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', \
+                json.dumps(config)], stdout=subprocess.PIPE, env=env, cwd=target)
+            if result.returncode != 0:
+                raise bench.BenchError(f'Scenario {name} failed with status {result.returncode}')
+            return json.loads(result.stdout)
+    finally:
+        server.shutdown(); server.server_close()
+
+def main() -> int:
+    args = bench.arguments('Benchmark the ytdl download path against a local server.').parse_args()
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown: sys.exit(f'Unknown scenario: {", ".join(unknown)} (choose from {", ".join(SCENARIOS)})')
+    try:
+        results = {name: bench.median([run(name, SCENARIOS[name]) \
+            for _ in range(max(args.repeat, 1))]) for name in names}
+        return bench.report('download', results, args)
+    except bench.BenchError as e:
+        sys.exit(str(e))
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--worker']:
+        print(json.dumps(worker(json.loads(sys.argv[2]))))
+    else:
+        sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Benchmark of the option parser on the startup path: registering options,
+translating and running argv, rendering the help and a cold start of
+"python3 ytdl.py -h".
+
+    python3 bench_options.py [scenario ...] [--json PATH] [--save] [--repeat N]
+"""
+from contextlib import contextmanager
+import subprocess
+import timeit
+import time
+import sys
+import os
+import bench
+import options
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+REGISTERED = [10, 100, 1000, 10000]
+ARGV_LENGTHS = [10, 1000, 10000]
+ARGV_OPTIONS = 100
+PARSE_ARGS = 1000
+
+def _take(*links): pass
+
+@contextmanager
+def registered(count:int):
+    """
+    Swap in an option set holding -s/--source plus count-1 filler options,
+    the real set is put back afterwards.
+    """
+    saved = options._opt_set
+    options._opt_set = options.option_set()
+    try:
+        register(count)
+        yield options._opt_set
+    finally:
+        options._opt_set = saved
+
+def register(count:int) -> None:
+    options.func_option('s', 'source', _take)
+    for i in range(1, count):
+        options.func_option(f'o{i}', f'option-{i}', _take)
+
+def _per_call(func) -> float:
+    """
+    Milliseconds per call of func, timed over enough calls to last 0.2s.
+    Calls slower than a second are timed only once.
+    """
+    timer = timeit.Timer(func)
+    number, taken = timer.autorange()
+    if taken >= 1.0: return taken / number * 1000
+    return min(timer.repeat(3, number)) / number * 1000
+
+def bench_register(count:int) -> dict:
+    def run():
+        with registered(count): pass
+    return {'ms': _per_call(run)}
+
+def bench_parse(count:int, links:int) -> dict:
+    argv = ['ytdl.py'] + ['-s', 'youtube.com/watch?v=aaaaaaaaaaa'] * (links // 2)
+    saved = sys.argv
+    def run():
+        params = options._sys_arg_translator()
+        params.translate()
+        params.run()
+    try:
+        sys.argv = argv
+        with registered(count): ms = _per_call(run)
+    finally:
+        sys.argv = saved
+    return {'ms': ms, 'us_per_arg': ms * 1000 / (len(argv) - 1)}
+
+def bench_help(count:int) -> dict:
+    def run():
+        try: options.show_help()
+        except SystemExit: pass
+    with registered(count):
+        options.func_option('h', 'help', options.show_help)
+        return {'ms': _per_call(run)}
+
+def bench_startup(argv:list) -> dict:
+    command = [sys.executable, os.path.join(HERE, 'ytdl.py')] + argv
+    runs = []
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=HERE)
+        runs.append((time.perf_counter() - start) * 1000)
+    return {'ms': sorted(runs)[len(runs) // 2]}
+
+SCENARIOS = {}
+for n in REGISTERED:
+    SCENARIOS[f'register-{n}'] = (bench_register, n)
+    SCENARIOS[f'parse-{n}opts-{PARSE_ARGS}args'] = (bench_parse, n, PARSE_ARGS)
+for k in ARGV_LENGTHS:
+    SCENARIOS[f'parse-{ARGV_OPTIONS}opts-{k}args'] = (bench_parse, ARGV_OPTIONS, k)
+for n in REGISTERED:
+    SCENARIOS[f'help-{n}'] = (bench_help, n)
+SCENARIOS['startup-help'] = (bench_startup, ['-h'])
+
+def main() -> int:
+    args = bench.arguments('Benchmark option parsing and startup of ytdl.').parse_args()
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown: sys.exit(f'Unknown scenario: {", ".join(unknown)} (choose from {", ".join(SCENARIOS)})')
+    results = {}
+    for name in names:
+        func, *params = SCENARIOS[name]
+        results[name] = bench.median([func(*params) for _ in range(max(args.repeat, 1))])
+    return bench.report('options', results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+from threading import Lock
+import time
+import os
+import lazy
+
+json = lazy.module('json')
+
+DEFAULT_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', \
+    os.path.join(os.path.expanduser('~'), '.cache')), 'ytdl')
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAX_SIZE = 64 << 20
+# Signed urls are dropped a bit before they really expire
+EXPIRY_MARGIN = 5 * 60
+
+ENTRY_EXT = '.json'
+
+class CacheError(IOError): pass
+
+class metadata_cache:
+    """
+    Video metadata stored as one small json file per video id. Entries
+    expire after ttl seconds or when their signed urls do, and the least
+    recently used ones are evicted once the directory outgrows max_size.
+    """
+
+    def __init__(self, path:str=DEFAULT_DIR, ttl:int=DEFAULT_TTL, max_size:int=DEFAULT_MAX_SIZE) -> None:
+        self.__path:str = path
+        self.__ttl:int = ttl
+        self.__max_size:int = max_size
+        self.__lock:Lock = Lock()
+        self.__index:dict = None
+        self.__size:int = 0
+
+    @property
+    def path(self) -> str: return self.__path
+
+    @property
+    def size(self) -> int:
+        with self.__lock:
+            self._load_index()
+            return self.__size
+
+    def _file(self, video_id:str) -> str:
+        return os.path.join(self.__path, video_id + ENTRY_EXT)
+
+    def _load_index(self) -> None:
+        # name -> [size, last use]; read once, then kept in step with writes
+        if self.__index is not None: return
+        self.__index = {}; self.__size = 0
+        try: entries = os.scandir(self.__path)
+        except FileNotFoundError: return
+        with entries:
+            for e in entries:
+                if not e.name.endswith(ENTRY_EXT) or not e.is_file(): continue
+                st = e.stat()
+                self.__index[e.name[:-len(ENTRY_EXT)]] = [st.st_size, st.st_mtime]
+                self.__size += st.st_size
+
+    def _drop(self, video_id:str) -> None:
+        if video_id in self.__index:
+            self.__size -= self.__index.pop(video_id)[0]
+        try: os.remove(self._file(video_id))
+        except FileNotFoundError: pass
+
+    def _evict(self) -> None:
+        if self.__size <= self.__max_size: return
+        for video_id, _ in sorted(self.__index.items(), key=lambda x: x[1][1]):
+            self._drop(video_id)
+            if self.__size <= self.__max_size: return
+
+    def get(self, video_id:str) -> dict:
+        with self.__lock:
+            self._load_index()
+            if video_id not in self.__index: return None
+            try:
+                with open(self._file(video_id), 'r') as f: entry = json.load(f)
+            except (OSError, ValueError):
+                self._drop(video_id); return None
+            now = time.time()
+            if now >= entry.get('expires', 0):
+                self._drop(video_id); return None
+            self.__index[video_id][1] = now
+            try: os.utime(self._file(video_id), (now, now))
+            except OSError: pass
+            return entry
+
+    def put(self, video_id:str, entry:dict, expires:float=None) -> None:
+        """
+        Store entry for video_id, expires is the earliest expiry of the
+        signed urls inside it.
+        """
+        now = time.time()
+        entry = dict(entry, id=video_id, stored=now, \
+            expires=min(now + self.__ttl, (expires or float('inf')) - EXPIRY_MARGIN))
+        data = json.dumps(entry).encode()
+        with self.__lock:
+            self._load_index()
+            try:
+                os.makedirs(self.__path, exist_ok=True)
+                tmp = self._file(video_id) + '.tmp'
+                with open(tmp, 'wb') as f: f.write(data)
+                os.replace(tmp, self._file(video_id))
+            except OSError as e:
+                raise CacheError(f'Unable to write cache entry {video_id}: {e}') from e
+            if video_id in self.__index: self.__size -= self.__index[video_id][0]
+            self.__index[video_id] = [len(data), now]
+            self.__size += len(data)
+            self._evict()
+
+    def remove(self, video_id:str) -> None:
+        with self.__lock:
+            self._load_index()
+            self._drop(video_id)
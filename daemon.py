@@ -0,0 +1,415 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.client import HTTPConnection
+from threading import Lock, Condition, Event, Thread
+from queue import Queue
+import socketserver
+import itertools
+import tempfile
+import secrets
+import hmac
+import socket
+import stat
+import json
+import time
+import os
+import pipeline
+
+MAX_FINISHED = 1000
+# Jobs a client sends per request, it waits for one batch while the next runs
+SUBMIT_BATCH = 100
+WAIT_LIMIT = 30.0
+
+QUEUED, CANCELLED, DONE, FAILED = 'queued', 'cancelled', 'done', 'failed'
+FINAL = [CANCELLED, DONE, FAILED]
+
+class DaemonError(IOError): pass
+class UnknownJob(DaemonError): pass
+class Cancelled(Exception): pass
+
+def _runtime_file(suffix:str) -> str:
+    runtime = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime, f'ytdl-{os.getuid() if hasattr(os, "getuid") else "user"}{suffix}')
+
+def default_address() -> str: return _runtime_file('.sock')
+
+def token_path(port:int) -> str:
+    """
+    File with the token of the daemon on localhost port, only its owner
+    can read it.
+    """
+    return _runtime_file(f'-{port}.token')
+
+def _write_token(port:int) -> str:
+    token = secrets.token_hex(16)
+    path = token_path(port)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.ytdl-')
+    try:
+        with os.fdopen(fd, 'w') as f: f.write(token)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp); raise
+    return token
+
+def _read_token(port:int) -> str:
+    try:
+        with open(token_path(port)) as f: return f.read().strip()
+    except OSError as e:
+        raise DaemonError(f'No token of a ytdl daemon on port {port}: {e}') from e
+
+def parse_address(address:str):
+    """
+    'host:port' or ':port' is a TCP address on localhost, anything else
+    is the path of a Unix socket.
+    """
+    address = address or default_address()
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        # Jobs name any target directory, other machines must not send them
+        if host not in ['', 'localhost'] and not host.startswith('127.'):
+            raise DaemonError(f'Only localhost can be used for TCP, not {host}')
+        return (host or '127.0.0.1', int(port))
+    return address
+
+class job:
+    __slots__ = ('id', 'url', 'resolution', 'audio', 'target', 'format', 'output', 'audio_format', \
+        'audio_bitrate', 'dash', 'state', 'title', 'path', 'itag', 'error', 'kind', 'submitted', 'finished', \
+        'cancel')
+
+    def __init__(self, id:str, url:str, resolution:str=None, audio:bool=None, target:str=None, \
+        format:str=None, output:str=None, audio_format:str=None, audio_bitrate:str=None, \
+        dash:bool=None) -> None:
+        self.id:str = id
+        self.url:str = url
+        self.resolution:str = resolution
+        self.audio:bool = audio
+        self.target:str = target
+        self.format:str = format
+        self.output:str = output
+        self.audio_format:str = audio_format
+        self.audio_bitrate:str = audio_bitrate
+        self.dash:bool = dash
+        self.state:str = QUEUED
+        self.title:str = None
+        self.path:str = None
+        self.itag:int = None
+        self.error:str = None
+        self.kind:str = None
+        self.submitted:float = time.time()
+        self.finished:float = None
+        self.cancel:Event = Event()
+
+    @property
+    def done(self) -> bool: return self.state in FINAL
+
+    def info(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'cancel'}
+
+class job_server:
+    """
+    Runs submitted jobs through one long-lived pipeline, so connections,
+    caches and concurrency limits are shared by every caller.
+
+    make_item(job) builds the value the stages work on, finish(job, value)
+    records a finished one, describe(stage, error) turns a failure into
+    its message and classify(error) into its kind.
+    """
+
+    def __init__(self, stages:list, make_item, finish, describe, classify=None, \
+        queue_size:int=pipeline.DEFAULT_QUEUE_SIZE) -> None:
+        self.__stages:list = [pipeline.stage(st.name, self._step(st), st.workers) for st in stages]
+        self.__make_item = make_item
+        self.__finish = finish
+        self.__describe = describe
+        self.__classify = classify
+        self.__queue_size:int = queue_size
+        self.__incoming:Queue = Queue()
+        self.__jobs:dict = {}
+        self.__lock:Lock = Lock()
+        self.__changed:Condition = Condition(self.__lock)
+        self.__ids = itertools.count(1)
+        self.__pipe:pipeline.pipeline = None
+
+    def _step(self, st:pipeline.stage):
+        def run(entry):
+            task, value = entry
+            if task.cancel.is_set(): raise Cancelled(task.id)
+            self._set(task, st.name)
+            return task, st.func(value)
+        return run
+
+    def _set(self, task:job, state:str, **fields) -> None:
+        with self.__changed:
+            if task.done: return
+            task.state = state
+            for name, value in fields.items(): setattr(task, name, value)
+            if task.done:
+                task.finished = time.time()
+                self._forget()
+            self.__changed.notify_all()
+
+    def _forget(self) -> None:
+        finished = [j for j in self.__jobs.values() if j.done]
+        for old in sorted(finished, key=lambda j: j.finished)[:max(len(finished) - MAX_FINISHED, 0)]:
+            del self.__jobs[old.id]
+
+    def submit(self, url:str, resolution:str=None, audio:bool=None, target:str=None, format:str=None, \
+        output:str=None, audio_format:str=None, audio_bitrate:str=None, dash:bool=None) -> job:
+        """
+        Queue a job, the options left out are the daemon's own.
+        """
+        with self.__lock:
+            task = job(str(next(self.__ids)), url, resolution, audio, target, format, output, \
+                audio_format, audio_bitrate, dash)
+            self.__jobs[task.id] = task
+        self.__incoming.put(task)
+        return task
+
+    def get(self, id:str) -> job:
+        with self.__lock: return self.__jobs.get(id)
+
+    def jobs(self) -> list:
+        with self.__lock: return list(self.__jobs.values())
+
+    def wait(self, id:str, timeout:float) -> job:
+        """
+        Return job id once it is finished or timeout seconds passed.
+        """
+        deadline = time.monotonic() + timeout
+        with self.__changed:
+            while (task := self.__jobs.get(id)) is not None and not task.done:
+                left = deadline - time.monotonic()
+                if left <= 0: break
+                self.__changed.wait(left)
+            return task
+
+    def cancel(self, id:str) -> job:
+        task = self.get(id)
+        if task is None: return None
+        task.cancel.set()
+        # Queued jobs end right away, running ones stop at their next chunk or stage
+        if task.state == QUEUED: self._set(task, CANCELLED)
+        return task
+
+    def depths(self) -> dict:
+        return self.__pipe.depths() if self.__pipe is not None else {}
+
+    def _source(self):
+        while (task := self.__incoming.get()) is not None:
+            if task.cancel.is_set(): continue
+            try: value = self.__make_item(task)
+            except Exception as e:
+                self._set(task, FAILED, error=str(e)); continue
+            yield task, value
+
+    def run(self) -> None:
+        """
+        Work on submitted jobs until stop is called.
+        """
+        self.__pipe = pipeline.pipeline(self.__stages, self.__queue_size)
+        for it in self.__pipe.run(self._source(), ordered=False):
+            if it.stage == 'source': raise it.error
+            task, value = it.source if not it.ok else it.value
+            if not it.ok and (isinstance(it.error, Cancelled) or task.cancel.is_set()):
+                self._set(task, CANCELLED)
+            elif not it.ok:
+                self._set(task, FAILED, error=self.__describe(it.stage, it.error), \
+                    kind=self.__classify(it.error) if self.__classify else None)
+            else:
+                try: self.__finish(task, value)
+                except Exception as e:
+                    self._set(task, FAILED, error=str(e)); continue
+                self._set(task, DONE)
+
+    def stop(self) -> None:
+        self.__incoming.put(None)
+        if self.__pipe is not None: self.__pipe.stop()
+
+class _handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args): pass
+
+    def _reply(self, status:int, body) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self) -> tuple:
+        path, _, query = self.path.partition('?')
+        parts = [p for p in path.split('/') if p]
+        params = dict(p.partition('=')[::2] for p in query.split('&') if p)
+        if not parts or parts[0] != 'jobs' or len(parts) > 2: return None, None, params
+        return True, (parts[1] if len(parts) == 2 else None), params
+
+    def _allowed(self) -> bool:
+        """
+        Only callers that read the token file may use a TCP daemon, so web
+        pages open in a browser on this machine cannot send it jobs.
+        """
+        token = self.server.token
+        if token is None: return True
+        if hmac.compare_digest(self.headers.get('Authorization', ''), f'Bearer {token}'): return True
+        self._reply(403, {'error': 'Missing or wrong token'})
+        return False
+
+    def do_GET(self):
+        if not self._allowed(): return
+        ok, id, params = self._route()
+        jobs:job_server = self.server.jobs
+        if not ok: self._reply(404, {'error': 'Not found'}); return
+        if id is None: self._reply(200, [j.info() for j in jobs.jobs()]); return
+        try: wait = min(float(params.get('wait', 0)), WAIT_LIMIT)
+        except ValueError: wait = 0
+        task = jobs.wait(id, wait) if wait > 0 else jobs.get(id)
+        if task is None: self._reply(404, {'error': f'No job {id}'}); return
+        self._reply(200, task.info())
+
+    def do_POST(self):
+        if not self._allowed(): return
+        ok, id, _ = self._route()
+        if not ok or id is not None: self._reply(404, {'error': 'Not found'}); return
+        if self.headers.get_content_type() != 'application/json':
+            self._reply(415, {'error': 'Jobs are sent as application/json'}); return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+            specs = body if isinstance(body, list) else [body]
+            tasks = [self.server.jobs.submit(s['url'], s.get('resolution'), s.get('audio'), s.get('target'), \
+                s.get('format'), s.get('output'), s.get('audio_format'), s.get('audio_bitrate'), \
+                s.get('dash')) for s in specs]
+        except (ValueError, TypeError, KeyError) as e:
+            self._reply(400, {'error': f'Expected {{"url": ...}} jobs: {e}'}); return
+        self._reply(201, [t.info() for t in tasks])
+
+    def do_DELETE(self):
+        if not self._allowed(): return
+        ok, id, _ = self._route()
+        task = self.server.jobs.cancel(id) if ok and id else None
+        if task is None: self._reply(404, {'error': f'No job {id}'}); return
+        self._reply(200, task.info())
+
+class _unix_server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        _remove_stale(self.server_address)
+        # Only the owner may submit jobs
+        mask = os.umask(0o177)
+        try: super().server_bind()
+        finally: os.umask(mask)
+        self.inode = os.stat(self.server_address).st_ino
+
+def _remove_stale(path:str) -> None:
+    """
+    Remove the socket a daemon left behind, anything else at path stays.
+    """
+    try: mode = os.stat(path).st_mode
+    except FileNotFoundError: return
+    if not stat.S_ISSOCK(mode): raise DaemonError(f'{path} exists and is not a socket')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try: probe.connect(path)
+        except OSError: os.remove(path); return
+    raise DaemonError(f'A daemon is already listening on {path}')
+
+def listen(address:str, jobs:job_server):
+    """
+    Start serving the job API of jobs on address, returns the server.
+    """
+    target = parse_address(address)
+    try:
+        server = _unix_server(target, _handler) if isinstance(target, str) \
+            else ThreadingHTTPServer(target, _handler)
+    except OSError as e:
+        raise DaemonError(f'Unable to listen on {address or target}: {e}') from e
+    server.daemon_threads = True
+    server.jobs = jobs
+    server.address = server.server_address if isinstance(target, str) else '%s:%d' % server.server_address[:2]
+    try: server.token = None if isinstance(target, str) else _write_token(server.server_address[1])
+    except OSError as e:
+        server.server_close()
+        raise DaemonError(f'Unable to write the token of {server.address}: {e}') from e
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def close(server) -> None:
+    server.shutdown()
+    server.server_close()
+    if isinstance(server.server_address, str):
+        # Only the socket this server made, not one a later daemon bound there
+        try:
+            if os.stat(server.server_address).st_ino == server.inode: os.remove(server.server_address)
+        except FileNotFoundError: pass
+    else:
+        path = token_path(server.server_address[1])
+        try:
+            with open(path) as f: mine = f.read().strip() == server.token
+            if mine: os.remove(path)
+        except FileNotFoundError: pass
+
+class _unix_connection(HTTPConnection):
+    def __init__(self, path:str, timeout:float) -> None:
+        super().__init__('localhost', timeout=timeout)
+        self.__path:str = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.__path)
+
+class client:
+    """
+    Talks to a running "ytdl --serve" over one kept-alive connection.
+    """
+
+    def __init__(self, address:str=None, timeout:float=WAIT_LIMIT + 10) -> None:
+        self.__target = parse_address(address)
+        self.__timeout:float = timeout
+        self.__token:str = None if isinstance(self.__target, str) else _read_token(self.__target[1])
+        self.__conn:HTTPConnection = None
+
+    def _connection(self) -> HTTPConnection:
+        if self.__conn is None:
+            target = self.__target
+            self.__conn = _unix_connection(target, self.__timeout) if isinstance(target, str) \
+                else HTTPConnection(*target, timeout=self.__timeout)
+        return self.__conn
+
+    def _call(self, method:str, path:str, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data else {}
+        if self.__token is not None: headers['Authorization'] = f'Bearer {self.__token}'
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+                reply = json.loads(response.read() or b'null')
+                break
+            except (ConnectionError, socket.timeout, OSError, ValueError) as e:
+                conn.close(); self.__conn = None
+                if attempt or not isinstance(e, (ConnectionResetError, BrokenPipeError)):
+                    raise DaemonError(f'Unable to reach ytdl daemon: {e}') from e
+        if response.status == 404:
+            raise UnknownJob(reply.get('error') if isinstance(reply, dict) else response.reason)
+        if response.status >= 400:
+            raise DaemonError(reply.get('error') if isinstance(reply, dict) else response.reason)
+        return reply
+
+    def submit(self, jobs:list) -> list:
+        return self._call('POST', '/jobs', jobs)
+
+    def status(self, id:str=None):
+        return self._call('GET', f'/jobs/{id}' if id else '/jobs')
+
+    def wait(self, id:str) -> dict:
+        while True:
+            info = self._call('GET', f'/jobs/{id}?wait={WAIT_LIMIT:g}')
+            if info['state'] in FINAL: return info
+
+    def cancel(self, id:str) -> dict:
+        return self._call('DELETE', f'/jobs/{id}')
+
+    def close(self) -> None:
+        if self.__conn is not None: self.__conn.close(); self.__conn = None
@@ -0,0 +1,305 @@
+from threading import Thread, Lock
+from types import FunctionType
+import time
+import os
+import lazy
+import retry
+
+httppool = lazy.module('httppool')
+json = lazy.module('json')
+
+DEFAULT_SEGMENTS = 4
+MIN_SEGMENT_SIZE = 1 << 20
+CHUNK_SIZE = 1 << 16
+CHECKPOINT_SIZE = 1 << 20
+RETRIES = 2
+# Short waits, the caller backs off longer between whole downloads
+BACKOFF_CAP = 5.0
+# Stands for httppool.TIMEOUT until the pool is loaded
+TIMEOUT = object()
+
+PART_EXT = '.part'
+STATE_EXT = '.json'
+
+class FetchError(IOError): pass
+class Cancelled(Exception): pass
+
+def _request(url:str, start:int=None, end:int=None, timeout=TIMEOUT):
+    headers = {}
+    if start is not None:
+        headers['Range'] = f'bytes={start}-' + ('' if end is None else str(end))
+    if timeout is TIMEOUT: timeout = httppool.TIMEOUT
+    return httppool.default_pool.request(url, headers=headers, timeout=timeout)
+
+def _content_range(response) -> int:
+    value = response.headers.get('Content-Range', '')
+    try: return int(value.rsplit('/', 1)[1])
+    except (IndexError, ValueError): return None
+
+def probe(url:str, timeout=TIMEOUT) -> tuple:
+    """
+    Return (size, ranges) of url, where ranges tells if the server
+    honors Range requests. size is None when the server does not say.
+    """
+    with _request(url, 0, 0, timeout) as response:
+        if response.status == 206:
+            # Read the one byte so the connection can be reused
+            response.read()
+            return _content_range(response), True
+        length = response.headers.get('Content-Length')
+        return (int(length) if length else None), False
+
+def split(size:int, segments:int) -> list:
+    segments = max(1, min(segments, size // MIN_SEGMENT_SIZE))
+    step = -(-size // segments)
+    return [(start, min(start+step, size)-1) for start in range(0, size, step)]
+
+class _progress:
+    def __init__(self, size:int, done:int, callback:FunctionType) -> None:
+        self.__lock:Lock = Lock()
+        self.__done:int = done
+        self.__size:int = size
+        self.__callback:FunctionType = callback
+
+    def __call__(self, received:int) -> None:
+        if not self.__callback: return
+        with self.__lock:
+            self.__done += received
+            remaining = self.__size - self.__done if self.__size else None
+            self.__callback(received, remaining)
+
+class _state:
+    """
+    Sidecar of a .part file, it remembers how many bytes of every range
+    are already synced to disk.
+    """
+
+    def __init__(self, path:str, url:str, key:str, size:int, ranges:list) -> None:
+        self.__path:str = path
+        self.__lock:Lock = Lock()
+        self.url:str = url
+        self.key:str = key
+        self.size:int = size
+        self.ranges:list = [[start, end, 0] for start, end in ranges]
+
+    @classmethod
+    def load(cls, path:str, key:str, size:int):
+        try:
+            with open(path, 'r') as f: data = json.load(f)
+        except (OSError, ValueError): return None
+        if data.get('key') != key or data.get('size') != size: return None
+        state = cls(path, data['url'], key, size, [])
+        state.ranges = [list(r) for r in data['ranges']]
+        return state
+
+    @property
+    def done(self) -> int: return sum(r[2] for r in self.ranges)
+
+    def update(self, index:int, done:int) -> None:
+        with self.__lock:
+            self.ranges[index][2] = done
+            self.save()
+
+    def save(self) -> None:
+        tmp = self.__path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'url': self.url, 'key': self.key, 'size': self.size, \
+                'ranges': self.ranges}, f)
+        os.replace(tmp, self.__path)
+
+    def remove(self) -> None:
+        try: os.remove(self.__path)
+        except FileNotFoundError: pass
+
+class _writer:
+    """
+    Positional writes straight from the receive buffer into one file
+    descriptor, shared by all segment threads.
+    """
+
+    def __init__(self, path:str, size:int=None, truncate:bool=True) -> None:
+        flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if truncate else 0)
+        self.__fd:int = os.open(path, flags | getattr(os, 'O_BINARY', 0), 0o666)
+        if size and truncate: self._preallocate(size)
+
+    def _preallocate(self, size:int) -> None:
+        # Reserve real blocks where possible, a sparse file is the fallback
+        try: os.posix_fallocate(self.__fd, 0, size); return
+        except (AttributeError, OSError): pass
+        os.ftruncate(self.__fd, size)
+
+    def write(self, view:memoryview, offset:int) -> None:
+        while view:
+            written = _pwrite(self.__fd, view, offset)
+            view = view[written:]; offset += written
+
+    def sync(self) -> None: os.fsync(self.__fd)
+
+    def close(self) -> None: os.close(self.__fd)
+
+    def __enter__(self): return self
+
+    def __exit__(self, *args) -> None: self.close()
+
+class _pipe:
+    """
+    Writes in order into a pipe, a full pipe blocks until the reader
+    catches up.
+    """
+
+    def __init__(self, fd:int) -> None:
+        self.__fd:int = fd
+        self.written:int = 0
+
+    def write(self, view:memoryview, offset:int) -> None:
+        if offset != self.written: raise FetchError(f'Gap in the stream at {self.written}')
+        while view:
+            written = os.write(self.__fd, view)
+            view = view[written:]; self.written += written
+
+def _pwrite(fd:int, view:memoryview, offset:int) -> int:
+    if hasattr(os, 'pwrite'): return os.pwrite(fd, view, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.write(fd, view)
+
+def _copy(response, out:_writer, offset:int, limit:int, progress:_progress, chunk_size:int, \
+    checkpoint:FunctionType=None, throttle:FunctionType=None) -> int:
+    view = memoryview(bytearray(chunk_size))
+    done = 0; unsaved = 0
+    while limit is None or done < limit:
+        received = response.readinto(view if limit is None else view[:min(chunk_size, limit-done)])
+        if not received: break
+        out.write(view[:received], offset+done)
+        done += received; unsaved += received
+        progress(received)
+        if throttle: throttle(received)
+        if checkpoint and unsaved >= CHECKPOINT_SIZE:
+            checkpoint(done); unsaved = 0
+    if checkpoint and unsaved:
+        checkpoint(done)
+    return done
+
+def _segment(url:str, out:_writer, state:_state, index:int, progress:_progress, timeout, \
+    throttle, chunk_size:int) -> None:
+    start, end, done = state.ranges[index]
+    if start + done > end: return
+    def checkpoint(n:int) -> None:
+        # The sidecar must never claim bytes a crash can still lose
+        out.sync()
+        state.update(index, done+n)
+    with _request(url, start+done, end, timeout) as response:
+        if response.status != 206:
+            raise FetchError(f'Range {start+done}-{end} was not honored')
+        got = _copy(response, out, start+done, end-start-done+1, progress, chunk_size, \
+            checkpoint, throttle)
+    if start + done + got <= end:
+        raise FetchError(f'Range {start}-{end} ended early')
+
+def _retrying(func:FunctionType, *args, errors:list) -> None:
+    for attempt in range(RETRIES+1):
+        try: func(*args); return
+        except Cancelled as e:
+            errors.append(e); return
+        except Exception as e:
+            kind = retry.classify(e)
+            if attempt == RETRIES or kind not in retry.RETRYABLE:
+                errors.append(e); return
+            time.sleep(retry.backoff(attempt, kind, cap=BACKOFF_CAP))
+
+def _raise(path:str, errors:list) -> None:
+    if not errors: return
+    # Cancelling is not a failure, the .part file stays for a later resume
+    for e in errors:
+        if isinstance(e, Cancelled): raise e
+    raise FetchError(f'Unable to download {path}: {errors[0]}') from errors[0]
+
+def _single(url:str, part:str, size:int, progress:_progress, timeout, throttle, chunk_size:int) -> None:
+    with _request(url, timeout=timeout) as response, _writer(part, size) as out:
+        done = _copy(response, out, 0, None, progress, chunk_size, throttle=throttle)
+    if size is not None and done != size:
+        raise FetchError(f'Expected {size} bytes but got {done}')
+
+def fetch(url:str, path:str, size:int=None, segments:int=DEFAULT_SEGMENTS, \
+    on_progress:FunctionType=None, timeout=TIMEOUT, key:str=None, throttle:FunctionType=None, \
+    chunk_size:int=CHUNK_SIZE) -> str:
+    """
+    Download url into path over up to segments parallel Range requests.
+    Bytes go to path.part first and a sidecar remembers the finished
+    offsets, so a later call with the same key and size continues where
+    this one stopped. on_progress is called with (received, remaining)
+    and throttle with the size of every chunk, it may block to slow down.
+    Chunks are received into one reused buffer of chunk_size bytes per
+    connection and written from there without copies.
+    """
+    try:
+        probed, ranges = probe(url, timeout)
+    except httppool.HTTPError as e:
+        raise FetchError(f'Unable to reach the stream: {e}') from e
+    size = probed if probed is not None else size
+    if size and os.path.isfile(path) and os.path.getsize(path) == size:
+        return path
+
+    part = path + PART_EXT
+    sidecar = part + STATE_EXT
+    key = str(key if key is not None else url)
+
+    errors:list = []
+    if not ranges or not size:
+        # Without ranges nothing can be resumed, start over every time
+        _retrying(_single, url, part, size, _progress(size, 0, on_progress), \
+            timeout, throttle, chunk_size, errors=errors)
+        _raise(path, errors)
+        os.replace(part, path)
+        return path
+
+    state = _state.load(sidecar, key, size) if os.path.isfile(part) else None
+    resume = state is not None
+    if state is None:
+        state = _state(sidecar, url, key, size, split(size, segments))
+    progress = _progress(size, state.done, on_progress)
+
+    with _writer(part, size, truncate=not resume) as out:
+        if not resume: state.save()
+        threads = [Thread(target=_retrying, daemon=True, kwargs={'errors': errors}, \
+            args=(_segment, url, out, state, i, progress, timeout, throttle, chunk_size)) \
+                for i in range(len(state.ranges))]
+        for t in threads: t.start()
+        for t in threads: t.join()
+    _raise(path, errors)
+    os.replace(part, path)
+    state.remove()
+    return path
+
+def stream(url:str, fd:int, size:int=None, on_progress:FunctionType=None, timeout=TIMEOUT, \
+    throttle:FunctionType=None, chunk_size:int=CHUNK_SIZE) -> int:
+    """
+    Write url in order to the file descriptor fd, a pipe or stdout, through
+    one reused buffer of chunk_size bytes, so memory stays the same
+    whatever the size and a reader that stops reading holds the download.
+    A broken connection continues at the first byte not written yet.
+    Returns the number of bytes written.
+    """
+    try:
+        probed, ranges = probe(url, timeout)
+    except httppool.HTTPError as e:
+        raise FetchError(f'Unable to reach the stream: {e}') from e
+    size = probed if probed is not None else size
+    out = _pipe(fd)
+    progress = _progress(size, 0, on_progress)
+    for attempt in range(RETRIES+1):
+        start = out.written
+        try:
+            with _request(url, start or None, None, timeout) as response:
+                if start and response.status != 206:
+                    raise FetchError(f'Range {start}- was not honored')
+                _copy(response, out, start, None if size is None else size-start, progress, \
+                    chunk_size, throttle=throttle)
+            if size is None or out.written == size: return out.written
+            raise FetchError(f'Stream ended early at {out.written} of {size} bytes')
+        except (Cancelled, BrokenPipeError): raise
+        except Exception as e:
+            kind = retry.classify(e)
+            # Bytes already written cannot be taken back, only continued
+            if attempt == RETRIES or kind not in retry.RETRYABLE or (out.written and not ranges):
+                raise FetchError(f'Unable to stream {url}: {e}') from e
+            time.sleep(retry.backoff(attempt, kind, cap=BACKOFF_CAP))
@@ -0,0 +1,162 @@
+"""
+Format selectors pick the stream(s) of a video from its stream list:
+
+    best[height<=720][fps<=30]/bestvideo[height<=1080]+bestaudio/worst
+
+Alternatives separated by '/' are tried in order. Each names a kind of
+stream (best/worst progressive, bestvideo/worstvideo, bestaudio/
+worstaudio) and filters in brackets; 'video+audio' selects a DASH pair.
+Selectors are compiled once into predicate lists and ranking keys.
+"""
+import re
+
+# kind -> whether its streams carry a video and an audio track
+KINDS = {
+    'best': (True, True), 'worst': (True, True),
+    'bestvideo': (True, False), 'worstvideo': (True, False),
+    'bestaudio': (False, True), 'worstaudio': (False, True),
+}
+ALIASES = {'b': 'best', 'w': 'worst', 'bv': 'bestvideo', 'wv': 'worstvideo', \
+    'ba': 'bestaudio', 'wa': 'worstaudio'}
+
+_BINARY = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30}
+_DECIMAL = {'': 1, 'k': 1000, 'm': 1000 ** 2, 'g': 1000 ** 3}
+_AMOUNT = re.compile(r'^(\d+(?:\.\d+)?)([kmg]?)(?:bps|b|p)?$', re.IGNORECASE)
+_FILTER = re.compile(r'\[\s*([a-z]+)\s*(<=|>=|!=|\^=|\$=|\*=|<|>|=)\s*([^\]]*?)\s*\]')
+_KIND = re.compile(r'[a-z]+')
+
+class FormatError(ValueError): pass
+
+def _number(value) -> int:
+    return int(''.join(filter(str.isdigit, str(value or ''))) or 0)
+
+def _amount(units:dict):
+    def parse(text:str) -> float:
+        match = _AMOUNT.match(text)
+        if not match: raise FormatError(f'Not a number: {text}')
+        return float(match.group(1)) * units[match.group(2).lower()]
+    return parse
+
+# Filter key -> (value of a stream, parser of the value in a filter)
+FIELDS = {
+    'height': (lambda s: _number(s.resolution) or None, _amount(_DECIMAL)),
+    'fps': (lambda s: getattr(s, 'fps', None), _amount(_DECIMAL)),
+    'abr': (lambda s: _number(s.abr) or None, _amount({'': 1, 'k': 1, 'm': 1000, 'g': 1000 ** 2})),
+    'bitrate': (lambda s: s.bitrate, _amount(_DECIMAL)),
+    # pytube's filesize property asks the server when the size is unknown
+    'filesize': (lambda s: getattr(s, '_filesize', 0) or None, _amount(_BINARY)),
+    'itag': (lambda s: s.itag, _amount(_DECIMAL)),
+    'ext': (lambda s: s.subtype, str),
+    'vcodec': (lambda s: s.video_codec, str),
+    'acodec': (lambda s: s.audio_codec, str),
+}
+FIELDS['res'] = FIELDS['height']
+FIELDS['size'] = FIELDS['filesize']
+
+_COMPARE = {
+    '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b, '>=': lambda a, b: a >= b,
+    '=': lambda a, b: a == b, '!=': lambda a, b: a != b,
+    '^=': lambda a, b: a.startswith(b), '$=': lambda a, b: a.endswith(b),
+    '*=': lambda a, b: b in a,
+}
+
+def _predicate(key:str, op:str, text:str):
+    if key not in FIELDS: raise FormatError(f'Unknown field: {key} (use {", ".join(FIELDS)})')
+    value_of, parse = FIELDS[key]
+    if parse is not str and op in ['^=', '$=', '*=']:
+        raise FormatError(f'{op} only works on ext, vcodec and acodec')
+    value = parse(text.strip('\'"'))
+    compare = _COMPARE[op]
+    def test(stream) -> bool:
+        current = value_of(stream)
+        # Streams that do not know a value never pass a filter on it
+        if current is None: return op == '!='
+        return compare(current, value)
+    return test
+
+def _rank(stream, best:bool) -> tuple:
+    quality = (_number(stream.resolution), getattr(stream, 'fps', 0) or 0, _number(stream.abr))
+    # Between equal streams mp4 wins, so a pair can be muxed into mp4
+    return quality + ((stream.subtype == 'mp4') == best, getattr(stream, '_filesize', 0) or 0)
+
+class pick:
+    __slots__ = ('kind', 'best', 'video', 'audio', 'tests')
+
+    def __init__(self, kind:str, tests:list) -> None:
+        self.kind:str = kind
+        self.best:bool = kind.startswith('best')
+        self.video, self.audio = KINDS[kind]
+        self.tests:list = tests
+
+    def candidates(self, streams:list) -> list:
+        return [s for s in streams if s.includes_video_track == self.video and \
+            s.includes_audio_track == self.audio and all(test(s) for test in self.tests)]
+
+    def choose(self, candidates:list):
+        if not candidates: return None
+        if self.best: return max(candidates, key=lambda s: _rank(s, True))
+        return min(candidates, key=lambda s: _rank(s, False))
+
+class selector:
+    """
+    Compiled form of a format selector, call select with a stream list.
+    """
+
+    def __init__(self, text:str, alternatives:list) -> None:
+        self.__text:str = text
+        self.__alternatives:list = alternatives
+
+    @property
+    def text(self) -> str: return self.__text
+
+    def __str__(self) -> str: return self.__text
+
+    def select(self, streams) -> tuple:
+        """
+        Return (stream, audio) for the first alternative that matches, audio
+        is None unless a video+audio pair was asked for. (None, None) when
+        nothing matches.
+        """
+        streams = list(streams)
+        for video, audio in self.__alternatives:
+            chosen = video.choose(video.candidates(streams))
+            if chosen is None: continue
+            if audio is None: return chosen, None
+            tracks = audio.candidates(streams)
+            pair = audio.choose([s for s in tracks if s.subtype == chosen.subtype] or tracks)
+            if pair is not None: return chosen, pair
+        return None, None
+
+def _pick(text:str, position:int) -> pick:
+    match = _KIND.match(text)
+    kind = ALIASES.get(match.group(0), match.group(0)) if match else ''
+    if kind not in KINDS:
+        raise FormatError(f'Expected one of {", ".join(KINDS)} at {position}: {text or "end"}')
+    rest = text[match.end():]
+    tests = []
+    while rest:
+        found = _FILTER.match(rest)
+        if not found: raise FormatError(f'Expected a [field<op>value] filter at {position + len(text) - len(rest)}: {rest}')
+        tests.append(_predicate(found.group(1).lower(), found.group(2), found.group(3)))
+        rest = rest[found.end():]
+    return pick(kind, tests)
+
+_compiled = {}
+
+def compile(text:str) -> selector:
+    """
+    Compile a format selector, the result is cached per text.
+    """
+    if text in _compiled: return _compiled[text]
+    alternatives = []; position = 0
+    for part in re.split(r'/(?![^\[]*\])', text.replace(' ', '')):
+        video, plus, audio = part.partition('+')
+        first = _pick(video, position)
+        second = _pick(audio, position + len(video) + 1) if plus else None
+        if second is not None and (not first.video or first.audio or not second.audio or second.video):
+            raise FormatError(f'Only videos without sound can be paired with audio: {part}')
+        alternatives.append((first, second))
+        position += len(part) + 1
+    _compiled[text] = compiled = selector(text, alternatives)
+    return compiled
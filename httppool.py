@@ -0,0 +1,199 @@
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from urllib.parse import urlsplit, urljoin
+from urllib.error import HTTPError
+from threading import Lock, BoundedSemaphore
+import socket
+import json
+
+DEFAULT_PER_HOST = 8
+MAX_REDIRECTS = 5
+# Seconds to wait for a free connection to a host before giving up. pytube
+# keeps a response it never reads open for a whole download, so downloads
+# can each hold a connection while waiting for one the others have
+ACQUIRE_TIMEOUT = 60.0
+TIMEOUT = socket._GLOBAL_DEFAULT_TIMEOUT
+
+BASE_HEADERS = {'User-Agent': 'Mozilla/5.0', 'accept-language': 'en-US,en'}
+REDIRECTS = [301, 302, 303, 307, 308]
+# Errors of a reused connection the server has already closed
+_STALE = (ConnectionError, HTTPException, BrokenPipeError)
+
+# No connection to a host came free in time
+class PoolTimeout(TimeoutError): pass
+
+class _host:
+    def __init__(self, limit:int) -> None:
+        self.idle:list = []
+        self.slots:BoundedSemaphore = BoundedSemaphore(limit)
+
+class response:
+    """
+    Response of a pooled connection. The connection goes back to the pool
+    once the body is read to the end and is dropped if it is closed early.
+    """
+
+    def __init__(self, pool, key:tuple, conn:HTTPConnection, raw, url:str) -> None:
+        self.__pool = pool
+        self.__key:tuple = key
+        self.__conn:HTTPConnection = conn
+        self.__raw = raw
+        self.url:str = url
+        self.status:int = raw.status
+        self.reason:str = raw.reason
+        self.headers = raw.headers
+        # Bodyless answers (HEAD, redirects) give the connection back at once
+        if raw.length == 0: raw.read()
+        if raw.isclosed(): self._release()
+
+    def info(self): return self.headers
+
+    def getcode(self) -> int: return self.status
+
+    def geturl(self) -> str: return self.url
+
+    def read(self, amt:int=None) -> bytes:
+        if self.__conn is None: return self.__raw.read(amt)
+        try:
+            data = self.__raw.read(amt)
+        except Exception:
+            self.close(); raise
+        if self.__raw.isclosed() or (amt and not data): self._release()
+        return data
+
+    def readinto(self, buffer) -> int:
+        if self.__conn is None: return self.__raw.readinto(buffer)
+        try:
+            received = self.__raw.readinto(buffer)
+        except Exception:
+            self.close(); raise
+        if self.__raw.isclosed() or (len(buffer) and not received): self._release()
+        return received
+
+    def _release(self) -> None:
+        if self.__conn is None: return
+        conn, self.__conn = self.__conn, None
+        if self.__raw.will_close or not self.__raw.isclosed():
+            conn.close(); conn = None
+        self.__pool._release(self.__key, conn)
+
+    def close(self) -> None:
+        if self.__conn is None: return
+        conn, self.__conn = self.__conn, None
+        conn.close()
+        self.__pool._release(self.__key, None)
+
+    def __enter__(self): return self
+
+    def __exit__(self, *args) -> None: self.close()
+
+    def __del__(self) -> None:
+        try: self.close()
+        except Exception: pass
+
+class connection_pool:
+    """
+    Keep-alive connections shared by every thread, with at most
+    per_host connections open to one host at a time.
+    """
+
+    def __init__(self, per_host:int=DEFAULT_PER_HOST, acquire_timeout:float=ACQUIRE_TIMEOUT) -> None:
+        self.__per_host:int = per_host
+        self.__acquire_timeout:float = acquire_timeout
+        self.__hosts:dict = {}
+        self.__lock:Lock = Lock()
+        self.__opened:int = 0
+
+    @property
+    def per_host(self) -> int: return self.__per_host
+
+    @property
+    def opened(self) -> int: return self.__opened
+
+    def set_per_host(self, per_host:int) -> None:
+        self.close()
+        with self.__lock:
+            self.__per_host = per_host
+            self.__hosts = {}
+
+    def _host(self, key:tuple) -> _host:
+        with self.__lock:
+            if key not in self.__hosts: self.__hosts[key] = _host(self.__per_host)
+            return self.__hosts[key]
+
+    def _acquire(self, key:tuple, timeout) -> tuple:
+        host = self._host(key)
+        if not host.slots.acquire(timeout=self.__acquire_timeout):
+            raise PoolTimeout(f'No free connection to {key[1]} after {self.__acquire_timeout:g}s')
+        with self.__lock:
+            if host.idle: return host.idle.pop(), True
+            self.__opened += 1
+        scheme, netloc = key
+        cls = HTTPSConnection if scheme == 'https' else HTTPConnection
+        return cls(netloc, timeout=timeout), False
+
+    def _release(self, key:tuple, conn:HTTPConnection) -> None:
+        host = self._host(key)
+        if conn is not None:
+            with self.__lock: host.idle.append(conn)
+        host.slots.release()
+
+    def _send(self, method:str, url:str, headers:dict, body:bytes, timeout) -> response:
+        parts = urlsplit(url)
+        if parts.scheme not in ['http', 'https']: raise ValueError(f'Invalid URL: {url}')
+        key = (parts.scheme, parts.netloc)
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        while True:
+            conn, reused = self._acquire(key, timeout)
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(socket.getdefaulttimeout() if timeout is TIMEOUT else timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                raw = conn.getresponse()
+            except _STALE:
+                conn.close(); self._release(key, None)
+                if reused: continue
+                raise
+            except Exception:
+                conn.close(); self._release(key, None)
+                raise
+            return response(self, key, conn, raw, url)
+
+    def request(self, url:str, method:str=None, headers:dict=None, data:bytes=None, timeout=TIMEOUT) -> response:
+        """
+        Send a request like urllib.request.urlopen does: redirects are
+        followed and error statuses raise HTTPError.
+        """
+        method = method or ('POST' if data is not None else 'GET')
+        all_headers = BASE_HEADERS.copy()
+        if headers: all_headers.update(headers)
+        if data is not None and 'Content-Type' not in all_headers:
+            all_headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = self._send(method, url, all_headers, data, timeout)
+            if resp.status in REDIRECTS and resp.headers.get('Location'):
+                resp.read(); resp.close()
+                url = urljoin(url, resp.headers['Location'])
+                if resp.status == 303: method, data = 'GET', None
+                continue
+            if resp.status >= 400:
+                resp.read()
+                raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+            return resp
+        raise HTTPError(url, resp.status, 'Too many redirects', resp.headers, None)
+
+    def close(self) -> None:
+        with self.__lock:
+            for host in self.__hosts.values():
+                for conn in host.idle: conn.close()
+                host.idle.clear()
+
+default_pool = connection_pool()
+
+def execute_request(url, method=None, headers=None, data=None, timeout=TIMEOUT) -> response:
+    """
+    Drop-in for pytube.request._execute_request on top of default_pool.
+    """
+    if data and not isinstance(data, bytes):
+        data = bytes(json.dumps(data), encoding='utf-8')
+    return default_pool.request(url, method, headers, data or None, timeout)
@@ -0,0 +1,168 @@
+from threading import Lock
+import sqlite3
+import time
+import os
+
+DEFAULT_PATH = os.path.join(os.environ.get('XDG_DATA_HOME', \
+    os.path.join(os.path.expanduser('~'), '.local', 'share')), 'ytdl', 'queue.sqlite')
+ADD_BATCH = 1000
+CLAIM_BATCH = 32
+FLUSH_SIZE = 256
+FLUSH_INTERVAL = 1.0
+MAX_ATTEMPTS = 3
+
+PENDING, CLAIMED, RESOLVING, DOWNLOADING, POSTPROCESSING, DONE, FAILED = \
+    'pending', 'claimed', 'resolving', 'downloading', 'postprocessing', 'done', 'failed'
+ACTIVE = [CLAIMED, RESOLVING, DOWNLOADING, POSTPROCESSING]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner INTEGER,
+    path TEXT,
+    error TEXT,
+    kind TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, seq);
+"""
+
+class QueueError(IOError): pass
+
+def _alive(pid:int) -> bool:
+    try: os.kill(pid, 0)
+    except ProcessLookupError: return False
+    except OSError: pass
+    return True
+
+class job_queue:
+    """
+    Batch of links kept in SQLite (WAL mode), so a run can be continued
+    after a crash or a failure. Claims are committed at once, state
+    changes are collected and written FLUSH_SIZE at a time or every
+    FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self, path:str=DEFAULT_PATH) -> None:
+        self.__path:str = path
+        self.__lock:Lock = Lock()
+        self.__changes:dict = {}
+        self.__flushed:float = time.monotonic()
+        try:
+            directory = os.path.dirname(path)
+            if directory: os.makedirs(directory, exist_ok=True)
+            self.__db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.__db.execute('PRAGMA journal_mode=WAL')
+            self.__db.execute('PRAGMA synchronous=NORMAL')
+            self.__db.executescript(_SCHEMA)
+            # Queues made before failures kept their class
+            if 'kind' not in [row[1] for row in self.__db.execute('PRAGMA table_info(jobs)')]:
+                self.__db.execute('ALTER TABLE jobs ADD COLUMN kind TEXT')
+        except (OSError, sqlite3.Error) as e:
+            raise QueueError(f'Unable to open queue {path}: {e}') from e
+
+    @property
+    def path(self) -> str: return self.__path
+
+    def _write(self, func, *args):
+        # One IMMEDIATE transaction, so concurrent runs never claim the same rows
+        with self.__lock:
+            try:
+                self.__db.execute('BEGIN IMMEDIATE')
+                try:
+                    self._flush()
+                    result = func(*args)
+                except BaseException:
+                    self.__db.execute('ROLLBACK'); raise
+                self.__db.execute('COMMIT')
+                return result
+            except sqlite3.Error as e:
+                raise QueueError(f'Unable to update queue {self.__path}: {e}') from e
+
+    def _flush(self) -> None:
+        if not self.__changes: return
+        self.__db.executemany('UPDATE jobs SET state = ?, path = coalesce(?, path), error = ?, kind = ?, ' \
+            'updated = ? WHERE seq = ?', [(*change, seq) for seq, change in self.__changes.items()])
+        self.__changes.clear()
+        self.__flushed = time.monotonic()
+
+    def add(self, entries:list) -> int:
+        """
+        Queue (id, url) pairs behind the ones already there, ids that are
+        known keep their state. Returns the number of new jobs.
+        """
+        def insert():
+            before = self.__db.total_changes
+            for i in range(0, len(entries), ADD_BATCH):
+                self.__db.executemany('INSERT OR IGNORE INTO jobs (id, url) VALUES (?, ?)', \
+                    entries[i:i+ADD_BATCH])
+            return self.__db.total_changes - before
+        return self._write(insert)
+
+    def claim(self, count:int=CLAIM_BATCH, ids:list=None) -> list:
+        """
+        Take up to count pending jobs for this process, only the ones in
+        ids if given, returns (seq, id, url).
+        """
+        if ids is not None and not ids: return []
+        def take():
+            if ids is None:
+                rows = self.__db.execute('SELECT seq, id, url FROM jobs WHERE state = ? ORDER BY seq LIMIT ?', \
+                    (PENDING, count)).fetchall()
+            else:
+                rows = self.__db.execute('SELECT seq, id, url FROM jobs WHERE state = ? AND id IN ' \
+                    f'({",".join("?" * len(ids))}) ORDER BY seq LIMIT ?', (PENDING, *ids, count)).fetchall()
+            self.__db.executemany('UPDATE jobs SET state = ?, attempts = attempts + 1, owner = ?, updated = ? ' \
+                'WHERE seq = ?', [(CLAIMED, os.getpid(), time.time(), row[0]) for row in rows])
+            return rows
+        return self._write(take)
+
+    def recover(self) -> int:
+        """
+        Put the jobs of runs that died while working on them back in line.
+        """
+        def reset():
+            marks = ','.join('?' * len(ACTIVE))
+            owners = [row[0] for row in self.__db.execute( \
+                f'SELECT DISTINCT owner FROM jobs WHERE state IN ({marks})', ACTIVE)]
+            dead = [owner for owner in owners if owner is None or owner == os.getpid() or not _alive(owner)]
+            before = self.__db.total_changes
+            self.__db.executemany(f'UPDATE jobs SET state = ?, owner = NULL WHERE state IN ({marks}) ' \
+                'AND owner IS ?', [(PENDING, *ACTIVE, owner) for owner in dead])
+            return self.__db.total_changes - before
+        return self._write(reset)
+
+    def retry(self, attempts:int, kinds:list) -> int:
+        """
+        Queue failed jobs again that were tried fewer than attempts times
+        and failed with one of kinds.
+        """
+        def reset():
+            before = self.__db.total_changes
+            self.__db.execute('UPDATE jobs SET state = ?, owner = NULL WHERE state = ? AND attempts < ? ' \
+                f'AND kind IN ({",".join("?" * len(kinds))})', (PENDING, FAILED, attempts, *kinds))
+            return self.__db.total_changes - before
+        return self._write(reset)
+
+    def update(self, seq:int, state:str, path:str=None, error:str=None, kind:str=None) -> None:
+        with self.__lock:
+            self.__changes[seq] = (state, path, error, kind, time.time())
+            due = len(self.__changes) >= FLUSH_SIZE or time.monotonic() - self.__flushed >= FLUSH_INTERVAL
+        if due: self.flush()
+
+    def flush(self) -> None:
+        self._write(lambda: None)
+
+    def counts(self) -> dict:
+        """
+        Number of jobs in each state.
+        """
+        return self._write(lambda: dict(self.__db.execute('SELECT state, count(*) FROM jobs GROUP BY state')))
+
+    def close(self) -> None:
+        try: self.flush()
+        finally: self.__db.close()
@@ -0,0 +1,24 @@
+import sys
+
+class module:
+    """
+    Stand-in for module name that imports it on first attribute access,
+    so modules only needed for downloading stay off the startup path.
+    """
+
+    def __init__(self, name:str) -> None:
+        object.__setattr__(self, '_module__name', name)
+
+    def _load(self):
+        name = self.__name
+        if name not in sys.modules: __import__(name)
+        return sys.modules[name]
+
+    def __getattr__(self, attr:str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr:str, value) -> None:
+        setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        return f'<lazy module {self.__name!r}>'
@@ -0,0 +1,113 @@
+from array import array
+import sys
+import io
+import re
+import lazy
+
+gzip = lazy.module('gzip')
+base64 = lazy.module('base64')
+
+WATCH_URL = 'https://youtube.com/watch?v={}'
+
+_ID = re.compile(r'^[0-9A-Za-z_-]{11}$')
+_URL_ID = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/|/v/)([0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])')
+
+def video_id(link:str) -> str:
+    """
+    Return the 11 character video id of a link, or None when the link
+    does not name a single video. Quotes, whitespace and the scheme
+    do not matter.
+    """
+    link = link.strip().strip('\'"')
+    if _ID.match(link): return link
+    match = _URL_ID.search(link)
+    return match.group(1) if match else None
+
+def watch_url(vid:str) -> str: return WATCH_URL.format(vid)
+
+_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+_INDEX = {c: i for i, c in enumerate(_ALPHABET)}
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+GZIP_MAGIC = b'\x1f\x8b'
+COMMENT = '#'
+
+class LinkError(ValueError): pass
+
+class id_set:
+    """
+    Set of video ids packed into 9 bytes per slot: the first 64 of the
+    66 id bits in an array, the last 2 bits plus a used flag in a tag byte.
+    """
+
+    def __init__(self, capacity:int=1024) -> None:
+        self._alloc(max(8, 1 << (capacity-1).bit_length()))
+        self.__len:int = 0
+
+    def _alloc(self, slots:int) -> None:
+        self.__keys:array = array('Q', bytes(8 * slots))
+        self.__tags:bytearray = bytearray(slots)
+        self.__shift:int = 64 - (slots.bit_length() - 1)
+
+    def __len__(self) -> int: return self.__len
+
+    @staticmethod
+    def _pack(vid:str) -> tuple:
+        return int.from_bytes(base64.urlsafe_b64decode(vid + '='), 'big'), 4 | (_INDEX[vid[-1]] & 3)
+
+    def _slot(self, key:int, tag:int) -> int:
+        mask = len(self.__tags) - 1
+        i = ((key * _GOLDEN) & _MASK64) >> self.__shift
+        while self.__tags[i]:
+            if self.__keys[i] == key and self.__tags[i] == tag: return i
+            i = (i + 1) & mask
+        return i
+
+    def __contains__(self, vid:str) -> bool:
+        key, tag = self._pack(vid)
+        return bool(self.__tags[self._slot(key, tag)])
+
+    def add(self, vid:str) -> bool:
+        """
+        Add vid and return True when it was not in the set yet.
+        """
+        key, tag = self._pack(vid)
+        i = self._slot(key, tag)
+        if self.__tags[i]: return False
+        self.__keys[i] = key; self.__tags[i] = tag
+        self.__len += 1
+        if self.__len * 4 > len(self.__tags) * 3: self._grow()
+        return True
+
+    def _grow(self) -> None:
+        keys, tags = self.__keys, self.__tags
+        self._alloc(len(tags) * 2)
+        for key, tag in zip(keys, tags):
+            if tag:
+                i = self._slot(key, tag)
+                self.__keys[i] = key; self.__tags[i] = tag
+
+def open_source(path:str):
+    """
+    Open a links file for reading, '-' is stdin. Gzip input is
+    recognised by its magic bytes.
+    """
+    try: raw = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    except OSError as e: raise LinkError(f'Unable to read links from {path}: {e}') from e
+    if raw.peek(2)[:2] == GZIP_MAGIC:
+        raw = gzip.GzipFile(fileobj=raw, mode='rb')
+    return io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+
+def read(stream, on_invalid=None):
+    """
+    Yield the links of stream one by one, blank lines and # comments are
+    skipped and lines without a video id are passed to on_invalid.
+    """
+    with stream:
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line or line.startswith(COMMENT): continue
+            if video_id(line) is None:
+                if on_invalid: on_invalid(number, line)
+                continue
+            yield line
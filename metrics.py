@@ -0,0 +1,259 @@
+from threading import Lock, Thread, Event
+from collections import deque
+import time
+import sys
+import os
+import lazy
+
+shutil = lazy.module('shutil')
+json = lazy.module('json')
+
+REFRESH_INTERVAL = 0.2
+DUMP_INTERVAL = 5.0
+RATE_WINDOW = 5.0
+
+class MetricsError(IOError): pass
+
+class transfer:
+    """
+    Progress of one download, call it with every received chunk. Only a
+    counter is updated per chunk, rates are worked out by the readers.
+    """
+
+    def __init__(self, owner, name:str, size:int) -> None:
+        self.__owner = owner
+        self.__lock:Lock = Lock()
+        self.name:str = name
+        self.size:int = size
+        self.done:int = 0
+        self.started:float = time.monotonic()
+
+    def __call__(self, received:int, remaining:int=None) -> None:
+        with self.__lock: self.done += received
+
+    def close(self) -> None: self.__owner._finish(self)
+
+    def __enter__(self): return self
+
+    def __exit__(self, *args) -> None: self.close()
+
+class _stage:
+    __slots__ = ('count', 'errors', 'total', 'max')
+
+    def __init__(self) -> None:
+        self.count:int = 0
+        self.errors:int = 0
+        self.total:float = 0.0
+        self.max:float = 0.0
+
+class registry:
+    """
+    Bytes received, stage latencies, error counts and queue depths of
+    one run.
+    """
+
+    def __init__(self) -> None:
+        self.__lock:Lock = Lock()
+        self.__started:float = time.monotonic()
+        self.__finished:int = 0
+        self.__transfers:dict = {}
+        self.__stages:dict = {}
+        self.__samples:deque = deque([(self.__started, 0)])
+        self.depths = None
+
+    @property
+    def transfers(self) -> list:
+        with self.__lock: return list(self.__transfers.values())
+
+    def transfer(self, name:str, size:int=None) -> transfer:
+        t = transfer(self, name, size)
+        with self.__lock: self.__transfers[id(t)] = t
+        return t
+
+    def _finish(self, t:transfer) -> None:
+        with self.__lock:
+            if self.__transfers.pop(id(t), None) is not None: self.__finished += t.done
+
+    def observe(self, stage:str, seconds:float, ok:bool=True) -> None:
+        with self.__lock:
+            st = self.__stages.get(stage) or self.__stages.setdefault(stage, _stage())
+            st.count += 1; st.total += seconds; st.max = max(st.max, seconds)
+            if not ok: st.errors += 1
+
+    def timed(self, stage:str, func):
+        """
+        Wrap func so every call is recorded as one run of stage.
+        """
+        def run(*args):
+            start = time.monotonic()
+            try: result = func(*args)
+            except BaseException:
+                self.observe(stage, time.monotonic() - start, False); raise
+            self.observe(stage, time.monotonic() - start)
+            return result
+        return run
+
+    def received(self) -> int:
+        with self.__lock:
+            return self.__finished + sum(t.done for t in self.__transfers.values())
+
+    def _rate(self, now:float, total:int) -> float:
+        with self.__lock:
+            self.__samples.append((now, total))
+            while len(self.__samples) > 2 and now - self.__samples[1][0] >= RATE_WINDOW:
+                self.__samples.popleft()
+            then, before = self.__samples[0]
+        return (total - before) / (now - then) if now > then else 0.0
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        total = self.received()
+        with self.__lock:
+            stages = {name: {'count': st.count, 'errors': st.errors, 'seconds_total': st.total, \
+                'seconds_max': st.max} for name, st in self.__stages.items()}
+            active = len(self.__transfers)
+        depths = self.depths() if self.depths else {}
+        return {'uptime_seconds': now - self.__started, 'bytes_received': total, \
+            'bytes_per_second': self._rate(now, total), 'active_downloads': active, \
+            'stages': stages, 'queue_depths': depths}
+
+def to_json(snap:dict) -> str:
+    return json.dumps(snap, indent=1, sort_keys=True) + '\n'
+
+def to_prometheus(snap:dict) -> str:
+    lines = []
+    def metric(name:str, kind:str, samples:list) -> None:
+        lines.append(f'# TYPE ytdl_{name} {kind}')
+        for labels, value in samples:
+            label = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            value = value if isinstance(value, int) else round(value, 6)
+            lines.append(f'ytdl_{name}{"{" + label + "}" if label else ""} {value}')
+    stages = snap['stages'].items()
+    metric('uptime_seconds', 'gauge', [({}, snap['uptime_seconds'])])
+    metric('bytes_received_total', 'counter', [({}, snap['bytes_received'])])
+    metric('bytes_per_second', 'gauge', [({}, snap['bytes_per_second'])])
+    metric('active_downloads', 'gauge', [({}, snap['active_downloads'])])
+    metric('stage_runs_total', 'counter', [({'stage': n}, s['count']) for n, s in stages])
+    metric('stage_errors_total', 'counter', [({'stage': n}, s['errors']) for n, s in stages])
+    metric('stage_seconds_total', 'counter', [({'stage': n}, s['seconds_total']) for n, s in stages])
+    metric('stage_seconds_max', 'gauge', [({'stage': n}, s['seconds_max']) for n, s in stages])
+    metric('queue_depth', 'gauge', [({'stage': n}, d) for n, d in snap['queue_depths'].items()])
+    return '\n'.join(lines) + '\n'
+
+class dump:
+    """
+    Write a snapshot of reg to path every interval seconds, as Prometheus
+    text for *.prom files and as JSON otherwise.
+    """
+
+    def __init__(self, path:str, reg:registry, interval:float=DUMP_INTERVAL, on_error=None) -> None:
+        self.__path:str = path
+        self.__registry:registry = reg
+        self.__format = to_prometheus if path.endswith('.prom') else to_json
+        self.__interval:float = interval
+        self.__on_error = on_error
+        self.__stop:Event = Event()
+        self.__thread:Thread = Thread(target=self._loop, daemon=True)
+        self.__thread.start()
+
+    def write(self) -> None:
+        tmp = self.__path + '.tmp'
+        try:
+            with open(tmp, 'w') as f: f.write(self.__format(self.__registry.snapshot()))
+            os.replace(tmp, self.__path)
+        except OSError as e:
+            raise MetricsError(f'Unable to write metrics to {self.__path}: {e}') from e
+
+    def _loop(self) -> None:
+        while not self.__stop.wait(self.__interval):
+            try: self.write()
+            except MetricsError as e:
+                if self.__on_error: self.__on_error(e)
+
+    def stop(self) -> None:
+        """
+        Stop the writer and leave the final numbers in the file.
+        """
+        self.__stop.set()
+        self.__thread.join()
+        self.write()
+
+def size(value:float) -> str:
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(value) < 1024 or unit == 'GiB': break
+        value /= 1024
+    return f'{value:.1f} {unit}' if unit != 'B' else f'{int(value)} B'
+
+class display:
+    """
+    Redraw one line per running download and a summary line at most
+    every interval seconds. Text printed with write is kept above them.
+    """
+
+    def __init__(self, reg:registry, out=sys.stdout, interval:float=REFRESH_INTERVAL) -> None:
+        self.__registry:registry = reg
+        self.__out = out
+        self.__interval:float = interval
+        self.__lock:Lock = Lock()
+        self.__lines:int = 0
+        self.__last:dict = {}
+        self.__stop:Event = Event()
+        self.__thread:Thread = Thread(target=self._loop, daemon=True)
+        self.__thread.start()
+
+    def _line(self, t:transfer, now:float, width:int) -> str:
+        before, then = self.__last.get(id(t), (0, t.started))
+        self.__last[id(t)] = (t.done, now)
+        rate = (t.done - before) / (now - then) if now > then else 0.0
+        tail = f' {size(rate)}/s'
+        if t.size:
+            share = min(t.done / t.size, 1.0)
+            tail = f' {share*100:5.1f}%' + tail
+        name = t.name[:max(width - len(tail) - 24, 8)]
+        bar = width - len(name) - len(tail) - 4
+        if t.size and bar > 4:
+            filled = int(bar * share)
+            return f'{name} |{"█" * filled}{" " * (bar - filled)}|{tail}'
+        return f'{name}{tail}'
+
+    def _render(self) -> list:
+        now = time.monotonic()
+        width = shutil.get_terminal_size().columns - 1
+        snap = self.__registry.snapshot()
+        transfers = self.__registry.transfers
+        alive = {id(t) for t in transfers}
+        self.__last = {k: v for k, v in self.__last.items() if k in alive}
+        lines = [self._line(t, now, width) for t in transfers]
+        queues = ' '.join(f'{n}:{d}' for n, d in snap['queue_depths'].items())
+        lines.append(f"{snap['active_downloads']} downloading, {size(snap['bytes_per_second'])}/s, " \
+            f"{size(snap['bytes_received'])} total" + (f", queues {queues}" if queues else ''))
+        return [line[:width] for line in lines]
+
+    def _clear(self) -> None:
+        if self.__lines:
+            self.__out.write(f'\x1b[{self.__lines}F\x1b[J')
+            self.__lines = 0
+
+    def _draw(self, lines:list) -> None:
+        self._clear()
+        if lines:
+            self.__out.write('\n'.join(lines) + '\n')
+            self.__lines = len(lines)
+        self.__out.flush()
+
+    def write(self, text:str) -> None:
+        with self.__lock:
+            self._clear()
+            self.__out.write(text + '\n')
+            self.__out.flush()
+
+    def refresh(self) -> None:
+        with self.__lock: self._draw(self._render())
+
+    def _loop(self) -> None:
+        while not self.__stop.wait(self.__interval): self.refresh()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        self.__thread.join()
+        with self.__lock: self._draw([])
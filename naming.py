@@ -0,0 +1,120 @@
+from threading import Lock
+import string
+import os
+
+DEFAULT_TEMPLATE = '{title}.{ext}'
+FIELDS = ['title', 'id', 'ext', 'channel', 'channel_id', 'upload_date', 'resolution', 'itag', 'length']
+MISSING = 'NA'
+# Room left in a file name for -N suffixes and .fITAG.ext.part.json work files
+MAX_STEM_BYTES = 200
+
+# Spaces become dashes, everything a shell or filesystem may trip over goes
+_TABLE = str.maketrans(' ', '-', ''.join(map(chr, [*range(32), 127])) + '!@#$%^&*()+=<>,.?/\'"\\|{}[]~`:;')
+
+class TemplateError(ValueError): pass
+
+def sanitize(value) -> str:
+    """
+    Make value safe to use inside a file name, in one pass over it.
+    """
+    return str(value).translate(_TABLE)
+
+def _fit(name:str) -> str:
+    stem, ext = os.path.splitext(name)
+    data = stem.encode()
+    if len(data) <= MAX_STEM_BYTES: return name
+    return data[:MAX_STEM_BYTES].decode(errors='ignore') + ext
+
+class template:
+    """
+    Output path template like '{channel}/{upload_date}-{title}-{id}.{ext}',
+    parsed once. Fields are sanitized, the literal text (and its '/') is
+    kept as written.
+    """
+
+    def __init__(self, text:str) -> None:
+        try: parts = list(string.Formatter().parse(text))
+        except ValueError as e: raise TemplateError(f'Invalid template {text}: {e}') from e
+        for _, field, _, conversion in parts:
+            if field is None: continue
+            if field not in FIELDS: raise TemplateError(f'Unknown field {{{field}}}, use {", ".join(FIELDS)}')
+            if conversion: raise TemplateError(f'Conversions like !{conversion} are not supported')
+        # Fields never render as '' or '..', so the shape of the path shows with any stand-in
+        skeleton = ''.join(literal + ('x' if field is not None else '') for literal, field, _, _ in parts)
+        if os.path.isabs(skeleton) or '..' in skeleton.split('/'):
+            raise TemplateError(f'Template must stay inside the target: {text}')
+        if not text or text.endswith('/'): raise TemplateError(f'Template has no file name: {text}')
+        self.__text:str = text
+        self.__parts:list = [(literal, field, spec) for literal, field, spec, _ in parts]
+
+    @property
+    def text(self) -> str: return self.__text
+
+    @property
+    def fields(self) -> set:
+        return {field for _, field, _ in self.__parts if field is not None}
+
+    def render(self, values:dict) -> str:
+        """
+        Relative path for values, missing ones are written as NA.
+        """
+        out = []
+        for literal, field, spec in self.__parts:
+            out.append(literal)
+            if field is None: continue
+            value = values.get(field)
+            try: text = MISSING if value is None else format(value, spec)
+            except ValueError: text = str(value)
+            out.append(sanitize(text) or MISSING)
+        directory, name = os.path.split(''.join(out))
+        return os.path.join(directory, _fit(name))
+
+class name_index:
+    """
+    File names per directory, read once with a single scandir, so a free
+    name costs one stat however many files are there. Stems given out in
+    this run go to one owner only.
+    """
+
+    def __init__(self) -> None:
+        self.__lock:Lock = Lock()
+        # directory -> (names found on disk, {stem claimed in this run: owner})
+        self.__dirs:dict = {}
+
+    def _directory(self, directory:str) -> tuple:
+        if directory not in self.__dirs:
+            try:
+                with os.scandir(directory) as entries: existing = {e.name for e in entries}
+            except (FileNotFoundError, NotADirectoryError): existing = set()
+            self.__dirs[directory] = (existing, {})
+        return self.__dirs[directory]
+
+    def claim(self, path:str, same=None, owner=None) -> str:
+        """
+        Return path, or path with a -N suffix if the name is taken. A file
+        already on disk is reused when same(path) says it is this one, a
+        name claimed before is reused by the same owner.
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        stem, ext = os.path.splitext(name)
+        with self.__lock:
+            existing, claimed = self._directory(directory)
+            candidate = stem; n = 0
+            while True:
+                full = os.path.join(directory, candidate + ext)
+                if owner is not None and claimed.get(candidate) == owner: break
+                if candidate not in claimed:
+                    # One check of the chosen name catches files written since the scan
+                    if candidate + ext not in existing and os.path.lexists(full): existing.add(candidate + ext)
+                    if candidate + ext not in existing or (same and same(full)): break
+                n += 1; candidate = f'{stem}-{n}'
+            claimed[candidate] = owner
+            return os.path.join(directory, candidate + ext)
+
+    def forget(self, directory:str=None) -> None:
+        """
+        Read directory (or all of them) from disk again on next use.
+        """
+        with self.__lock:
+            if directory is None: self.__dirs.clear()
+            else: self.__dirs.pop(os.path.abspath(directory), None)
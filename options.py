@@ -1,8 +1,5 @@
 from collections import OrderedDict
-from enum import Enum
-from lib2to3.pgen2.token import OP
 from types import FunctionType
-import inspect
 import sys
 
 SHORT_JUST = 20
@@ -19,7 +16,7 @@ DEFAULT_ARG_PLACEHOLDER = 'arg'
 
 HELP_STR_REC = 'HELP: '
 
-class option_error(Enum):
+class option_error:
     NOT_OPTION = 'Element must be an _root_option subclass.'
     NAME_IN_USE = 'This option name is already in use!'
     ATERISK_TYPE = 'Aterisk option is only for list types.'
@@ -34,14 +31,96 @@ class option_error(Enum):
 class OptionError(ValueError): pass
 class TranslationError(ValueError): pass
 
+class _trie:
+    __slots__ = ('children', 'option', 'count')
+
+    def __init__(self) -> None:
+        self.children:dict = {}
+        self.option = None
+        self.count:int = 0
+
 class option_set(set):
+    """
+    Set of options indexed by short and long name. Long names can also
+    be found by any prefix that only one of them starts with.
+    """
+
+    def __init__(self, *args) -> None:
+        self.__short:dict = {}
+        self.__long:dict = {}
+        self.__trie:_trie = _trie()
+        self.__help:tuple = None
+        super().__init__()
+        for element in args and args[0]: self.add(element)
+
     def add(self, __element):
         if not issubclass(type(__element), _root_option): raise OptionError(option_error.NOT_OPTION)
-        if __element.long in list(map(lambda x: x.long, self)):
+        if __element.long in self.__long:
             raise OptionError(f'{option_error.NAME_IN_USE} ({__element.long})')
-        if __element.short in list(map(lambda x: x.short, self)):
+        if __element.short in self.__short:
             raise OptionError(f'{option_error.NAME_IN_USE} ({__element.short})')
         super().add(__element)
+        self.__help = None
+        self.__short[__element.short] = __element
+        self.__long[__element.long] = __element
+        node = self.__trie
+        for char in __element.long:
+            node = node.children.setdefault(char, _trie())
+            node.count += 1; node.option = __element
+
+    def discard(self, __element) -> None:
+        if self.__long.get(getattr(__element, 'long', None)) is not __element: return
+        super().discard(__element)
+        self.__help = None
+        del self.__short[__element.short]
+        del self.__long[__element.long]
+        node = self.__trie
+        for depth, char in enumerate(__element.long, 1):
+            child = node.children[char]
+            child.count -= 1
+            if not child.count: del node.children[char]; return
+            if child.option is __element:
+                # Removing is rare, look for another option under this prefix
+                prefix = __element.long[:depth]
+                child.option = next(o for o in self.__long.values() if o.long.startswith(prefix))
+            node = child
+
+    def remove(self, __element) -> None:
+        if __element not in self: raise KeyError(__element)
+        self.discard(__element)
+
+    def clear(self) -> None:
+        super().clear()
+        self.__help = None
+        self.__short.clear(); self.__long.clear(); self.__trie = _trie()
+
+    def short(self, name:str):
+        return self.__short.get(name)
+
+    def help(self) -> str:
+        """
+        Help lines of all options sorted by short name, kept until the
+        set or the column widths change.
+        """
+        if self.__help is None or self.__help[0] != (SHORT_JUST, LONG_JUST):
+            lines = [o.spec.help() for o in sorted(self, key=lambda x: x.short)]
+            self.__help = ((SHORT_JUST, LONG_JUST), '\n'.join(lines))
+        return self.__help[1]
+
+    def long(self, name:str, abbreviated:bool=True):
+        """
+        Return the option named name, or the only one whose long name
+        starts with it. Prefixes shared by several options raise an
+        OptionError naming them.
+        """
+        if name in self.__long or not abbreviated: return self.__long.get(name)
+        node = self.__trie
+        for char in name:
+            node = node.children.get(char)
+            if node is None: return None
+        if node.count == 1: return node.option
+        matches = sorted(o.long for o in self.__long.values() if o.long.startswith(name))
+        raise OptionError(f'Ambiguous option: --{name} could be ' + ', '.join(f'--{m}' for m in matches))
 
 _opt_set = option_set()
 
@@ -83,21 +162,50 @@ class boolean(var):
 
 def val(element:var): return element.vtype(element.value) if element.vtype else element.value
 
+class option_spec:
+    """
+    Everything parsing and help need to know about one option, worked out
+    once when the option is registered.
+    """
+    __slots__ = ('short', 'long', 'min_params', 'max_params', 'param_str', \
+        'description', 'converters', '_help')
+
+    def __init__(self, short:str, long:str, min_params:int, max_params:int, \
+        param_str:str, description:str, converters:tuple=()) -> None:
+        for name, value in zip(self.__slots__, (short, long, min_params, max_params, \
+            param_str, description, tuple(converters), None)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError(f'option_spec is immutable ({name})')
+
+    def help(self) -> str:
+        """
+        Help line of the option, rendered on first use for the current
+        column widths.
+        """
+        if self._help is None or self._help[0] != (SHORT_JUST, LONG_JUST):
+            short_str = f"-{self.short}{self.param_str}"
+            long_str = f"--{self.long}{self.param_str}"
+            object.__setattr__(self, '_help', ((SHORT_JUST, LONG_JUST), \
+                f"{short_str.ljust(SHORT_JUST, ' ')[:SHORT_JUST]} | " + \
+                f"{long_str.ljust(LONG_JUST, ' ')[:LONG_JUST]} | {self.description}"))
+        return self._help[1]
+
 class _root_option:
     def __init__(self, short:str, long:str, min_params:int, \
-        max_params:int, str_params:str, description:str) -> None:
-        self.__short:str = short
-        self.__long:str = long
-        self.__max:int = max_params
-        self.__min:int = min_params
-        self.__str:str = str_params
-        self.__description:str = description
+        max_params:int, str_params:str, description:str, converters:tuple=()) -> None:
+        self.__spec:option_spec = option_spec(short, long, min_params, \
+            max_params, str_params, description, converters)
 
     @property
-    def short(self) -> str: return self.__short
+    def spec(self) -> option_spec: return self.__spec
 
     @property
-    def long(self) -> str: return self.__long
+    def short(self) -> str: return self.__spec.short
+
+    @property
+    def long(self) -> str: return self.__spec.long
 
     def __eq__(self, other) -> bool:
         return self.short == other.short and self.long == other.long
@@ -106,23 +214,19 @@ class _root_option:
 
     def __hash__(self) -> int: return hash((self.short, self.long))
 
-    def __str__(self) -> str:
-        short_str = f"-{self.short}{self.param_str}"
-        long_str = f"--{self.long}{self.param_str}"
-        return f"{short_str.ljust(SHORT_JUST, ' ')[:SHORT_JUST]} | " + \
-            f"{long_str.ljust(LONG_JUST, ' ')[:LONG_JUST]} | {self.description}"
+    def __str__(self) -> str: return self.__spec.help()
 
     @property
-    def min_params(self) -> int: return self.__min
+    def min_params(self) -> int: return self.__spec.min_params
 
     @property
-    def max_params(self) -> int: return self.__max
+    def max_params(self) -> int: return self.__spec.max_params
 
     @property
-    def param_str(self) -> str: return self.__str
+    def param_str(self) -> str: return self.__spec.param_str
 
     @property
-    def description(self) -> str: return self.__description
+    def description(self) -> str: return self.__spec.description
 
 class bool_option(_root_option):
     def __init__(self, short:str, long:str, var_ptr:var, description:str=BOOL_OPT_DEF_DESC) -> None:
@@ -134,62 +238,78 @@ class bool_option(_root_option):
     @property
     def var_ptr(self) -> var: return self.__var_ptr
 
-class func_option(_root_option):
+# Flags of a code object (inspect.CO_VARARGS and CO_VARKEYWORDS)
+_CO_VARARGS = 0x04
+_CO_VARKEYWORDS = 0x08
 
-    def __init__(self, short:str, long:str, func:FunctionType, description:str=None) -> None:
-        self.__func:FunctionType = func
-        self.__params: OrderedDict = self._params
-        min_params:int = self._min_params
-        max_params:int = self._max_params
-        str_params:str = self._param_str
-        description:str = description if description else self._description
-        super().__init__(short, long, min_params, max_params, str_params, description)
-        _opt_set.add(self)
+class _signature:
+    """
+    Positional parameters of a function, read from its code object so
+    registering options never imports inspect.
+    """
+    __slots__ = ('names', 'required', 'varargs')
+
+    def __init__(self, func:FunctionType) -> None:
+        target = getattr(func, '__func__', func)
+        code = getattr(target, '__code__', None)
+        if code is None:
+            self._from_inspect(func); return
+        if code.co_kwonlyargcount or code.co_posonlyargcount or code.co_flags & _CO_VARKEYWORDS:
+            raise OptionError(option_error.PARAM_KEYWORD)
+        names = code.co_varnames[:code.co_argcount]
+        if target is not func: names = names[1:]
+        self.names:tuple = names
+        self.required:int = len(names) - len(target.__defaults__ or ())
+        self.varargs:str = code.co_varnames[code.co_argcount] if code.co_flags & _CO_VARARGS else None
+
+    def _from_inspect(self, func) -> None:
+        # Builtins and partials have no code object to read
+        import inspect
+        params = inspect.signature(func).parameters.values()
+        for param in params:
+            if param.kind not in [param.POSITIONAL_OR_KEYWORD, param.VAR_POSITIONAL]:
+                raise OptionError(option_error.PARAM_KEYWORD)
+        self.names = tuple(p.name for p in params if p.kind == p.POSITIONAL_OR_KEYWORD)
+        self.required = len([p for p in params if p.kind == p.POSITIONAL_OR_KEYWORD and p.default == p.empty])
+        self.varargs = next((p.name for p in params if p.kind == p.VAR_POSITIONAL), None)
 
     @property
-    def func(self) -> FunctionType: return self.__func
+    def arity(self) -> tuple:
+        return (self.required, -1 if self.varargs else len(self.names))
 
     @property
-    def params(self) -> OrderedDict: return self.__params.copy()
+    def param_str(self) -> str:
+        result:str = ''
+        for i, name in enumerate(self.names):
+            result += f' {name}' if i < self.required else f' [{name}]'
+        if self.varargs: result += f' [*{self.varargs}]'
+        return result
 
-    @property
-    def _min_params(self) -> int:
-        return len([p for p in self.params.values() \
-            if p.default == p.empty and p.kind != p.VAR_POSITIONAL])
+def _func_description(func:FunctionType) -> str:
+    if not func.__doc__:
+        return FNC_OPT_DEF_DESC
+    for line in func.__doc__.replace('\t', '').split('\n'):
+        line = line.lstrip(' ')
+        if line.startswith(HELP_STR_REC): return line[len(HELP_STR_REC):]
+    return FNC_OPT_DEF_DESC
 
-    @property
-    def _max_params(self) -> int:
-        if len(self.params) == 0: return 0
-        last = list(self.params.values())[-1]
-        if last.kind == last.VAR_POSITIONAL: return -1
-        return len(self.params.values())
+class func_option(_root_option):
 
-    @property
-    def _description(self) -> str:
-        if not self.func.__doc__:
-            return FNC_OPT_DEF_DESC
-        doc_list = self.func.__doc__.replace('\t', '').split('\n')
-        for line in doc_list:
-            while line.startswith(' '): line = line[1:]
-            if line.startswith(HELP_STR_REC): return line[6:]
-        return FNC_OPT_DEF_DESC
+    def __init__(self, short:str, long:str, func:FunctionType, description:str=None) -> None:
+        self.__func:FunctionType = func
+        sig = _signature(func)
+        min_params, max_params = sig.arity
+        description:str = description if description else _func_description(func)
+        super().__init__(short, long, min_params, max_params, sig.param_str, description)
+        _opt_set.add(self)
 
     @property
-    def _param_str(self) -> str:
-        result:str = ''
-        for param in self.params.values():
-            if param.kind != param.POSITIONAL_OR_KEYWORD: result += f' [*{param.name}]'
-            elif param.default == param.empty: result += f' {param.name}'
-            elif param.default != param.empty: result += f' [{param.name}]'
-        return result
+    def func(self) -> FunctionType: return self.__func
 
     @property
-    def _params(self) -> OrderedDict:
-        sig = inspect.signature(self.func)
-        for param in sig.parameters.values():
-            if param.kind not in [param.POSITIONAL_OR_KEYWORD, param.VAR_POSITIONAL]:
-                raise OptionError(option_error.PARAM_KEYWORD)
-        return sig.parameters.copy()
+    def params(self) -> OrderedDict:
+        import inspect
+        return inspect.signature(self.__func).parameters.copy()
 
 class var_option(_root_option):
     def __init__(self, short:str, long:str, *args, description:str=VAR_OPT_DEF_DESC) -> None:
@@ -198,7 +318,8 @@ class var_option(_root_option):
             if type(arg) != var: raise OptionError(option_error.NOT_VAR)
         self.__args:list = args
         minmax:tuple = self._minmax
-        super().__init__(short, long, minmax[0], minmax[1], self._str_params, description)
+        super().__init__(short, long, minmax[0], minmax[1], self._str_params, description, \
+            [arg.vtype for arg in args])
         _opt_set.add(self)
 
     @property
@@ -254,27 +375,42 @@ def option(short, long):
 class _sys_arg_translator(OrderedDict):
 
     def get_short(self, short):
-        for o in _opt_set:
-            if o.short == short: return o
-        return None
-    
+        return _opt_set.short(short)
+
     def get_long(self, long):
-        for o in _opt_set:
-            if o.long == long: return o
-        return None
+        try: return _opt_set.long(long)
+        except OptionError as e: raise TranslationError(str(e))
+
+    def _bundle(self, flags:str) -> list:
+        """
+        Split '-al' into the single letter options it bundles, every one
+        but the last must work without a value.
+        """
+        opts = [self.get_short(char) for char in flags]
+        if any(opt is None for opt in opts): return None
+        for opt in opts[:-1]:
+            if opt.min_params > 0:
+                raise TranslationError(f'-{opt.short} takes a value and cannot be bundled in -{flags}')
+        return opts
 
     def translate(self) -> None:
         key:_root_option = None
         for arg in sys.argv[1:]:
 
             if arg.startswith('--'):
-                if opt := self.get_long(arg[2:]):
-                    key = opt; self[key] = []; continue
+                name, eq, value = arg[2:].partition('=')
+                if opt := self.get_long(name):
+                    key = opt; self[key] = [value] if eq else []; continue
 
-            if arg.startswith('-'):
+            # A lone '-' is a value, it usually stands for stdin
+            if arg.startswith('-') and arg != '-':
                 if opt := self.get_short(arg[1:]):
                     key = opt; self[key] = []; continue
-                
+
+                if opts := self._bundle(arg[1:]):
+                    for opt in opts: self[opt] = []
+                    key = opts[-1]; continue
+
                 raise TranslationError(f'No option named: {arg}')
             
             if key in self.keys():
@@ -284,22 +420,24 @@ class _sys_arg_translator(OrderedDict):
 
     def _check_var_option(self, key, args) -> bool:
         if type(key) == var_option:
-            if not key.max_params == -1 and \
-                len(args) > key.max_params:
-                    raise TranslationError(f'--{key.long} takes {key.max_params} positional ' + \
-                        f'{"arguments" if key.max_params > 1 else "argument"} but ' + \
+            spec = key.spec
+            if not spec.max_params == -1 and \
+                len(args) > spec.max_params:
+                    raise TranslationError(f'--{spec.long} takes {spec.max_params} positional ' + \
+                        f'{"arguments" if spec.max_params > 1 else "argument"} but ' + \
                             f'{len(args)} {"was" if len(args) < 2 else "were"} given')
-            if len(args) < key.min_params: raise TranslationError(f'--{key.long} missing {key.min_params-len(args)} ' + \
-                f'positional {"arguments" if key.min_params-len(args) > 1 else "argument"}')
+            if len(args) < spec.min_params: raise TranslationError(f'--{spec.long} missing {spec.min_params-len(args)} ' + \
+                f'positional {"arguments" if spec.min_params-len(args) > 1 else "argument"}')
             return True
         return False
     
     def _set_var_opt_values(self, key, args) -> None:
+        converters = key.spec.converters
         for i, arg in enumerate(args):
             if not key[i].aterisk:
-                if key[i].vtype != None:
-                    try: key[i].set(key[i].vtype(arg)); continue
-                    except: raise TranslationError(f'Unable to convert {i+1} param of --{key.long} into {key[i].vtype.__name__}')
+                if converters[i] != None:
+                    try: key[i].set(converters[i](arg)); continue
+                    except: raise TranslationError(f'Unable to convert {i+1} param of --{key.long} into {converters[i].__name__}')
                 key[i].set(arg)
                 continue
             if key[i].aterisk:
@@ -353,8 +491,4 @@ def show_help():
     """
     HELP: Show syntax for usage of this app.
     """
-    res = USAGE_NOTE
-    res += '\nOPTIONS:'
-    for o in sorted(_opt_set, key=lambda x: x.short):
-        res += '\n' + str(o)
-    sys.exit(res)
+    sys.exit(f'{USAGE_NOTE}\nOPTIONS:' + (f'\n{_opt_set.help()}' if _opt_set else ''))
@@ -0,0 +1,133 @@
+from queue import Queue, Empty, Full
+from threading import Thread, Lock, Semaphore, Event
+from types import FunctionType
+
+DEFAULT_WORKERS = 1
+DEFAULT_QUEUE_SIZE = 8
+
+_POLL_INTERVAL = 0.1
+_END = object()
+
+class PipelineError(ValueError): pass
+
+class item:
+    __slots__ = ('index', 'source', 'value', 'error', 'stage')
+
+    def __init__(self, index:int, source:any) -> None:
+        self.index:int = index
+        self.source:any = source
+        self.value:any = source
+        self.error:BaseException = None
+        self.stage:str = None
+
+    @property
+    def ok(self) -> bool: return self.error is None
+
+class stage:
+    def __init__(self, name:str, func:FunctionType, workers:int=DEFAULT_WORKERS) -> None:
+        if workers < 1: raise PipelineError(f'Stage {name} needs at least one worker.')
+        self.__name:str = name
+        self.__func:FunctionType = func
+        self.__workers:int = workers
+
+    @property
+    def name(self) -> str: return self.__name
+
+    @property
+    def func(self) -> FunctionType: return self.__func
+
+    @property
+    def workers(self) -> int: return self.__workers
+
+class pipeline:
+
+    def __init__(self, stages:list, queue_size:int=DEFAULT_QUEUE_SIZE) -> None:
+        if not stages: raise PipelineError('Pipeline needs at least one stage.')
+        if queue_size < 1: raise PipelineError('Queue size must be positive.')
+        self.__stages:list = list(stages)
+        self.__queue_size:int = queue_size
+        self.__stop:Event = Event()
+        self.__queues:list = []
+
+    @property
+    def stages(self) -> list: return self.__stages.copy()
+
+    def depths(self) -> dict:
+        """
+        Number of items waiting in front of each stage.
+        """
+        return {st.name: q.qsize() for st, q in zip(self.__stages, self.__queues)}
+
+    def stop(self) -> None: self.__stop.set()
+
+    def _put(self, q:Queue, element) -> bool:
+        while not self.__stop.is_set():
+            try: q.put(element, timeout=_POLL_INTERVAL); return True
+            except Full: continue
+        return False
+
+    def _get(self, q:Queue):
+        while not self.__stop.is_set():
+            try: return q.get(timeout=_POLL_INTERVAL)
+            except Empty: continue
+        return _END
+
+    def _feed(self, source, out_q:Queue, window:Semaphore) -> None:
+        try:
+            for i, src in enumerate(source):
+                while not window.acquire(timeout=_POLL_INTERVAL):
+                    if self.__stop.is_set(): return
+                if not self._put(out_q, item(i, src)): return
+        except Exception as e:
+            # A failing source is reported as one last errored item
+            broken = item(-1, None); broken.error = e; broken.stage = 'source'
+            self._put(out_q, broken)
+        finally:
+            self._put(out_q, _END)
+
+    def _work(self, st:stage, in_q:Queue, out_q:Queue, alive:list, lock:Lock) -> None:
+        while (it := self._get(in_q)) is not _END:
+            if it.ok:
+                try: it.value = st.func(it.value)
+                except Exception as e: it.error = e; it.stage = st.name
+            if not self._put(out_q, it): return
+        # Wake the sibling workers, the last one to leave closes the next queue
+        self._put(in_q, _END)
+        with lock:
+            alive[0] -= 1
+            last = alive[0] == 0
+        if last: self._put(out_q, _END)
+
+    def run(self, source, ordered:bool=True):
+        """
+        Push every element of source through the stages and yield the
+        finished items in source order, or as soon as they finish when
+        ordered is False.
+        """
+        # Bound the items in flight so a slow head item cannot pile up results
+        window = Semaphore(self.__queue_size + sum(st.workers for st in self.__stages))
+        queues = self.__queues = [Queue(self.__queue_size) for _ in range(len(self.__stages)+1)]
+        threads = [Thread(target=self._feed, args=(source, queues[0], window), daemon=True)]
+        for i, st in enumerate(self.__stages):
+            alive = [st.workers]; lock = Lock()
+            for _ in range(st.workers):
+                threads.append(Thread(target=self._work, daemon=True, \
+                    args=(st, queues[i], queues[i+1], alive, lock)))
+        for t in threads: t.start()
+
+        pending:dict = {}; expected:int = 0
+        try:
+            while (it := self._get(queues[-1])) is not _END:
+                if it.index < 0: pending[float('inf')] = it; continue
+                if not ordered:
+                    yield it
+                    window.release(); continue
+                pending[it.index] = it
+                while expected in pending:
+                    yield pending.pop(expected)
+                    expected += 1
+                    window.release()
+            if float('inf') in pending: yield pending.pop(float('inf'))
+        finally:
+            self.stop()
+            self.__queues = []
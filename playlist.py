@@ -0,0 +1,90 @@
+import json
+import time
+import os
+import links
+
+DEFAULT_STATE_DIR = os.path.join(os.environ.get('XDG_DATA_HOME', \
+    os.path.join(os.path.expanduser('~'), '.local', 'share')), 'ytdl', 'playlists')
+
+class SyncError(IOError): pass
+
+def _length(pl) -> int:
+    try: return int(pl.length)
+    except Exception: return None
+
+class sync_result:
+    def __init__(self, playlist_id:str, path:str, urls:list, added:int, removed:int, ids:list) -> None:
+        self.__playlist_id:str = playlist_id
+        self.__path:str = path
+        self.__urls:list = urls
+        self.__added:int = added
+        self.__removed:int = removed
+        self.__ids:list = ids
+
+    @property
+    def playlist_id(self) -> str: return self.__playlist_id
+
+    @property
+    def urls(self) -> list: return self.__urls.copy()
+
+    @property
+    def added(self) -> int: return self.__added
+
+    @property
+    def removed(self) -> int: return self.__removed
+
+    def __str__(self) -> str:
+        return f"Playlist {self.playlist_id}: {self.added} added, {self.removed} removed"
+
+    def commit(self) -> None:
+        """
+        Remember the synced state, call it once the new videos are saved.
+        """
+        try:
+            os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+            tmp = self.__path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'id': self.__playlist_id, 'synced': time.time(), 'videos': self.__ids}, f)
+            os.replace(tmp, self.__path)
+        except OSError as e:
+            raise SyncError(f'Unable to save playlist state: {e}') from e
+
+def load(path:str) -> list:
+    try:
+        with open(path, 'r') as f: return json.load(f)['videos']
+    except FileNotFoundError: return []
+    except (OSError, ValueError, KeyError) as e:
+        raise SyncError(f'Unable to read playlist state {path}: {e}') from e
+
+def sync(pl, state_dir:str=DEFAULT_STATE_DIR) -> sync_result:
+    """
+    Walk pl (a pytube.Playlist) from the top and collect the videos that
+    were not there on the last sync. Paging stops at the first known video
+    as long as the playlist length agrees that nothing else changed below
+    it, otherwise the whole playlist is walked.
+    """
+    path = os.path.join(state_dir, pl.playlist_id + '.json')
+    known:list = load(path)
+    position:dict = {vid: i for i, vid in enumerate(known)}
+
+    new_urls:list = []; new_ids:list = []; seen:list = []
+    full_walk = not known
+    for url in pl.url_generator():
+        vid = links.video_id(url) or url
+        if vid not in position:
+            new_urls.append(url); new_ids.append(vid); seen.append(vid)
+            continue
+        if not full_walk:
+            hit = position[vid]
+            length = _length(pl)
+            if length is None or length == len(new_ids) + len(known) - hit:
+                fresh = set(new_ids)
+                removed = len([v for v in known[:hit] if v not in fresh])
+                return sync_result(pl.playlist_id, path, new_urls, len(new_ids), \
+                    removed, new_ids + known[hit:])
+            full_walk = True
+        seen.append(vid)
+
+    seen_set = set(seen)
+    removed = len([v for v in known if v not in seen_set])
+    return sync_result(pl.playlist_id, path, new_urls, len(new_ids), removed, seen)
@@ -0,0 +1,100 @@
+import os
+import lazy
+
+# Only needed once something is encoded, keep them off the startup path
+futures = lazy.module('concurrent.futures')
+multiprocessing = lazy.module('multiprocessing')
+subprocess = lazy.module('subprocess')
+
+ENCODER = 'ffmpeg'
+DEFAULT_CODEC = 'mp3'
+DEFAULT_BITRATE = '192k'
+
+# codec name -> (encoder library, file extension)
+CODECS = {
+    'mp3': ('libmp3lame', 'mp3'),
+    'aac': ('aac', 'm4a'),
+    'opus': ('libopus', 'opus'),
+    'vorbis': ('libvorbis', 'ogg'),
+    'flac': ('flac', 'flac'),
+    'wav': ('pcm_s16le', 'wav'),
+}
+LOSSLESS = ['flac', 'wav']
+
+class PostprocessError(RuntimeError): pass
+
+def extension(codec:str) -> str: return CODECS[codec][1]
+
+def _run(args:list) -> None:
+    try:
+        result = subprocess.run([ENCODER, '-hide_banner', '-loglevel', 'error', '-y'] + args, \
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise PostprocessError(f'Unable to run {ENCODER}: {e}') from e
+    if result.returncode != 0:
+        message = result.stderr.decode(errors='replace').strip().splitlines()
+        raise PostprocessError(f'{ENCODER} failed: {message[-1] if message else result.returncode}')
+
+def transcode_audio(src:str, dst:str, codec:str=DEFAULT_CODEC, bitrate:str=DEFAULT_BITRATE) -> str:
+    """
+    Encode the audio track of src into dst and remove src afterwards.
+    """
+    if codec not in CODECS: raise PostprocessError(f'Unknown audio codec: {codec}')
+    args = ['-i', src, '-vn', '-c:a', CODECS[codec][0]]
+    if codec not in LOSSLESS: args += ['-b:a', bitrate]
+    tmp = f'{dst}.tmp.{extension(codec)}'
+    try:
+        _run(args + [tmp])
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+    if os.path.abspath(src) != os.path.abspath(dst): os.remove(src)
+    return dst
+
+def container(video_subtype:str, audio_subtype:str) -> str:
+    if video_subtype == audio_subtype and video_subtype in ['mp4', 'webm']:
+        return video_subtype
+    return 'mkv'
+
+def mux(video:str, audio:str, dst:str) -> str:
+    """
+    Copy the video track of video and the audio track of audio into dst
+    without re-encoding, then remove both inputs.
+    """
+    tmp = f'{dst}.tmp{os.path.splitext(dst)[1]}'
+    try:
+        _run(['-i', video, '-i', audio, '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', tmp])
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+    for src in [video, audio]:
+        if os.path.abspath(src) != os.path.abspath(dst): os.remove(src)
+    return dst
+
+class pool:
+    """
+    Process pool for the encoder jobs, workers are spawned on first use
+    so runs without post-processing never start one.
+    """
+
+    def __init__(self, workers:int=None) -> None:
+        self.__workers:int = workers or os.cpu_count() or 1
+        self.__executor:'futures.ProcessPoolExecutor' = None
+
+    @property
+    def workers(self) -> int: return self.__workers
+
+    def submit(self, func, *args) -> 'futures.Future':
+        if self.__executor is None:
+            # Forking the threaded downloader is unsafe, start clean workers
+            self.__executor = futures.ProcessPoolExecutor(self.__workers, \
+                mp_context=multiprocessing.get_context('spawn'))
+        return self.__executor.submit(func, *args)
+
+    def run(self, func, *args):
+        return self.submit(func, *args).result()
+
+    def shutdown(self) -> None:
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
@@ -0,0 +1,140 @@
+from threading import Lock, Thread, Event
+from weakref import WeakSet
+import time
+import os
+import re
+
+BURST_SECONDS = 0.25
+POLL_INTERVAL = 1.0
+
+_UNITS = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30}
+_RATE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?\s*$', re.IGNORECASE)
+
+class RateError(ValueError): pass
+
+def parse_rate(value:str) -> float:
+    """
+    Parse '500k', '20M' or '1.5G' (bytes per second, binary units) into
+    a number of bytes per second. '0' means unlimited and returns None.
+    """
+    match = _RATE.match(str(value))
+    if not match: raise RateError(f'Not a rate: {value}')
+    rate = float(match.group(1)) * _UNITS[match.group(2).lower()]
+    return rate or None
+
+class token_bucket:
+    """
+    Reservations are served strictly in call order, so transfers that ask
+    for one chunk at a time share the rate evenly.
+    """
+
+    def __init__(self, rate:float=None) -> None:
+        self.__lock:Lock = Lock()
+        self.__rate:float = rate
+        self.__next:float = time.monotonic()
+
+    @property
+    def rate(self) -> float: return self.__rate
+
+    def set_rate(self, rate:float) -> None:
+        with self.__lock:
+            self.__rate = rate
+            self.__next = min(self.__next, time.monotonic())
+
+    def reserve(self, size:int) -> float:
+        """
+        Take size bytes and return how long the caller has to wait.
+        """
+        with self.__lock:
+            if not self.__rate: return 0.0
+            now = time.monotonic()
+            start = max(self.__next, now - BURST_SECONDS)
+            self.__next = start + size / self.__rate
+            return self.__next - now
+
+    def consume(self, size:int) -> None:
+        delay = self.reserve(size)
+        if delay > 0: time.sleep(delay)
+
+class _job:
+    def __init__(self, total:token_bucket, rate:float) -> None:
+        self.bucket:token_bucket = token_bucket(rate)
+        self.__total:token_bucket = total
+
+    def __call__(self, size:int) -> None:
+        delay = max(self.bucket.reserve(size), self.__total.reserve(size))
+        if delay > 0: time.sleep(delay)
+
+class limiter:
+    """
+    Total rate shared by every transfer plus an optional rate for each
+    job. Both can be changed while transfers are running.
+    """
+
+    def __init__(self, total:float=None, per_job:float=None) -> None:
+        self.__total:token_bucket = token_bucket(total)
+        self.__per_job:float = per_job
+        self.__jobs:WeakSet = WeakSet()
+        self.__lock:Lock = Lock()
+
+    @property
+    def total(self) -> float: return self.__total.rate
+
+    @property
+    def per_job(self) -> float: return self.__per_job
+
+    @property
+    def active(self) -> bool: return bool(self.__total.rate or self.__per_job)
+
+    def set_rates(self, total:float, per_job:float) -> None:
+        self.__total.set_rate(total)
+        with self.__lock:
+            self.__per_job = per_job
+            for job in list(self.__jobs): job.bucket.set_rate(per_job)
+
+    def job(self) -> _job:
+        """
+        Return the throttle for one transfer, call it with the size of
+        every received chunk.
+        """
+        job = _job(self.__total, self.__per_job)
+        with self.__lock: self.__jobs.add(job)
+        return job
+
+def read_control(path:str) -> tuple:
+    """
+    Read 'total [per_job]' rates from a control file.
+    """
+    with open(path, 'r') as f: parts = f.read().split()
+    if not parts or len(parts) > 2: raise RateError(f'Expected "total [per-job]" rates in {path}')
+    return parse_rate(parts[0]), (parse_rate(parts[1]) if len(parts) > 1 else None)
+
+class control_file:
+    """
+    Watch path and apply its rates to lim whenever the file changes.
+    """
+
+    def __init__(self, path:str, lim:limiter, on_error=None) -> None:
+        self.__path:str = path
+        self.__limiter:limiter = lim
+        self.__on_error = on_error
+        self.__mtime:float = None
+        self.__stop:Event = Event()
+        self.check()
+        Thread(target=self._watch, daemon=True).start()
+
+    def check(self) -> None:
+        try:
+            mtime = os.stat(self.__path).st_mtime
+            if mtime == self.__mtime: return
+            self.__mtime = mtime
+            self.__limiter.set_rates(*read_control(self.__path))
+        except FileNotFoundError:
+            pass
+        except (OSError, RateError) as e:
+            if self.__on_error: self.__on_error(e)
+
+    def _watch(self) -> None:
+        while not self.__stop.wait(POLL_INTERVAL): self.check()
+
+    def stop(self) -> None: self.__stop.set()
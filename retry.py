@@ -0,0 +1,175 @@
+from threading import Lock
+import errno
+import time
+import sys
+import lazy
+
+random = lazy.module('random')
+json = lazy.module('json')
+
+TRANSIENT, THROTTLED, EXPIRED, UNAVAILABLE, UNSUPPORTED, LOCAL, UNKNOWN = \
+    'transient', 'throttled', 'expired', 'unavailable', 'unsupported', 'local', 'unknown'
+# Only these can succeed when the same request is simply made again, expired
+# links need new ones from the video page first
+RETRYABLE = [TRANSIENT, THROTTLED]
+
+DEFAULT_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+# Throttled requests start waiting longer
+THROTTLED_FACTOR = 5
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+# A video has nothing that can be downloaded the way it was asked for
+class NoStreamError(LookupError): pass
+
+_THROTTLED_STATUS = [429, 503]
+# A media host refusing a link: its signature expired or was made for another address
+_EXPIRED_STATUS = [403]
+_UNAVAILABLE_STATUS = [401, 404, 410, 451]
+_LOCAL_ERRNO = [errno.ENOSPC, errno.EACCES, errno.EPERM, errno.EROFS, errno.EDQUOT, \
+    errno.ENAMETOOLONG, errno.EISDIR, errno.ENOTDIR, errno.EMFILE]
+
+def _pytube(error:BaseException) -> str:
+    exceptions = sys.modules.get('pytube.exceptions')
+    if exceptions is None or not isinstance(error, exceptions.PytubeError): return None
+    if isinstance(error, exceptions.VideoUnavailable): return UNAVAILABLE
+    if isinstance(error, exceptions.MaxRetriesExceeded): return TRANSIENT
+    # Extraction broke, usually a YouTube change pytube does not know yet
+    return UNSUPPORTED
+
+def classify(error:BaseException) -> str:
+    """
+    Class of a failure: transient, throttled, expired (links refused),
+    unavailable, unsupported, local (disk, permissions, encoder) or unknown.
+    """
+    # Whatever raised error has imported these already
+    from urllib.error import HTTPError, URLError
+    from http.client import HTTPException
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, HTTPError):
+            if error.code in _THROTTLED_STATUS: return THROTTLED
+            if error.code in _EXPIRED_STATUS: return EXPIRED
+            if error.code in _UNAVAILABLE_STATUS: return UNAVAILABLE
+            return TRANSIENT if error.code >= 500 or error.code == 408 else UNAVAILABLE
+        found = _pytube(error)
+        if found: return found
+        if isinstance(error, (URLError, HTTPException, ConnectionError, TimeoutError)): return TRANSIENT
+        if isinstance(error, OSError) and (error.errno in _LOCAL_ERRNO or error.filename): return LOCAL
+        if isinstance(error, NoStreamError): return UNSUPPORTED
+        # Wrappers like FetchError keep the real failure as their cause
+        cause = error.__cause__ or error.__context__
+        # A plain I/O error of its own is a transfer that broke off
+        if cause is None and isinstance(error, OSError): return TRANSIENT
+        error = cause
+    return UNKNOWN
+
+def backoff(attempt:int, kind:str=TRANSIENT, cap:float=None) -> float:
+    """
+    Seconds to wait before retry attempt (0 for the first retry), full
+    jitter over an exponentially growing window.
+    """
+    base = BACKOFF_BASE * (THROTTLED_FACTOR if kind == THROTTLED else 1)
+    return random.uniform(0, min(cap or BACKOFF_CAP, base * 2 ** attempt))
+
+class breaker:
+    """
+    Per host circuit breaker: after threshold failures in a row a host
+    gets no requests for cooldown seconds, then one trial request
+    decides whether it is closed again.
+    """
+
+    def __init__(self, threshold:int=BREAKER_THRESHOLD, cooldown:float=BREAKER_COOLDOWN) -> None:
+        self.__threshold:int = threshold
+        self.__cooldown:float = cooldown
+        self.__lock:Lock = Lock()
+        # host -> [failures in a row, open until, trial running]
+        self.__hosts:dict = {}
+
+    def delay(self, host:str) -> float:
+        """
+        Seconds until host may be asked again, 0 lets this caller go ahead.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            state = self.__hosts.get(host)
+            if state is None or state[0] < self.__threshold: return 0.0
+            if now < state[1]: return state[1] - now
+            if state[2]: return min(self.__cooldown, 1.0)
+            state[2] = True
+            return 0.0
+
+    def success(self, host:str) -> None:
+        with self.__lock: self.__hosts.pop(host, None)
+
+    def failure(self, host:str) -> None:
+        with self.__lock:
+            state = self.__hosts.setdefault(host, [0, 0.0, False])
+            state[0] += 1; state[2] = False
+            if state[0] >= self.__threshold: state[1] = time.monotonic() + self.__cooldown
+
+    def release(self, host:str) -> None:
+        """
+        End a trial request that brought no verdict, the next caller makes
+        another one.
+        """
+        with self.__lock:
+            state = self.__hosts.get(host)
+            if state is not None: state[2] = False
+
+    def wait(self, host:str, stop=None) -> None:
+        """
+        Block until host may be asked again or the stop event is set.
+        """
+        while (seconds := self.delay(host)) > 0:
+            if stop is None: time.sleep(seconds)
+            elif stop.wait(seconds): return
+
+class failure:
+    __slots__ = ('url', 'stage', 'kind', 'message', 'attempts')
+
+    def __init__(self, url:str, stage:str, kind:str, message:str, attempts:int) -> None:
+        self.url:str = url
+        self.stage:str = stage
+        self.kind:str = kind
+        self.message:str = message
+        self.attempts:int = attempts
+
+class failure_report:
+    """
+    Items that failed for good during a run, reported once it ends.
+    """
+
+    def __init__(self) -> None:
+        self.__lock:Lock = Lock()
+        self.__failures:list = []
+
+    def __len__(self) -> int: return len(self.__failures)
+
+    def __iter__(self): return iter(list(self.__failures))
+
+    def add(self, url:str, stage:str, kind:str, message:str, attempts:int=1) -> None:
+        with self.__lock: self.__failures.append(failure(url, stage, kind, message, attempts))
+
+    def counts(self) -> dict:
+        counts = {}
+        for f in self: counts[f.kind] = counts.get(f.kind, 0) + 1
+        return counts
+
+    def __str__(self) -> str:
+        kinds = sorted(self.counts().items(), key=lambda x: -x[1])
+        lines = [f"{len(self)} failed: " + ', '.join(f"{n} {kind}" for kind, n in kinds)]
+        for f in self:
+            lines.append(f"  {f.url} [{f.kind}, {f.stage}, {f.attempts} attempts]: {f.message}")
+        return '\n'.join(lines)
+
+    def save(self, path:str) -> None:
+        """
+        Write the failures as JSON lines.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            for fail in self:
+                f.write(json.dumps({name: getattr(fail, name) for name in failure.__slots__}) + '\n')
@@ -0,0 +1,37 @@
+import unittest
+import tempfile
+import os
+import archive
+
+class TestSum_archive(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.dir.name, 'sub', 'archive.txt')
+
+	def tearDown(self):
+		self.dir.cleanup()
+
+	def test_add(self):
+
+		a = archive.archive(self.path)
+		self.assertNotIn('dQw4w9WgXcQ', a)
+		a.add('dQw4w9WgXcQ', 22, '/videos/Never-gonna.mp4')
+		self.assertIn('dQw4w9WgXcQ', a)
+
+		b = archive.archive(self.path)
+		self.assertEqual(len(b), 1)
+		self.assertEqual(b['dQw4w9WgXcQ'], ('22', '/videos/Never-gonna.mp4'))
+
+	def test_plain_ids(self):
+
+		os.makedirs(os.path.dirname(self.path))
+		with open(self.path, 'w') as f: f.write('aaaaaaaaaaa\n\nbbbbbbbbbbb\t18\n')
+		a = archive.archive(self.path)
+		self.assertEqual(len(a), 2)
+		self.assertIn('aaaaaaaaaaa', a)
+		self.assertEqual(a['bbbbbbbbbbb'], ('18', None))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import tempfile
+import os
+import bench
+import bench_options
+import options
+
+class TestSum_bench(unittest.TestCase):
+
+	def test_compare(self):
+
+		base = {'single': {'mb_per_s': 100.0, 'ttfb_ms': 10.0, 'videos': 1}}
+		self.assertEqual(bench.compare({'single': {'mb_per_s': 90.0, 'ttfb_ms': 12.0, 'videos': 1}}, base), [])
+		slow = bench.compare({'single': {'mb_per_s': 50.0, 'ttfb_ms': 20.0}, 'new': {'ttfb_ms': 1.0}}, base)
+		self.assertEqual(slow, [('single', 'mb_per_s', 100.0, 50.0), ('single', 'ttfb_ms', 10.0, 20.0)])
+
+	def test_median(self):
+
+		runs = [{'a': 3, 'b': None}, {'a': 1, 'b': 2.0}, {'a': 2, 'b': None}]
+		self.assertEqual(bench.median(runs), {'a': 2, 'b': 2.0})
+
+	def test_baselines(self):
+
+		with tempfile.TemporaryDirectory() as d:
+			path = os.path.join(d, 'baselines.json')
+			self.assertEqual(bench.load_baselines(path), {})
+			bench.save_baselines('download', {'single': {'mb_per_s': 1.0}}, path)
+			bench.save_baselines('options', {'parse': {'ms': 2.0}}, path)
+			stored = bench.load_baselines(path)
+			self.assertEqual(stored['download']['results'], {'single': {'mb_per_s': 1.0}})
+			self.assertEqual(stored['options']['machine'], bench.machine())
+
+	def test_registered(self):
+
+		before = options._opt_set
+		with bench_options.registered(50) as opts:
+			self.assertEqual(len(opts), 50)
+			self.assertIsNot(options._opt_set, before)
+		self.assertIs(options._opt_set, before)
+		self.assertEqual(set(bench_options.bench_parse(10, 10)), {'ms', 'us_per_arg'})
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import tempfile
+import time
+import os
+import cache
+
+class TestSum_metadata_cache(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.dir.cleanup()
+
+	def test_put_get(self):
+
+		c = cache.metadata_cache(self.dir.name)
+		c.put('abc', {'title': 'Alpha', 'streams': [{'itag': 22}]})
+
+		entry = cache.metadata_cache(self.dir.name).get('abc')
+		self.assertEqual(entry['title'], 'Alpha')
+		self.assertEqual(entry['streams'], [{'itag': 22}])
+		self.assertIsNone(c.get('xyz'))
+
+	def test_ttl(self):
+
+		c = cache.metadata_cache(self.dir.name, ttl=-1)
+		c.put('abc', {'title': 'Alpha'})
+		self.assertIsNone(c.get('abc'))
+		self.assertFalse(os.listdir(self.dir.name))
+
+	def test_url_expiry(self):
+
+		c = cache.metadata_cache(self.dir.name)
+		c.put('abc', {'title': 'Alpha'}, expires=time.time() + cache.EXPIRY_MARGIN / 2)
+		self.assertIsNone(c.get('abc'))
+
+	def test_lru(self):
+
+		c = cache.metadata_cache(self.dir.name)
+		c.put('a', {'title': 'x' * 100})
+		entry_size = c.size
+
+		# Entry sizes vary by a byte or two with the timestamps in them
+		cap = entry_size * 2 + entry_size // 2
+		c = cache.metadata_cache(self.dir.name, max_size=cap)
+		c.put('b', {'title': 'x' * 100})
+		time.sleep(0.01)
+		c.get('a')
+		c.put('c', {'title': 'x' * 100})
+
+		self.assertIsNotNone(c.get('a'))
+		self.assertIsNone(c.get('b'))
+		self.assertIsNotNone(c.get('c'))
+		self.assertLessEqual(c.size, cap)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,197 @@
+import unittest
+import threading
+import tempfile
+import time
+import os
+from http.client import HTTPConnection
+import pipeline
+import daemon
+import retry
+import naming
+import ytdl
+
+class TestSum_daemon(unittest.TestCase):
+
+	def setUp(self):
+		self.release = threading.Event()
+		self.finished = []
+
+		def work(value):
+			if value == 'bad': raise ValueError(value)
+			if value == 'slow': self.release.wait(5)
+			return value.upper()
+
+		self.jobs = daemon.job_server([pipeline.stage('work', work, 2)], \
+			lambda job: job.url, lambda job, value: self.finished.append(value), \
+			lambda stage, error: f'{stage}: {error}')
+		self.runner = threading.Thread(target=self.jobs.run, daemon=True)
+		self.runner.start()
+		self.dir = tempfile.TemporaryDirectory()
+		self.server = daemon.listen(os.path.join(self.dir.name, 'ytdl.sock'), self.jobs)
+		self.client = daemon.client(self.server.address)
+
+	def tearDown(self):
+		self.release.set()
+		self.client.close()
+		daemon.close(self.server)
+		self.jobs.stop()
+		self.runner.join(2)
+		self.dir.cleanup()
+
+	def test_parse_address(self):
+		self.assertEqual(daemon.parse_address(':8080'), ('127.0.0.1', 8080))
+		self.assertEqual(daemon.parse_address('localhost:80'), ('localhost', 80))
+		for address in ['0.0.0.0:80', 'example.com:8080', '10.0.0.1:80']:
+			with self.assertRaises(daemon.DaemonError, msg=address): daemon.parse_address(address)
+		self.assertEqual(daemon.parse_address('/run/ytdl.sock'), '/run/ytdl.sock')
+		self.assertEqual(daemon.parse_address(None), daemon.default_address())
+
+	def test_socket_path(self):
+		# A running daemon keeps its socket
+		with self.assertRaises(daemon.DaemonError): daemon.listen(self.server.address, self.jobs)
+		path = os.path.join(self.dir.name, 'notes.txt')
+		with open(path, 'w') as f: f.write('keep')
+		with self.assertRaises(daemon.DaemonError): daemon.listen(path, self.jobs)
+		with open(path) as f: self.assertEqual(f.read(), 'keep')
+
+		# The socket of a daemon that died is taken over
+		address = self.server.address
+		self.client.close()
+		self.server.shutdown(); self.server.server_close()
+		self.server = daemon.listen(address, self.jobs)
+		self.client = daemon.client(address)
+		self.assertEqual(self.client.wait(self.client.submit({'url': 'one'})[0]['id'])['state'], daemon.DONE)
+
+	def test_tcp_token(self):
+		saved = os.environ.get('XDG_RUNTIME_DIR')
+		os.environ['XDG_RUNTIME_DIR'] = self.dir.name
+		server = daemon.listen('localhost:0', self.jobs)
+		try:
+			port = int(server.address.rpartition(':')[2])
+			self.assertEqual(os.stat(daemon.token_path(port)).st_mode & 0o777, 0o600)
+			client = daemon.client(server.address)
+			self.assertEqual(client.wait(client.submit({'url': 'one'})[0]['id'])['state'], daemon.DONE)
+			client.close()
+
+			# A web page can send a plain form post, but neither a token nor JSON
+			def post(headers):
+				conn = HTTPConnection('127.0.0.1', port, timeout=5)
+				conn.request('POST', '/jobs', body=b'{"url": "two"}', headers=headers)
+				status = conn.getresponse().status
+				conn.close()
+				return status
+			token = f'Bearer {client._client__token}'
+			self.assertEqual(post({'Content-Type': 'text/plain'}), 403)
+			self.assertEqual(post({'Content-Type': 'application/json', 'Authorization': 'Bearer x'}), 403)
+			self.assertEqual(post({'Content-Type': 'text/plain', 'Authorization': token}), 415)
+			self.assertEqual(post({'Content-Type': 'application/json', 'Authorization': token}), 201)
+		finally:
+			daemon.close(server)
+			if saved is None: del os.environ['XDG_RUNTIME_DIR']
+			else: os.environ['XDG_RUNTIME_DIR'] = saved
+		self.assertFalse(os.path.exists(daemon.token_path(port)))
+
+	def test_submit(self):
+		jobs = self.client.submit([{'url': 'one'}, {'url': 'bad'}])
+		done = self.client.wait(jobs[0]['id'])
+		failed = self.client.wait(jobs[1]['id'])
+
+		self.assertEqual(done['state'], daemon.DONE)
+		self.assertEqual(failed['state'], daemon.FAILED)
+		self.assertEqual(failed['error'], 'work: bad')
+		self.assertEqual(self.finished, ['ONE'])
+		self.assertEqual(len(self.client.status()), 2)
+
+	def test_unordered(self):
+		slow, fast = self.client.submit([{'url': 'slow'}, {'url': 'fast'}])
+
+		self.assertEqual(self.client.wait(fast['id'])['state'], daemon.DONE)
+		self.assertEqual(self.client.status(slow['id'])['state'], 'work')
+
+	def test_cancel(self):
+		# Both workers are busy, so the third job is still queued
+		jobs = self.client.submit([{'url': 'slow'}, {'url': 'slow'}, {'url': 'queued'}])
+		self.assertEqual(self.client.cancel(jobs[2]['id'])['state'], daemon.CANCELLED)
+		self.release.set()
+
+		self.assertEqual(self.client.wait(jobs[0]['id'])['state'], daemon.DONE)
+		self.assertEqual(self.client.wait(jobs[2]['id'])['state'], daemon.CANCELLED)
+		time.sleep(0.1)
+		self.assertEqual(self.finished, ['SLOW', 'SLOW'])
+
+	def test_errors(self):
+		with self.assertRaises(daemon.DaemonError): self.client.status('404')
+		with self.assertRaises(daemon.DaemonError): self.client.submit({'link': 'x'})
+		with self.assertRaises(daemon.DaemonError):
+			daemon.client(os.path.join(self.dir.name, 'missing.sock')).status()
+
+class _conn:
+	"""
+	Stands in for daemon.client, job 5 is forgotten before it is read.
+	"""
+
+	def __init__(self):
+		self.ids = iter(range(1, 1000))
+		self.running = set()
+		self.most = 0
+		self.cancelled = []
+		self.specs = []
+
+	def submit(self, specs):
+		self.specs += specs
+		jobs = [{'id': str(next(self.ids))} for _ in specs]
+		self.running |= {job['id'] for job in jobs}
+		self.most = max(self.most, len(self.running))
+		return jobs
+
+	def wait(self, id):
+		self.running.discard(id)
+		if id == '5': raise daemon.UnknownJob(f'No job {id}')
+		return {'id': id, 'state': daemon.DONE, 'title': id, 'itag': 18, 'path': id}
+
+	def cancel(self, id): self.cancelled.append(id)
+
+class TestSum_submit(unittest.TestCase):
+
+	def test_batches(self):
+		conn = _conn()
+		links = (f'https://youtu.be/{n:011d}' for n in range(10))
+		saved = ytdl.sources, ytdl.failures, daemon.SUBMIT_BATCH
+		ytdl.sources, ytdl.failures, daemon.SUBMIT_BATCH = [links], retry.failure_report(), 3
+		try:
+			with self.assertRaises(SystemExit): ytdl._submit(conn)
+			self.assertEqual([f.url for f in ytdl.failures], ['https://youtu.be/00000000004'])
+		finally: ytdl.sources, ytdl.failures, daemon.SUBMIT_BATCH = saved
+		# Every link was sent and read, never more than two batches at once
+		self.assertEqual(conn.running, set())
+		self.assertEqual(conn.most, 6)
+		self.assertEqual(conn.cancelled, [])
+
+	def test_client_options(self):
+		conn = _conn()
+		names = ['sources', 'failures', 'output_template', 'audio_codec', 'audio_bitrate', 'use_adaptive']
+		saved = [getattr(ytdl, name) for name in names]
+		ytdl.sources, ytdl.failures = [['https://youtu.be/aaaaaaaaaaa']], retry.failure_report()
+		ytdl.output_template, ytdl.audio_codec = naming.template('{id}.{ext}'), 'opus'
+		ytdl.audio_bitrate, ytdl.use_adaptive = '96k', True
+		try: ytdl._submit(conn)
+		finally:
+			for name, value in zip(names, saved): setattr(ytdl, name, value)
+		spec = conn.specs[0]
+		self.assertEqual((spec['output'], spec['audio_format'], spec['audio_bitrate'], spec['dash']), \
+			('{id}.{ext}', 'opus', '96k', True))
+
+		# The daemon runs the job with them, not with its own
+		vid = ytdl._job_video(daemon.job('1', spec['url'], **{k: v for k, v in spec.items() if k != 'url'}))
+		self.assertEqual((vid.template.text, vid.codec, vid.bitrate, vid.adaptive), ('{id}.{ext}', 'opus', '96k', True))
+		with self.assertRaises(ValueError): ytdl._job_video(daemon.job('2', spec['url'], audio_format='nope'))
+
+	def test_run_options(self):
+		saved = ytdl.download_workers, ytdl.use_cache
+		ytdl.download_workers, ytdl.use_cache = 4, False
+		try: self.assertEqual(ytdl._run_options(), ['--jobs', '--no-cache'])
+		finally: ytdl.download_workers, ytdl.use_cache = saved
+		self.assertEqual(ytdl._run_options(), [])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,190 @@
+import unittest
+import tempfile
+import threading
+import os
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import fetch
+import retry
+
+DATA = bytes(range(256)) * 20000
+
+class _handler(BaseHTTPRequestHandler):
+
+	ranges = True
+	requests = []
+	cut = None
+
+	def log_message(self, *args): pass
+
+	def do_GET(self):
+		self.requests.append(self.headers.get('Range'))
+		rng = self.headers.get('Range')
+		if rng and self.ranges:
+			start, end = rng[6:].split('-')
+			start = int(start); end = int(end) if end else len(DATA)-1
+			end = min(end, len(DATA)-1)
+			self.send_response(206)
+			self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+			body = DATA[start:end+1]
+		else:
+			self.send_response(200)
+			body = DATA
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		if self.cut is not None and len(body) > 1:
+			body = body[:self.cut]
+			self.close_connection = True
+		self.wfile.write(body)
+
+class TestSum_fetch(unittest.TestCase):
+
+	def setUp(self):
+		_handler.ranges = True
+		_handler.requests = []
+		_handler.cut = None
+		self.retries = fetch.RETRIES
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), _handler)
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		self.url = f'http://127.0.0.1:{self.server.server_port}/video'
+		self.dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.dir.name, 'video.mp4')
+
+	def tearDown(self):
+		fetch.RETRIES = self.retries
+		self.server.shutdown()
+		self.server.server_close()
+		self.dir.cleanup()
+
+	def read(self):
+		with open(self.path, 'rb') as f: return f.read()
+
+	def test_probe(self):
+
+		self.assertEqual(fetch.probe(self.url), (len(DATA), True))
+		_handler.ranges = False
+		self.assertEqual(fetch.probe(self.url), (len(DATA), False))
+
+	def test_split(self):
+
+		size = fetch.MIN_SEGMENT_SIZE * 3 + 7
+		parts = fetch.split(size, 4)
+		self.assertEqual(len(parts), 3)
+		self.assertEqual(parts[0][0], 0)
+		self.assertEqual(parts[-1][1], size-1)
+		for (_, end), (start, _) in zip(parts, parts[1:]):
+			self.assertEqual(end+1, start)
+		self.assertEqual(fetch.split(10, 4), [(0, 9)])
+
+	def test_segmented(self):
+
+		done = []
+		fetch.fetch(self.url, self.path, segments=4, on_progress=lambda r, left: done.append(left))
+		self.assertEqual(self.read(), DATA)
+		self.assertEqual(min(done), 0)
+		self.assertEqual(len([r for r in _handler.requests if r and r != 'bytes=0-0']), 4)
+
+	def test_no_ranges(self):
+
+		_handler.ranges = False
+		fetch.fetch(self.url, self.path, segments=4)
+		self.assertEqual(self.read(), DATA)
+		self.assertEqual(len(_handler.requests), 2)
+
+	def test_chunk_size(self):
+
+		sizes = []
+		fetch.fetch(self.url, self.path, segments=1, chunk_size=1000, on_progress=lambda r, left: sizes.append(r))
+		self.assertEqual(self.read(), DATA)
+		self.assertEqual(max(sizes), 1000)
+		_handler.ranges = False
+		os.remove(self.path)
+		fetch.fetch(self.url, self.path, chunk_size=3000)
+		self.assertEqual(self.read(), DATA)
+
+	def test_resume(self):
+
+		fetch.RETRIES = 0
+		_handler.cut = fetch.CHECKPOINT_SIZE + 1000
+		self.assertRaises(fetch.FetchError, fetch.fetch, self.url, self.path, segments=2, key='22')
+		self.assertFalse(os.path.exists(self.path))
+		self.assertTrue(os.path.exists(self.path + fetch.PART_EXT))
+
+		cut = _handler.cut
+		_handler.cut = None
+		_handler.requests = []
+		fetch.fetch(self.url, self.path, segments=2, key='22')
+		self.assertEqual(self.read(), DATA)
+		self.assertFalse(os.path.exists(self.path + fetch.PART_EXT))
+		self.assertFalse(os.path.exists(self.path + fetch.PART_EXT + fetch.STATE_EXT))
+		starts = sorted(int(r[6:].split('-')[0]) for r in _handler.requests if r != 'bytes=0-0')
+		self.assertEqual(starts, [cut, len(DATA) // 2 + cut])
+
+	def test_synced_checkpoints(self):
+
+		last, saves = {}, []
+		fsync, save = os.fsync, fetch._state.save
+		os.fsync = lambda fd: last.update({threading.get_ident(): 'sync'}) or fsync(fd)
+		def saved(state):
+			saves.append(last.pop(threading.get_ident(), None))
+			save(state)
+		fetch._state.save = saved
+		try: fetch.fetch(self.url, self.path, segments=2, key='22')
+		finally: os.fsync, fetch._state.save = fsync, save
+		# Every offset the sidecar records was on disk before it was saved
+		self.assertEqual(saves[0], None)
+		self.assertGreater(len(saves), 2)
+		self.assertEqual(set(saves[1:]), {'sync'})
+
+	def test_resume_other_key(self):
+
+		fetch.RETRIES = 0
+		_handler.cut = fetch.CHECKPOINT_SIZE + 1000
+		self.assertRaises(fetch.FetchError, fetch.fetch, self.url, self.path, segments=2, key='22')
+
+		_handler.cut = None
+		_handler.requests = []
+		fetch.fetch(self.url, self.path, segments=2, key='18')
+		self.assertEqual(self.read(), DATA)
+		starts = sorted(int(r[6:].split('-')[0]) for r in _handler.requests if r != 'bytes=0-0')
+		self.assertEqual(starts, [0, len(DATA) // 2])
+
+	def stream(self, **kwargs):
+		read, write = os.pipe()
+		received = []
+		def reader():
+			with os.fdopen(read, 'rb') as f:
+				while chunk := f.read(100000): received.append(chunk)
+		t = threading.Thread(target=reader)
+		t.start()
+		try: return fetch.stream(self.url, write, **kwargs)
+		finally:
+			os.close(write); t.join()
+			self.received = b''.join(received)
+
+	def test_stream(self):
+
+		sizes = []
+		self.assertEqual(self.stream(chunk_size=5000, on_progress=lambda r, left: sizes.append(r)), len(DATA))
+		self.assertEqual(self.received, DATA)
+		self.assertEqual(max(sizes), 5000)
+		self.assertEqual(os.listdir(self.dir.name), [])
+
+	def test_stream_resume(self):
+
+		fetch.RETRIES = 5
+		base, retry.BACKOFF_BASE = retry.BACKOFF_BASE, 0.001
+		try:
+			cut = _handler.cut = fetch.CHECKPOINT_SIZE + 1000
+			self.stream()
+			self.assertEqual(self.received, DATA)
+			starts = [int(r[6:].split('-')[0]) for r in _handler.requests[2:]]
+			self.assertEqual(starts, [cut * n for n in range(1, len(starts)+1)])
+
+			_handler.ranges = False
+			with self.assertRaises(fetch.FetchError): self.stream()
+			self.assertEqual(self.received, DATA[:cut])
+		finally: retry.BACKOFF_BASE = base
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import formats
+import ytdl
+
+class stream:
+	def __init__(self, itag, resolution=None, abr=None, subtype='mp4', fps=None, size=0, video=True, audio=True):
+		self.itag = itag
+		self.resolution = resolution
+		self.abr = abr
+		self.subtype = subtype
+		self.bitrate = 1000
+		self._filesize = size
+		self.video_codec = ('avc1.4d401f' if subtype == 'mp4' else 'vp9') if video else None
+		self.audio_codec = ('mp4a.40.2' if subtype == 'mp4' else 'opus') if audio else None
+		self.includes_video_track = video
+		self.includes_audio_track = audio
+		if fps: self.fps = fps
+
+STREAMS = [
+	stream(18, '360p', '96kbps', size=10 << 20),
+	stream(22, '720p', '192kbps', size=40 << 20),
+	stream(137, '1080p', fps=30, size=90 << 20, audio=False),
+	stream(299, '1080p', fps=60, size=120 << 20, audio=False),
+	stream(248, '1080p', subtype='webm', fps=60, size=80 << 20, audio=False),
+	stream(140, abr='128kbps', size=4 << 20, video=False),
+	stream(251, abr='160kbps', subtype='webm', size=5 << 20, video=False),
+]
+
+def itags(text):
+	chosen, audio = formats.compile(text).select(STREAMS)
+	return (chosen.itag if chosen else None, audio.itag if audio else None)
+
+class TestSum_formats(unittest.TestCase):
+
+	def test_kinds(self):
+		self.assertEqual(itags('best'), (22, None))
+		self.assertEqual(itags('worst'), (18, None))
+		self.assertEqual(itags('bestaudio'), (251, None))
+		self.assertEqual(itags('wa'), (140, None))
+		self.assertEqual(itags('bestvideo'), (299, None))
+
+	def test_filters(self):
+		self.assertEqual(itags('best[height<=360]'), (18, None))
+		self.assertEqual(itags('bestaudio[abr>=128k][ext=mp4]'), (140, None))
+		self.assertEqual(itags('bestvideo[fps<=30]'), (137, None))
+		self.assertEqual(itags('bestvideo[vcodec^=vp9]'), (248, None))
+		self.assertEqual(itags('best[filesize<=20M]'), (18, None))
+		self.assertEqual(itags('worst[height>=480]'), (22, None))
+
+	def test_pairs(self):
+		self.assertEqual(itags('bestvideo+bestaudio'), (299, 140))
+		self.assertEqual(itags('bestvideo[ext=webm]+bestaudio'), (248, 251))
+		self.assertEqual(itags('bestvideo[ext=webm]+bestaudio[ext=mp4]'), (248, 140))
+
+	def test_fallback(self):
+		self.assertEqual(itags('best[height>=1080]/bestvideo[height>=1080][fps<=30]+ba/worst'), (137, 140))
+		self.assertEqual(itags('best[height>2000]/worst'), (18, None))
+		self.assertEqual(itags('best[height>2000]'), (None, None))
+
+	def test_options(self):
+		saved = ytdl.vid_resolution, ytdl.audio_only, ytdl.use_adaptive
+		try:
+			ytdl.set_resolution_low()
+			vid = ytdl.video('https://youtu.be/aaaaaaaaaaa')
+			self.assertEqual(ytdl._format(vid), 'worst[ext=mp4]')
+			self.assertEqual(itags(ytdl._format(vid)), (18, None))
+			vid.adaptive = True
+			self.assertEqual(ytdl._format(vid), 'worstvideo+bestaudio/worst[ext=mp4]')
+			ytdl.set_resolution('1080p')
+			self.assertEqual(itags(ytdl._format(ytdl.video('https://youtu.be/aaaaaaaaaaa'))), (299, 140))
+		finally: ytdl.vid_resolution, ytdl.audio_only, ytdl.use_adaptive = saved
+
+	def test_compiled_once(self):
+		self.assertIs(formats.compile('best/worst'), formats.compile('best/worst'))
+
+	def test_errors(self):
+		for text in ['', 'bestest', 'best[height<=]', 'best[color=red]', 'best[height^=7]', \
+			'best[height<=720', 'bestaudio+bestvideo', 'best+bestaudio']:
+			with self.assertRaises(formats.FormatError, msg=text): formats.compile(text)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import threading
+from urllib.error import HTTPError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import httppool
+import retry
+
+class _handler(BaseHTTPRequestHandler):
+
+	protocol_version = 'HTTP/1.1'
+	connections = 0
+	lock = threading.Lock()
+
+	def log_message(self, *args): pass
+
+	def setup(self):
+		super().setup()
+		with self.lock: _handler.connections += 1
+
+	def _body(self, body, status=200):
+		self.send_response(status)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		if self.path == '/redirect':
+			self.send_response(302)
+			self.send_header('Location', '/data')
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+		elif self.path == '/missing':
+			self._body(b'not here', 404)
+		else:
+			self._body(b'x' * 100000)
+
+	def do_POST(self):
+		self._body(self.rfile.read(int(self.headers['Content-Length'])))
+
+class TestSum_connection_pool(unittest.TestCase):
+
+	def setUp(self):
+		_handler.connections = 0
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), _handler)
+		self.server.daemon_threads = True
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		self.url = f'http://127.0.0.1:{self.server.server_port}'
+		self.pool = httppool.connection_pool(2)
+
+	def tearDown(self):
+		self.pool.close()
+		self.server.shutdown()
+		self.server.server_close()
+
+	def test_reuse(self):
+
+		for _ in range(10):
+			with self.pool.request(self.url + '/data') as r:
+				self.assertEqual(len(r.read()), 100000)
+		self.assertEqual(_handler.connections, 1)
+		self.assertEqual(self.pool.opened, 1)
+
+	def test_chunks(self):
+
+		with self.pool.request(self.url + '/data') as r:
+			got = 0
+			while chunk := r.read(4096): got += len(chunk)
+		self.assertEqual(got, 100000)
+		self.pool.request(self.url + '/data').read()
+		self.assertEqual(_handler.connections, 1)
+
+	def test_closed_early(self):
+
+		with self.pool.request(self.url + '/data') as r: r.read(10)
+		self.pool.request(self.url + '/data').read()
+		self.assertEqual(_handler.connections, 2)
+
+	def test_per_host_limit(self):
+
+		def get():
+			for _ in range(5): self.pool.request(self.url + '/data').read()
+
+		threads = [threading.Thread(target=get) for _ in range(6)]
+		for t in threads: t.start()
+		for t in threads: t.join()
+		self.assertLessEqual(_handler.connections, 2)
+
+	def test_acquire_timeout(self):
+
+		pool = httppool.connection_pool(2, acquire_timeout=0.2)
+		# Responses left unread keep their connections, like pytube's size probe
+		held = [pool.request(self.url + '/data') for _ in range(2)]
+		with self.assertRaises(httppool.PoolTimeout) as e: pool.request(self.url + '/data')
+		self.assertEqual(retry.classify(e.exception), retry.TRANSIENT)
+		held[0].read()
+		self.assertEqual(len(pool.request(self.url + '/data').read()), 100000)
+		held[1].close()
+		pool.close()
+
+	def test_redirect_and_errors(self):
+
+		self.assertEqual(len(self.pool.request(self.url + '/redirect').read()), 100000)
+		with self.assertRaises(HTTPError) as e: self.pool.request(self.url + '/missing')
+		self.assertEqual(e.exception.code, 404)
+		self.assertEqual(_handler.connections, 1)
+
+	def test_execute_request(self):
+
+		pool = httppool.default_pool
+		httppool.default_pool = self.pool
+		try:
+			r = httppool.execute_request(self.url + '/echo', data={'a': 1})
+			self.assertEqual(r.read(), b'{"a": 1}')
+		finally:
+			httppool.default_pool = pool
+
+
+if __name__ == "__main__":
+	unittest.main()
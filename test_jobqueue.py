@@ -0,0 +1,88 @@
+import unittest
+import tempfile
+import sqlite3
+import os
+import jobqueue
+
+class TestSum_jobqueue(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.dir.name, 'queue.sqlite')
+
+	def tearDown(self):
+		self.dir.cleanup()
+
+	def rows(self):
+		db = sqlite3.connect(self.path)
+		try: return {row[0]: row[1:] for row in db.execute('SELECT id, state, attempts, path FROM jobs')}
+		finally: db.close()
+
+	def test_add_claim(self):
+		q = jobqueue.job_queue(self.path)
+		self.assertEqual(q.add([('a', 'url-a'), ('b', 'url-b'), ('a', 'again')]), 2)
+		self.assertEqual(q.add([('b', 'url-b'), ('c', 'url-c')]), 1)
+
+		first = q.claim(2)
+		second = jobqueue.job_queue(self.path).claim(5)
+
+		self.assertEqual([row[1:] for row in first], [('a', 'url-a'), ('b', 'url-b')])
+		self.assertEqual([row[1] for row in second], ['c'])
+		self.assertEqual(q.claim(), [])
+		q.close()
+
+	def test_batched_updates(self):
+		q = jobqueue.job_queue(self.path)
+		q.add([('a', 'url-a')])
+		seq = q.claim()[0][0]
+		q.update(seq, jobqueue.DOWNLOADING)
+		q.update(seq, jobqueue.DONE, '/videos/a.mp4')
+
+		self.assertEqual(self.rows()['a'][0], jobqueue.CLAIMED)
+		q.close()
+		self.assertEqual(self.rows()['a'], (jobqueue.DONE, 1, '/videos/a.mp4'))
+
+	def test_recover(self):
+		q = jobqueue.job_queue(self.path)
+		q.add([('a', 'url-a'), ('b', 'url-b'), ('c', 'url-c')])
+		a, b, c = [row[0] for row in q.claim()]
+		q.update(a, jobqueue.DONE, '/a')
+		q.update(b, jobqueue.FAILED, error='transient: reset', kind='transient')
+		q.close()
+
+		# The jobs of this process count as abandoned once it opens the queue again
+		q = jobqueue.job_queue(self.path)
+		self.assertEqual(q.recover(), 1)
+		self.assertEqual(q.retry(1, ['transient']), 0)
+		self.assertEqual(q.retry(jobqueue.MAX_ATTEMPTS, ['unknown']), 0)
+		self.assertEqual(q.retry(jobqueue.MAX_ATTEMPTS, ['transient']), 1)
+		self.assertEqual([row[1] for row in q.claim()], ['b', 'c'])
+		self.assertEqual(q.counts(), {jobqueue.DONE: 1, jobqueue.CLAIMED: 2})
+		q.close()
+		self.assertEqual(self.rows()['c'][1], 2)
+
+	def test_claim_ids(self):
+		q = jobqueue.job_queue(self.path)
+		q.add([('old', 'url-old')])
+		q.add([('a', 'url-a'), ('b', 'url-b')])
+
+		self.assertEqual([row[1] for row in q.claim(ids=['b', 'a'])], ['a', 'b'])
+		self.assertEqual(q.claim(ids=[]), [])
+		self.assertEqual([row[1] for row in q.claim()], ['old'])
+		q.close()
+
+	def test_old_schema(self):
+		db = sqlite3.connect(self.path)
+		db.execute('CREATE TABLE jobs (seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, url TEXT NOT NULL, ' \
+			"state TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, owner INTEGER, " \
+			'path TEXT, error TEXT, updated REAL)')
+		db.commit(); db.close()
+
+		q = jobqueue.job_queue(self.path)
+		q.add([('a', 'url-a')])
+		q.update(q.claim()[0][0], jobqueue.FAILED, error='throttled: 429', kind='throttled')
+		self.assertEqual(q.retry(jobqueue.MAX_ATTEMPTS, ['throttled']), 1)
+		q.close()
+
+if __name__ == "__main__":
+	unittest.main()
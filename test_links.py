@@ -0,0 +1,54 @@
+import unittest
+import tempfile
+import random
+import gzip
+import os
+import links
+
+class TestSum_links(unittest.TestCase):
+
+	def test_video_id(self):
+
+		for link in [
+			'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+			'www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ#t=1',
+			'youtube.com/watch?v=dQw4w9WgXcQ&list=PL123\n',
+			'"https://youtu.be/dQw4w9WgXcQ?t=42"',
+			'https://youtube.com/shorts/dQw4w9WgXcQ',
+			'https://www.youtube.com/embed/dQw4w9WgXcQ',
+			' dQw4w9WgXcQ ',
+		]:
+			self.assertEqual(links.video_id(link), 'dQw4w9WgXcQ', link)
+
+	def test_no_video(self):
+
+		self.assertIsNone(links.video_id('https://www.youtube.com/playlist?list=PL123'))
+		self.assertIsNone(links.video_id('https://youtu.be/dQw4w9WgXcQx'))
+		self.assertIsNone(links.video_id(''))
+
+	def test_id_set(self):
+
+		rnd = random.Random(1)
+		ids = {''.join(rnd.choice(links._ALPHABET) for _ in range(11)) for _ in range(5000)}
+		ids |= {'aaaaaaaaaaa', 'aaaaaaaaaab', 'aaaaaaaaaac', 'aaaaaaaaaad'}
+
+		s = links.id_set(4)
+		for vid in ids: self.assertTrue(s.add(vid))
+		for vid in ids: self.assertFalse(s.add(vid))
+		self.assertEqual(len(s), len(ids))
+		self.assertIn('aaaaaaaaaab', s)
+		self.assertNotIn('aaaaaaaaaae', s)
+
+	def test_read(self):
+
+		with tempfile.TemporaryDirectory() as d:
+			path = os.path.join(d, 'links.txt.gz')
+			with gzip.open(path, 'wt') as f:
+				f.write('# comment\n\nhttps://youtu.be/dQw4w9WgXcQ\nnot a link\n  youtube.com/watch?v=aaaaaaaaaaa  \n')
+			invalid = []
+			result = list(links.read(links.open_source(path), lambda n, l: invalid.append(n)))
+			self.assertEqual(result, ['https://youtu.be/dQw4w9WgXcQ', 'youtube.com/watch?v=aaaaaaaaaaa'])
+			self.assertEqual(invalid, [4])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import tempfile
+import json
+import io
+import os
+import metrics
+import pipeline
+
+class TestSum_metrics(unittest.TestCase):
+
+	def test_transfers(self):
+
+		reg = metrics.registry()
+		with reg.transfer('a', 100) as a:
+			a(40); a(10, 50)
+			self.assertEqual(reg.received(), 50)
+			self.assertEqual(reg.snapshot()['active_downloads'], 1)
+		with reg.transfer('b') as b: b(5)
+		snap = reg.snapshot()
+		self.assertEqual(snap['bytes_received'], 55)
+		self.assertEqual(snap['active_downloads'], 0)
+
+	def test_stages(self):
+
+		reg = metrics.registry()
+		def fail(x): raise ValueError(x)
+		pipe = pipeline.pipeline([pipeline.stage('double', reg.timed('double', lambda x: x*2)), \
+			pipeline.stage('check', reg.timed('check', lambda x: fail(x) if x == 4 else x))])
+		reg.depths = pipe.depths
+		results = list(pipe.run(range(3)))
+		self.assertEqual([it.ok for it in results], [True, True, False])
+		stages = reg.snapshot()['stages']
+		self.assertEqual(stages['double']['count'], 3)
+		self.assertEqual(stages['check']['errors'], 1)
+		self.assertEqual(reg.snapshot()['queue_depths'], {})
+
+	def test_formats(self):
+
+		reg = metrics.registry()
+		reg.observe('resolve', 0.5)
+		with reg.transfer('a') as a: a(2048)
+		text = metrics.to_prometheus(reg.snapshot())
+		self.assertIn('ytdl_bytes_received_total 2048\n', text)
+		self.assertIn('ytdl_stage_seconds_total{stage="resolve"} 0.5\n', text)
+		self.assertEqual(json.loads(metrics.to_json(reg.snapshot()))['bytes_received'], 2048)
+
+	def test_dump(self):
+
+		reg = metrics.registry()
+		with tempfile.TemporaryDirectory() as d:
+			path = os.path.join(d, 'metrics.json')
+			dumper = metrics.dump(path, reg, interval=60)
+			with reg.transfer('a') as a: a(7)
+			dumper.stop()
+			with open(path) as f: self.assertEqual(json.load(f)['bytes_received'], 7)
+			self.assertFalse(os.path.exists(path + '.tmp'))
+
+	def test_display(self):
+
+		reg = metrics.registry()
+		out = io.StringIO()
+		screen = metrics.display(reg, out, interval=60)
+		t = reg.transfer('video', 100); t(50)
+		screen.refresh()
+		self.assertIn('video |', out.getvalue())
+		self.assertIn('50.0%', out.getvalue())
+		screen.write('1. video')
+		t.close()
+		screen.stop()
+		self.assertTrue(out.getvalue().endswith('1. video\n'))
+
+
+if __name__ == "__main__":
+	unittest.main()
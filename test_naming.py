@@ -0,0 +1,66 @@
+import unittest
+import tempfile
+import os
+import naming
+
+class TestSum_naming(unittest.TestCase):
+
+	def test_sanitize(self):
+		self.assertEqual(naming.sanitize('What? A "test": 1/2 (live)'), 'What-A-test-12-live')
+		self.assertEqual(naming.sanitize('tab\there\n\x1f\x7f'), 'tabhere')
+		self.assertEqual(naming.sanitize('Ünïcode ok'), 'Ünïcode-ok')
+
+	def test_render(self):
+		t = naming.template('{channel}/{upload_date}-{title}-{id}.{ext}')
+		self.assertEqual(t.fields, {'channel', 'upload_date', 'title', 'id', 'ext'})
+		path = t.render({'channel': 'A/B', 'upload_date': '20240517', 'title': 'x.y', 'id': 'abc', 'ext': 'mp4'})
+		self.assertEqual(path, os.path.join('AB', '20240517-xy-abc.mp4'))
+		self.assertEqual(t.render({'title': 'x', 'id': 'abc', 'ext': 'mp4'}), os.path.join('NA', 'NA-x-abc.mp4'))
+		self.assertEqual(naming.template('{itag:05d}.{ext}').render({'itag': 22, 'ext': 'mp4'}), '00022.mp4')
+
+	def test_long_names(self):
+		path = naming.template('{title}.{ext}').render({'title': 'é' * 300, 'ext': 'mp4'})
+		self.assertTrue(path.endswith('.mp4'))
+		self.assertLessEqual(len(os.path.splitext(path)[0].encode()), naming.MAX_STEM_BYTES)
+
+	def test_errors(self):
+		for text in ['', '{nope}.{ext}', '/abs/{title}', '../{title}', 'a/../{title}', '{title}/', \
+			'{title!r}', '{title']:
+			with self.assertRaises(naming.TemplateError, msg=text): naming.template(text)
+
+	def test_claim(self):
+		with tempfile.TemporaryDirectory() as d:
+			for name in ['a.mp4', 'a-1.mp4', 'b.mp4']:
+				with open(os.path.join(d, name), 'w') as f: f.write('12345')
+			names = naming.name_index()
+			self.assertEqual(names.claim(os.path.join(d, 'a.mp4')), os.path.join(d, 'a-2.mp4'))
+			self.assertEqual(names.claim(os.path.join(d, 'a.mp4')), os.path.join(d, 'a-3.mp4'))
+			self.assertEqual(names.claim(os.path.join(d, 'c.mp4')), os.path.join(d, 'c.mp4'))
+			self.assertEqual(names.claim(os.path.join(d, 'c.mp4')), os.path.join(d, 'c-1.mp4'))
+			# A file that is this download already is reused
+			same = lambda path: os.path.getsize(path) == 5
+			self.assertEqual(names.claim(os.path.join(d, 'b.mp4'), same), os.path.join(d, 'b.mp4'))
+			self.assertEqual(names.claim(os.path.join(d, 'b.mp4'), same), os.path.join(d, 'b-1.mp4'))
+			# So is a name its owner claimed before
+			self.assertEqual(names.claim(os.path.join(d, 'e.mp4'), owner='v1'), os.path.join(d, 'e.mp4'))
+			self.assertEqual(names.claim(os.path.join(d, 'e.mp4'), owner='v1'), os.path.join(d, 'e.mp4'))
+			self.assertEqual(names.claim(os.path.join(d, 'e.mp4'), owner='v2'), os.path.join(d, 'e-1.mp4'))
+			# Files written after the directory was read are still seen
+			open(os.path.join(d, 'f.mp4'), 'w').close()
+			self.assertEqual(names.claim(os.path.join(d, 'f.mp4')), os.path.join(d, 'f-1.mp4'))
+			self.assertEqual(names.claim(os.path.join(d, 'new', 'a.mp4')), os.path.join(d, 'new', 'a.mp4'))
+
+	def test_large_directory(self):
+		with tempfile.TemporaryDirectory() as d:
+			for i in range(5000): open(os.path.join(d, f'v-{i}.mp4' if i else 'v.mp4'), 'w').close()
+			names = naming.name_index()
+			lexists = os.path.lexists
+			calls = []
+			os.path.lexists = lambda path: calls.append(path) or lexists(path)
+			try: self.assertEqual(names.claim(os.path.join(d, 'v.mp4')), os.path.join(d, 'v-5000.mp4'))
+			finally: os.path.lexists = lexists
+			# The whole directory costs one scan and the free name one check
+			self.assertEqual(calls, [os.path.join(d, 'v-5000.mp4')])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -219,6 +219,119 @@ class TestSum_other(unittest.TestCase):
 
 		self.assertRaisesRegex(SystemExit, f"{options.HELP_NOTE}\nOPTIONS:\n{str(options._t.options[0])}", options.exec)
 
+class TestSum_lookup(unittest.TestCase):
+
+	def setUp(self):
+		self.saved = options._opt_set, sys.argv
+		options._opt_set = options.option_set()
+		self.calls = []
+		def flag(): self.calls.append('audio')
+		def low(): self.calls.append('low')
+		def target(path): self.calls.append(path)
+		def source(link): self.calls.append(link)
+		def fmt(codec): self.calls.append(codec)
+		options.func_option('a', 'audio', flag)
+		options.func_option('l', 'low', low)
+		options.func_option('t', 'target', target)
+		options.func_option('s', 'source', source)
+		options.func_option('x', 'audio-format', fmt)
+
+	def tearDown(self):
+		options._opt_set, sys.argv = self.saved
+
+	def parse(self, *argv):
+		sys.argv = ['ytdl.py'] + list(argv)
+		params = options._sys_arg_translator()
+		params.translate()
+		params.run()
+		return self.calls
+
+	def test_index(self):
+
+		opts = options._opt_set
+		self.assertEqual(opts.short('t').long, 'target')
+		self.assertEqual(opts.long('target').short, 't')
+		self.assertIsNone(opts.short('q'))
+		self.assertRaises(options.OptionError, options.func_option, 't', 'other', lambda: None)
+		self.assertRaises(options.OptionError, options.func_option, 'q', 'target', lambda: None)
+
+	def test_abbreviation(self):
+
+		opts = options._opt_set
+		self.assertEqual(opts.long('tar').long, 'target')
+		self.assertEqual(opts.long('audio').long, 'audio')
+		self.assertEqual(opts.long('audio-').long, 'audio-format')
+		self.assertIsNone(opts.long('tarx'))
+		self.assertIsNone(opts.long('ta', abbreviated=False))
+		self.assertRaises(options.OptionError, opts.long, 'au')
+		self.assertEqual(self.parse('--tar', 'out', '--so', 'v'), ['out', 'v'])
+		self.assertRaises(options.TranslationError, self.parse, '--au')
+
+	def test_discard(self):
+
+		opts = options._opt_set
+		opts.discard(opts.long('audio'))
+		self.assertEqual(opts.long('au').long, 'audio-format')
+		self.assertIsNone(opts.short('a'))
+		opts.remove(opts.long('audio-format'))
+		self.assertIsNone(opts.long('au'))
+		self.assertEqual(len(opts), 3)
+
+	def test_equals(self):
+
+		self.assertEqual(self.parse('--target=out', '--audio-format=opus'), ['out', 'opus'])
+
+	def test_bundle(self):
+
+		self.assertEqual(self.parse('-al'), ['audio', 'low'])
+		self.calls.clear()
+		self.assertEqual(self.parse('-lt', 'out'), ['low', 'out'])
+		self.assertRaises(options.TranslationError, self.parse, '-ta')
+		self.assertRaises(options.TranslationError, self.parse, '-aq')
+
+
+class TestSum_spec(unittest.TestCase):
+
+	def setUp(self):
+		self.saved = options._opt_set, sys.argv, options.SHORT_JUST
+		options._opt_set = options.option_set()
+
+	def tearDown(self):
+		options._opt_set, sys.argv, options.SHORT_JUST = self.saved
+
+	def test_func_spec(self):
+
+		def take(path, name='x', *rest):
+			"""
+			HELP: Take things
+			"""
+		spec = options.func_option('t', 'take', take).spec
+		self.assertEqual((spec.min_params, spec.max_params), (1, -1))
+		self.assertEqual(spec.param_str, ' path [name] [*rest]')
+		self.assertEqual(spec.description, 'Take things')
+		self.assertRaises(AttributeError, setattr, spec, 'min_params', 0)
+		self.assertFalse(hasattr(spec, '__dict__'))
+
+	def test_var_spec(self):
+
+		count = options.var(0, 'n', int)
+		opt = options.var_option('n', 'count', count)
+		self.assertEqual(opt.spec.converters, (int,))
+		sys.argv = ['ytdl.py', '--count', '7']
+		params = options._sys_arg_translator()
+		params.translate(); params.run()
+		self.assertEqual(count.value, 7)
+
+	def test_help_cache(self):
+
+		options.func_option('a', 'alpha', lambda: None)
+		first = options._opt_set.help()
+		self.assertIs(options._opt_set.help(), first)
+		options.SHORT_JUST = 4
+		self.assertTrue(options._opt_set.help().startswith('-a   | --alpha'))
+		options.func_option('b', 'bravo', lambda: None)
+		self.assertEqual(len(options._opt_set.help().split('\n')), 2)
+
 
 if __name__ == "__main__":
 	unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import random
+import time
+import pipeline
+
+class TestSum_pipeline(unittest.TestCase):
+
+	def test_order(self):
+
+		def slow(x):
+			time.sleep(random.random() * 0.01)
+			return x * 2
+
+		pipe = pipeline.pipeline([
+			pipeline.stage('first', slow, 4),
+			pipeline.stage('second', slow, 3)
+		], queue_size=2)
+
+		result = [(it.index, it.value) for it in pipe.run(range(50))]
+
+		self.assertEqual(result, [(i, i * 4) for i in range(50)])
+
+	def test_unordered(self):
+
+		def slow_first(x):
+			if x == 0: time.sleep(0.2)
+			return x
+
+		pipe = pipeline.pipeline([pipeline.stage('slow', slow_first, 2)], queue_size=1)
+		result = [it.index for it in pipe.run(range(6), ordered=False)]
+
+		self.assertEqual(sorted(result), list(range(6)))
+		self.assertNotEqual(result[0], 0)
+
+	def test_error(self):
+
+		def fail_odd(x):
+			if x % 2: raise ValueError(x)
+			return x
+
+		calls = []
+
+		def record(x):
+			calls.append(x)
+			return x
+
+		pipe = pipeline.pipeline([
+			pipeline.stage('check', fail_odd, 2),
+			pipeline.stage('record', record)
+		])
+
+		result = list(pipe.run(range(6)))
+
+		self.assertEqual([it.ok for it in result], [True, False] * 3)
+		self.assertEqual(result[1].stage, 'check')
+		self.assertEqual(result[1].source, 1)
+		self.assertEqual(sorted(calls), [0, 2, 4])
+
+	def test_lazy_source(self):
+
+		produced = []
+
+		def source():
+			for i in range(100):
+				produced.append(i)
+				yield i
+
+		pipe = pipeline.pipeline([pipeline.stage('id', lambda x: x)], queue_size=1)
+
+		for it in pipe.run(source()):
+			if it.index == 0:
+				time.sleep(0.05)
+				self.assertLess(len(produced), 10)
+				break
+
+	def test_workers(self):
+
+		self.assertRaises(pipeline.PipelineError, pipeline.stage, 'none', lambda x: x, 0)
+		self.assertRaises(pipeline.PipelineError, pipeline.pipeline, [])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import tempfile
+import threading
+import pipeline
+import playlist
+import ytdl
+
+class _playlist:
+
+	def __init__(self, ids, length=True, url='https://www.youtube.com/watch?v={}'):
+		self.playlist_id = 'PLtest'
+		self.ids = ids
+		self.walked = 0
+		self.length = len(ids) if length else None
+		self.url = url
+
+	def url_generator(self):
+		for vid in self.ids:
+			self.walked += 1
+			yield self.url.format(vid * 11)
+
+class TestSum_sync(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.dir.cleanup()
+
+	def sync(self, pl, commit=True):
+		result = playlist.sync(pl, self.dir.name)
+		if commit: result.commit()
+		return result
+
+	def test_first_sync(self):
+
+		result = self.sync(_playlist(['a', 'b', 'c']))
+		self.assertEqual(result.urls, [f'https://www.youtube.com/watch?v={v * 11}' for v in 'abc'])
+		self.assertEqual((result.added, result.removed), (3, 0))
+
+	def test_new_on_top(self):
+
+		self.sync(_playlist(list('abcdefgh')))
+		pl = _playlist(['y', 'z'] + list('abcdefgh'))
+		result = self.sync(pl)
+		self.assertEqual([u[-1] for u in result.urls], ['y', 'z'])
+		self.assertEqual((result.added, result.removed), (2, 0))
+		self.assertEqual(pl.walked, 3)
+
+	def test_removed_on_top(self):
+
+		self.sync(_playlist(list('abcdefgh')))
+		pl = _playlist(['z'] + list('cdefgh'))
+		result = self.sync(pl)
+		self.assertEqual((result.added, result.removed), (1, 2))
+		self.assertEqual(pl.walked, 2)
+
+	def test_new_at_bottom(self):
+
+		self.sync(_playlist(list('abcd')))
+		pl = _playlist(list('abcdxy'))
+		result = self.sync(pl)
+		self.assertEqual([u[-1] for u in result.urls], ['x', 'y'])
+		self.assertEqual((result.added, result.removed), (2, 0))
+		self.assertEqual(pl.walked, 6)
+
+	def test_removed_below(self):
+
+		self.sync(_playlist(list('abcd')))
+		result = self.sync(_playlist(list('abd')))
+		self.assertEqual((result.added, result.removed), (0, 1))
+		self.assertEqual(self.sync(_playlist(list('abd'))).added, 0)
+
+	def test_uncommitted(self):
+
+		self.sync(_playlist(list('ab')), commit=False)
+		self.assertEqual(self.sync(_playlist(list('ab'))).added, 2)
+
+	def test_link_forms(self):
+
+		self.sync(_playlist(list('abc')))
+		# The same videos in another link form are not new
+		result = self.sync(_playlist(list('abc'), url='https://youtu.be/{}?si=share'))
+		self.assertEqual((result.added, result.removed), (0, 0))
+
+class TestSum_expand(unittest.TestCase):
+
+	def test_first_download(self):
+		events = []
+		downloading = threading.Event()
+		def page(ids): return [f'https://www.youtube.com/watch?v={v * 11}' for v in ids]
+
+		class _pytube:
+			class Playlist:
+				def __init__(self, url): self.url = url
+
+				def url_generator(self):
+					yield from page('ab')
+					# The second page only comes once the first video is downloading
+					downloading.wait(5)
+					events.append('page 2')
+					yield from page('cd')
+
+		def download(vid):
+			events.append(f'download {vid.id[0]}')
+			downloading.set()
+			return vid
+
+		saved = ytdl.pytube, ytdl.sources
+		ytdl.pytube = _pytube
+		ytdl.sources = [ytdl._playlist_links('https://www.youtube.com/playlist?list=PLtest')]
+		try:
+			pipe = pipeline.pipeline([pipeline.stage('resolve', lambda vid: vid, 2), \
+				pipeline.stage('download', download)])
+			done = [it.value.id for it in pipe.run(ytdl._pending([0]))]
+		finally: ytdl.pytube, ytdl.sources = saved
+		self.assertEqual(done, [v * 11 for v in 'abcd'])
+		self.assertLess(events.index('download a'), events.index('page 2'))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import tempfile
+import shutil
+import struct
+import wave
+import math
+import os
+import subprocess
+import postproc
+
+def _sine(path, seconds=0.5, rate=8000):
+	with wave.open(path, 'wb') as w:
+		w.setnchannels(1); w.setsampwidth(2); w.setframerate(rate)
+		w.writeframes(b''.join(struct.pack('<h', int(8000 * math.sin(i / 10))) for i in range(int(seconds * rate))))
+
+class TestSum_postproc(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.TemporaryDirectory()
+		self.src = os.path.join(self.dir.name, 'song.wav')
+		_sine(self.src)
+		self.encoder = postproc.ENCODER
+
+	def tearDown(self):
+		postproc.ENCODER = self.encoder
+		self.dir.cleanup()
+
+	def test_missing_encoder(self):
+
+		postproc.ENCODER = 'ytdl-no-such-encoder'
+		dst = os.path.join(self.dir.name, 'song.mp3')
+		self.assertRaises(postproc.PostprocessError, postproc.transcode_audio, self.src, dst)
+		self.assertTrue(os.path.exists(self.src))
+		self.assertFalse(os.path.exists(dst))
+
+	def test_unknown_codec(self):
+
+		self.assertRaises(postproc.PostprocessError, postproc.transcode_audio, self.src, 'x.xyz', 'xyz')
+
+	@unittest.skipUnless(shutil.which(postproc.ENCODER), 'encoder is not installed')
+	def test_pool(self):
+
+		p = postproc.pool(2)
+		try:
+			jobs = []
+			for i, codec in enumerate(['mp3', 'flac']):
+				src = os.path.join(self.dir.name, f'{i}.wav')
+				shutil.copy(self.src, src)
+				dst = os.path.join(self.dir.name, f'{i}.{postproc.extension(codec)}')
+				jobs.append(p.submit(postproc.transcode_audio, src, dst, codec, '64k'))
+			mp3, flac = [j.result() for j in jobs]
+		finally:
+			p.shutdown()
+
+		with open(flac, 'rb') as f: self.assertEqual(f.read(4), b'fLaC')
+		with open(mp3, 'rb') as f: head = f.read(3)
+		self.assertTrue(head == b'ID3' or head[0] == 0xff)
+		self.assertFalse(os.path.exists(os.path.join(self.dir.name, '0.wav')))
+
+	def test_container(self):
+
+		self.assertEqual(postproc.container('mp4', 'mp4'), 'mp4')
+		self.assertEqual(postproc.container('webm', 'webm'), 'webm')
+		self.assertEqual(postproc.container('mp4', 'webm'), 'mkv')
+
+	@unittest.skipUnless(shutil.which(postproc.ENCODER), 'encoder is not installed')
+	def test_mux(self):
+
+		video = os.path.join(self.dir.name, 'video.f137.mp4')
+		audio = os.path.join(self.dir.name, 'audio.f140.m4a')
+		subprocess.run([postproc.ENCODER, '-loglevel', 'error', '-f', 'lavfi', '-i', \
+			'testsrc=duration=1:size=64x48:rate=5', '-an', video], check=True)
+		postproc.transcode_audio(self.src, audio, 'aac', '64k')
+
+		dst = os.path.join(self.dir.name, 'video.mp4')
+		p = postproc.pool(1)
+		try: self.assertEqual(p.run(postproc.mux, video, audio, dst), dst)
+		finally: p.shutdown()
+		self.assertTrue(os.path.getsize(dst) > 0)
+		self.assertFalse(os.path.exists(video))
+		self.assertFalse(os.path.exists(audio))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import threading
+import tempfile
+import time
+import os
+import ratelimit
+
+class TestSum_ratelimit(unittest.TestCase):
+
+	def test_parse(self):
+
+		self.assertEqual(ratelimit.parse_rate('500'), 500)
+		self.assertEqual(ratelimit.parse_rate('500k'), 500 * 1024)
+		self.assertEqual(ratelimit.parse_rate('20M'), 20 * 1024 * 1024)
+		self.assertEqual(ratelimit.parse_rate('1.5MiB/s'), 1.5 * 1024 * 1024)
+		self.assertIsNone(ratelimit.parse_rate('0'))
+		self.assertRaises(ratelimit.RateError, ratelimit.parse_rate, 'fast')
+
+	def test_bucket(self):
+
+		bucket = ratelimit.token_bucket(100000)
+		start = time.monotonic()
+		for _ in range(10): bucket.consume(5000)
+		elapsed = time.monotonic() - start
+		self.assertGreater(elapsed, 0.5 - ratelimit.BURST_SECONDS - 0.05)
+		self.assertLess(elapsed, 0.7)
+
+	def test_unlimited(self):
+
+		bucket = ratelimit.token_bucket()
+		self.assertEqual(bucket.reserve(1 << 30), 0)
+
+	def test_fair_share(self):
+
+		lim = ratelimit.limiter(total=400000)
+		done = [0, 0]
+		stop = time.monotonic() + 0.6
+
+		def transfer(i):
+			job = lim.job()
+			while time.monotonic() < stop:
+				job(8000)
+				done[i] += 8000
+
+		threads = [threading.Thread(target=transfer, args=(i,)) for i in range(2)]
+		for t in threads: t.start()
+		for t in threads: t.join()
+
+		self.assertLess(abs(done[0] - done[1]), 3 * 8000)
+		self.assertLess(sum(done), 400000 * (0.6 + ratelimit.BURST_SECONDS) + 2 * 8000)
+
+	def test_per_job(self):
+
+		lim = ratelimit.limiter(per_job=50000)
+		job = lim.job()
+		lim.set_rates(None, 100000)
+		self.assertEqual(job.bucket.rate, 100000)
+
+	def test_control_file(self):
+
+		with tempfile.TemporaryDirectory() as d:
+			path = os.path.join(d, 'rate')
+			with open(path, 'w') as f: f.write('2M 256k\n')
+			lim = ratelimit.limiter()
+			control = ratelimit.control_file(path, lim)
+			control.stop()
+			self.assertEqual((lim.total, lim.per_job), (2 << 20, 256 << 10))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+import tempfile
+import errno
+import json
+import time
+import os
+from urllib.error import HTTPError, URLError
+import threading
+import pytube.exceptions
+import fetch
+import retry
+import ytdl
+
+class TestSum_retry(unittest.TestCase):
+
+	def test_classify(self):
+		def http(code): return HTTPError('http://x', code, 'error', {}, None)
+		def wrapped(error):
+			try:
+				try: raise error
+				except Exception as e: raise fetch.FetchError('Unable to download') from e
+			except fetch.FetchError as e: return e
+
+		for error, kind in [
+			(http(429), retry.THROTTLED), (http(403), retry.EXPIRED), (http(500), retry.TRANSIENT),
+			(http(404), retry.UNAVAILABLE), (URLError('refused'), retry.TRANSIENT),
+			(ConnectionResetError(), retry.TRANSIENT), (TimeoutError(), retry.TRANSIENT),
+			(pytube.exceptions.VideoPrivate('x'), retry.UNAVAILABLE),
+			(pytube.exceptions.AgeRestrictedError('x'), retry.UNAVAILABLE),
+			(pytube.exceptions.RegexMatchError('f', 'p'), retry.UNSUPPORTED),
+			(retry.NoStreamError('Resolution: 4320 does not exist.'), retry.UNSUPPORTED),
+			(KeyError('title'), retry.UNKNOWN), (IndexError('list index out of range'), retry.UNKNOWN),
+			(OSError(errno.ENOSPC, 'No space left on device'), retry.LOCAL),
+			(PermissionError(errno.EACCES, 'Permission denied', '/x'), retry.LOCAL),
+			(fetch.FetchError('Range 0-9 ended early'), retry.TRANSIENT),
+			(wrapped(http(429)), retry.THROTTLED), (wrapped(http(410)), retry.UNAVAILABLE),
+			(ValueError('bug'), retry.UNKNOWN),
+		]:
+			self.assertEqual(retry.classify(error), kind, repr(error))
+
+	def test_backoff(self):
+		for attempt in range(10):
+			delay = retry.backoff(attempt)
+			self.assertGreaterEqual(delay, 0)
+			self.assertLessEqual(delay, min(retry.BACKOFF_CAP, retry.BACKOFF_BASE * 2 ** attempt))
+		self.assertLessEqual(retry.backoff(0, cap=0.01), 0.01)
+		throttled = max(retry.backoff(2, retry.THROTTLED) for _ in range(200))
+		self.assertGreater(throttled, retry.BACKOFF_BASE * 4)
+
+	def test_breaker(self):
+		b = retry.breaker(threshold=2, cooldown=0.2)
+		b.failure('a')
+		self.assertEqual(b.delay('a'), 0)
+		b.failure('a')
+		self.assertGreater(b.delay('a'), 0.1)
+		self.assertEqual(b.delay('b'), 0)
+
+		time.sleep(0.25)
+		# One trial goes through, everyone else keeps waiting for its result
+		self.assertEqual(b.delay('a'), 0)
+		self.assertGreater(b.delay('a'), 0)
+		b.success('a')
+		self.assertEqual(b.delay('a'), 0)
+
+	def test_breaker_trial(self):
+		class vid:
+			cancel = None
+			attempts = 0
+		def fails(error):
+			def func(v): raise error
+			return ytdl._retrying('resolve', func)
+		def done(func):
+			result = []
+			t = threading.Thread(target=lambda: result.append(func(vid())), daemon=True)
+			t.start(); t.join(2)
+			return result
+
+		saved = ytdl.breakers, ytdl.retries
+		ytdl.breakers, ytdl.retries = retry.breaker(threshold=1, cooldown=0.05), 0
+		try:
+			for trial in [pytube.exceptions.VideoPrivate('x'), fetch.Cancelled(), ValueError('bug')]:
+				self.assertRaises(ConnectionResetError, fails(ConnectionResetError()), vid())
+				time.sleep(0.06)
+				# The trial ends without a retryable failure, the host must not stay shut
+				self.assertRaises(type(trial), fails(trial), vid())
+				self.assertEqual(done(ytdl._retrying('resolve', lambda v: 'ok')), ['ok'], repr(trial))
+		finally: ytdl.breakers, ytdl.retries = saved
+
+	def test_expired_links(self):
+		class stream:
+			url = 'https://r1.googlevideo.com/videoplayback?sig=old'
+		class vid:
+			id = 'aaaaaaaaaaa'
+			cancel = None
+			attempts = 0
+		class cache:
+			removed = []
+			def remove(self, id): self.removed.append(id)
+		urls = []
+		def download(v):
+			urls.append(v.stream.url)
+			if v.stream.url.endswith('old'): raise HTTPError(v.stream.url, 403, 'Forbidden', {}, None)
+			return v
+		def resolve(v):
+			v.stream = type('fresh', (), {'url': stream.url.replace('old', 'new')})
+			return v
+
+		v = vid(); v.stream = stream
+		saved = ytdl.breakers, ytdl.retries, ytdl.metadata, ytdl.use_cache, ytdl.resolve, ytdl.select, \
+			retry.BACKOFF_BASE
+		b = retry.breaker(threshold=2)
+		ytdl.breakers, ytdl.retries, ytdl.metadata, ytdl.use_cache = b, 2, cache(), True
+		ytdl.resolve, ytdl.select, retry.BACKOFF_BASE = resolve, lambda v: v, 0.01
+		try:
+			ytdl._retrying('download', download)(v)
+			# The refused link is not asked for again and the host stays open
+			self.assertEqual(urls, [stream.url, stream.url.replace('old', 'new')])
+			self.assertEqual(cache.removed, ['aaaaaaaaaaa'])
+			self.assertEqual(b.delay('r1.googlevideo.com'), 0)
+
+			# A host refusing fresh links too is backed off and shut by its breaker
+			refreshed = []
+			ytdl.resolve = lambda v: refreshed.append(v) or v
+			v, urls[:] = vid(), []; v.stream = stream
+			self.assertRaises(HTTPError, ytdl._retrying('download', download), v)
+			self.assertEqual(len(urls), 3)
+			self.assertEqual(len(refreshed), 2)
+			self.assertGreater(b.delay('r1.googlevideo.com'), 0)
+		finally: ytdl.breakers, ytdl.retries, ytdl.metadata, ytdl.use_cache, ytdl.resolve, ytdl.select, \
+			retry.BACKOFF_BASE = saved
+
+	def test_failed_video_track(self):
+		def track(itag): return type('stream', (), {'itag': itag, 'subtype': 'mp4'})
+		class vid:
+			stream, audio, audio_only, cancel = track(137), track(140), False, None
+			output = '/tmp/v.mp4'
+		audio = []
+		def download_stream(v, stream, path, throttle=None):
+			if stream is v.stream: time.sleep(0.05); raise ConnectionResetError()
+			try:
+				while True: throttle(1); time.sleep(0.01)
+			except fetch.Cancelled: audio.append('stopped'); raise
+
+		saved = ytdl._download_stream, ytdl.rate_limiter, ytdl.rate_file
+		ytdl._download_stream, ytdl.rate_file = download_stream, None
+		ytdl.rate_limiter = type('limiter', (), {'active': False})
+		try: self.assertRaises(ConnectionResetError, ytdl.download, vid())
+		finally: ytdl._download_stream, ytdl.rate_limiter, ytdl.rate_file = saved
+		# The audio track is done before the failure reaches a retry
+		self.assertEqual(audio, ['stopped'])
+
+	def test_report(self):
+		report = retry.failure_report()
+		report.add('u1', 'resolve', retry.UNAVAILABLE, 'private video')
+		report.add('u2', 'download', retry.THROTTLED, 'HTTP Error 429', 5)
+		report.add('u3', 'resolve', retry.UNAVAILABLE, 'removed')
+
+		self.assertEqual(len(report), 3)
+		self.assertEqual(report.counts(), {retry.UNAVAILABLE: 2, retry.THROTTLED: 1})
+		self.assertTrue(str(report).startswith('3 failed: 2 unavailable, 1 throttled'))
+		with tempfile.TemporaryDirectory() as d:
+			path = os.path.join(d, 'failed.jsonl')
+			report.save(path)
+			with open(path) as f: lines = [json.loads(line) for line in f]
+		self.assertEqual(lines[1], {'url': 'u2', 'stage': 'download', 'kind': retry.THROTTLED, \
+			'message': 'HTTP Error 429', 'attempts': 5})
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import subprocess
+import compileall
+import time
+import sys
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Extra wall time allowed on top of a bare interpreter start, -h takes under
+# 30 ms of it, the rest is room for a busy machine
+STARTUP_BUDGET = 0.05
+RUNS = 9
+HEAVY = ['pytube', 'http.client', 'ssl', 'json', 'socket', 'subprocess', 'multiprocessing', \
+	'concurrent.futures', 'inspect', 'lib2to3', 'threading', 'enum', 're', 'fetch', 'retry', \
+	'cache', 'links', 'postproc', 'ratelimit', 'metrics', 'formats']
+
+def _wall(*argv) -> float:
+	"""
+	Median wall time ytdl.py argv takes over a bare interpreter start. The
+	two are run in turns so load on the machine slows both alike.
+	"""
+	def run(args):
+		start = time.perf_counter()
+		subprocess.run([sys.executable] + args, cwd=HERE, \
+			stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+		return time.perf_counter() - start
+	extra = [run(['ytdl.py', *argv]) - run(['-c', 'pass']) for _ in range(RUNS)]
+	return sorted(extra)[RUNS // 2]
+
+class TestSum_startup(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		compileall.compile_dir(HERE, maxlevels=0, quiet=1)
+
+	def imported(self, *argv):
+		code = 'import sys\nsys.argv = ["ytdl.py", *sys.argv[1:]]\nimport ytdl, options\n' + \
+			'try: options.exec()\nexcept SystemExit: pass\n' + \
+			f'print(" ".join(m for m in {HEAVY!r} if m in sys.modules))'
+		result = subprocess.run([sys.executable, '-c', code] + list(argv), cwd=HERE, \
+			stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+		return result.stdout.split()
+
+	def test_lazy_imports(self):
+
+		self.assertEqual(self.imported('-h'), [])
+		self.assertEqual(self.imported('--no-such-option'), [])
+		self.assertEqual(self.imported('-j', 'x'), [])
+
+	def test_budget(self):
+
+		for argv in [['-h'], ['--no-such-option']]:
+			extra = _wall(*argv)
+			self.assertLess(extra, STARTUP_BUDGET, \
+				f'ytdl.py {" ".join(argv)} took {extra*1000:.0f} ms over the interpreter')
+
+
+if __name__ == "__main__":
+	unittest.main()
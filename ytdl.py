@@ -1,55 +1,181 @@
-import pytube
-from pytube.cli import on_progress
+import itertools
+import time
 import sys
+import stat
 import os
 import options
+import lazy
+
+# Loaded on first use, "-h" and argument errors never import them
+fetch = lazy.module('fetch')
+cache = lazy.module('cache')
+links = lazy.module('links')
+postproc = lazy.module('postproc')
+ratelimit = lazy.module('ratelimit')
+metrics = lazy.module('metrics')
+formats = lazy.module('formats')
+retry = lazy.module('retry')
+pytube = lazy.module('pytube')
+httppool = lazy.module('httppool')
+pipeline = lazy.module('pipeline')
+playlist = lazy.module('playlist')
+archive = lazy.module('archive')
+threading = lazy.module('threading')
+datetime = lazy.module('datetime')
+urls = lazy.module('urllib.parse')
+daemon = lazy.module('daemon')
+jobqueue = lazy.module('jobqueue')
+naming = lazy.module('naming')
+
+# Everything a download imports beyond the startup path, for --import-profile
+DOWNLOAD_MODULES = ['fetch', 'cache', 'links', 'postproc', 'ratelimit', 'metrics', 'formats', 'retry', \
+    'pytube', 'httppool', 'pipeline', 'playlist', 'archive', 'threading', \
+    'datetime', 'json', 'shutil', 'gzip', 'base64', 'concurrent.futures', 'multiprocessing', 'subprocess', \
+    'naming', 'string']
+IMPORT_PROFILE_LINES = 20
 
 options.SHORT_JUST = 15
-options.LONG_JUST = 20
+options.LONG_JUST = 25
 options.USAGE_NOTE = 'usage: python3 ytdl.py [options]'
 options.HELP_NOTE = 'Use: "python3 ytdl.py -h" for help.'
 
-links = []
+sources = []
+synced = []
 audio_only = False
+# Defaults of the helper modules are filled in by _setup
+audio_codec = None
+audio_bitrate = None
+post_pool = None
+use_adaptive = False
+rate_limiter = None
+total_rate = None
+job_rate = None
+rate_file = None
 vid_resolution = 'high'
+vid_format = None
 vid_target = '.'
+# naming.template of -o, the default one is made by _start
+output_template = None
+names = None
+# '-' for stdout or the path of a FIFO, the media is streamed there instead of saved
+stream_to = None
+stream_fd = None
+resolve_workers = 2
+download_workers = 1
+post_workers = os.cpu_count() or 1
+segments = None
+chunk_size = None
+use_cache = True
+refresh_cache = False
+metadata = None
+done_archive = None
+stats = None
+metrics_file = None
+serve_address = None
+connect_address = None
+status_query = None
+cancel_ids = []
+queue_path = None
+resume_queue = False
+batch_queue = None
+retries = None
+breakers = None
+failures = None
+failure_file = None
+
+# Options of the process that downloads, by long name, a daemon keeps its own
+_RUN_SETTINGS = {'jobs': 'download_workers', 'resolve-workers': 'resolve_workers', \
+    'post-workers': 'post_workers', 'segments': 'segments', 'chunk-size': 'chunk_size', \
+    'no-cache': 'use_cache', 'refresh': 'refresh_cache', 'limit-rate': 'total_rate', \
+    'per-job-rate': 'job_rate', 'rate-file': 'rate_file', 'retries': 'retries', \
+    'metrics-file': 'metrics_file', 'queue': 'queue_path'}
+_run_defaults = {name: globals()[name] for name in _RUN_SETTINGS.values()}
+
+def _run_options() -> list:
+    """
+    Options given that only change the process running the downloads.
+    """
+    given = [f'--{long}' for long, name in _RUN_SETTINGS.items() if globals()[name] != _run_defaults[name]]
+    if 'httppool' in sys.modules and httppool.default_pool.per_host != httppool.DEFAULT_PER_HOST:
+        given.append('--host-connections')
+    return given
 
-def rename_file(name):
-    name = name.replace(' ', '-')
-    for char in '!@#$%^&*()+=<>,.?/\'\"\\|{}[]~`':
-        name = name.replace(char, '')
-    return name
+def _youtube():
+    """
+    Return pytube with its metadata and media requests sent through the
+    keep-alive pool.
+    """
+    if pytube.request._execute_request is not httppool.execute_request:
+        pytube.request._execute_request = httppool.execute_request
+    return pytube
 
 @options.option('a', 'audio')
 def set_audio():
-    """Set audio only mode (.mp3 files)"""
+    """HELP: Download audio only and encode it (mp3 by default)"""
     set_resolution_low()
     global audio_only
     audio_only = True
 
+def _playlist_url(link):
+    link = link.replace('\"', '').replace("https://", '')
+    start = link.index('list=')
+    endl = start
+    while endl < len(link):
+        if link[endl] in ['&', '#']:
+            break
+        endl += 1
+    pllst = link[start:endl]
+    return link[:link.index('?')+1]+pllst
+
+class SourceError(ValueError): pass
+
+def _playlist_links(url):
+    # Pages are fetched only as the pipeline asks for more links
+    try:
+        yield from pytube.Playlist(url).url_generator()
+    except Exception as e:
+        raise SourceError(f"Unable to set playlist: {e}") from e
+
+@options.option('x', 'audio-format')
+def set_audio_format(codec):
+    """HELP: Encode audio to mp3, aac, opus, vorbis, flac or wav"""
+    if codec not in postproc.CODECS:
+        sys.exit(f"Unknown audio format: {codec}")
+    set_audio()
+    global audio_codec
+    audio_codec = codec
+
+@options.option('b', 'audio-bitrate')
+def set_audio_bitrate(rate):
+    """HELP: Set audio bitrate, e.g. 128k"""
+    global audio_bitrate
+    audio_bitrate = rate
+
 @options.option('p', 'playlist')
 def set_playlist(link):
     """HELP: Download a whole playlist"""
-    link = link.replace('\"', '').replace("https://", '')
     try:
-        start = link.index('list=')
-        endl = start
-        while endl < len(link):
-            if link[endl] in ['&', '#']:
-                break
-            endl += 1
-        pllst = link[start:endl]
-        link = link[:link.index('?')+1]+pllst
-        p = pytube.Playlist(link)
-        links.extend(list(p.video_urls))
+        url = _playlist_url(link)
     except Exception as e:
         sys.exit(f"Unable to set playlist: {e}")
+    sources.append(_playlist_links(url))
+
+@options.option('y', 'sync')
+def set_sync(link):
+    """HELP: Download only new videos of a playlist"""
+    try:
+        result = playlist.sync(_youtube().Playlist(_playlist_url(link)))
+    except Exception as e:
+        sys.exit(f"Unable to sync playlist: {e}")
+    print(result)
+    sources.append(result.urls)
+    synced.append(result)
     
 @options.option('l', 'low')
 def set_resolution_low():
     """HELP: Get lowest video resolution"""
-    global resolution
-    resolution = 'low'
+    global vid_resolution
+    vid_resolution = 'low'
 
 @options.option('r', 'res')
 def set_resolution(resolution):
@@ -57,57 +183,822 @@ def set_resolution(resolution):
     global vid_resolution
     vid_resolution = resolution
 
+@options.option('F', 'format')
+def set_format(selector):
+    """HELP: Choose streams, e.g. best[height<=720]/bestaudio"""
+    global vid_format
+    try: vid_format = formats.compile(selector.replace('\"', '')).text
+    except formats.FormatError as e: sys.exit(f"Format: {e}")
+
+@options.option('d', 'dash')
+def set_adaptive():
+    """HELP: Download separate video and audio and mux them"""
+    global use_adaptive
+    use_adaptive = True
+
 @options.option('t', 'target')
 def set_target(path):
     """HELP: Set the target"""
     global vid_target
     vid_target = path.replace('\"', '')
 
+@options.option('o', 'output')
+def set_output(template):
+    """HELP: Name files by a template, e.g. {channel}/{title}-{id}.{ext}, - for stdout"""
+    global output_template, stream_to
+    template = template.replace('\"', '')
+    if template == '-':
+        stream_to = '-'; return
+    try: output_template = naming.template(template)
+    except naming.TemplateError as e: sys.exit(f"Output: {e}")
+
+@options.option('O', 'fifo')
+def set_fifo(path):
+    """HELP: Stream the media into a named pipe, created if missing"""
+    global stream_to
+    stream_to = path.replace('\"', '')
+
 @options.option('s', 'source')
 def set_source(link):
     """HELP: Set the source link"""
     link = link.replace('\"', '').replace("https://", '')
-    links.append(link)
+    sources.append((link,))
+
+def _count(long, value):
+    try: count = int(value)
+    except ValueError: count = 0
+    if count < 1:
+        sys.exit(f"--{long} expects a positive number, got: {value}")
+    return count
+
+@options.option('j', 'jobs')
+def set_jobs(n):
+    """HELP: Set number of parallel downloads"""
+    global download_workers
+    download_workers = _count('jobs', n)
+
+@options.option('R', 'resolve-workers')
+def set_resolve_workers(n):
+    """HELP: Set number of parallel metadata lookups"""
+    global resolve_workers
+    resolve_workers = _count('resolve-workers', n)
+
+@options.option('P', 'post-workers')
+def set_post_workers(n):
+    """HELP: Set number of parallel post-processing jobs"""
+    global post_workers
+    post_workers = _count('post-workers', n)
+
+@options.option('S', 'segments')
+def set_segments(n):
+    """HELP: Set number of connections per download"""
+    global segments
+    segments = _count('segments', n)
+
+@options.option('K', 'chunk-size')
+def set_chunk_size(size):
+    """HELP: Set receive buffer size, e.g. 256k"""
+    global chunk_size
+    try: chunk_size = int(ratelimit.parse_rate(size) or 0)
+    except ratelimit.RateError: chunk_size = 0
+    if chunk_size < 1:
+        sys.exit(f"--chunk-size expects a size like 64k or 1M, got: {size}")
+
+@options.option('N', 'no-cache')
+def set_no_cache():
+    """HELP: Do not read or write the metadata cache"""
+    global use_cache
+    use_cache = False
+
+@options.option('U', 'refresh')
+def set_refresh():
+    """HELP: Fetch metadata again and update the cache"""
+    global refresh_cache
+    refresh_cache = True
+
+@options.option('A', 'archive')
+def set_archive(path):
+    """HELP: Skip and record downloads in an archive file"""
+    global done_archive
+    try: done_archive = archive.archive(path.replace('\"', ''))
+    except archive.ArchiveError as e: sys.exit(str(e))
+
+def _rate(long, value):
+    try: return ratelimit.parse_rate(value)
+    except ratelimit.RateError: sys.exit(f"--{long} expects a rate like 500k or 20M, got: {value}")
+
+@options.option('L', 'limit-rate')
+def set_limit_rate(rate):
+    """HELP: Limit total download rate, e.g. 20M"""
+    global total_rate
+    total_rate = _rate('limit-rate', rate)
+
+@options.option('J', 'per-job-rate')
+def set_per_job_rate(rate):
+    """HELP: Limit download rate of each video"""
+    global job_rate
+    job_rate = _rate('per-job-rate', rate)
+
+@options.option('C', 'rate-file')
+def set_rate_file(path):
+    """HELP: Read rate limits from a file while running"""
+    global rate_file
+    rate_file = path.replace('\"', '')
+
+@options.option('H', 'host-connections')
+def set_host_connections(n):
+    """HELP: Set max open connections per host"""
+    count = _count('host-connections', n)
+    # pytube's OTF download holds two requests to one host at once
+    if count < 2: sys.exit("--host-connections needs at least 2 connections")
+    httppool.default_pool.set_per_host(count)
+
+@options.option('M', 'metrics-file')
+def set_metrics_file(path):
+    """HELP: Write metrics to a file (JSON or .prom)"""
+    global metrics_file
+    metrics_file = path.replace('\"', '')
+
+@options.option('q', 'queue')
+def set_queue(path=''):
+    """HELP: Keep the batch in a queue file that survives crashes"""
+    global queue_path
+    queue_path = path.replace('\"', '')
+
+@options.option('Z', 'resume-queue')
+def set_resume_queue(path=''):
+    """HELP: Continue the batch of a queue file"""
+    global resume_queue
+    resume_queue = True
+    set_queue(path)
+
+@options.option('T', 'retries')
+def set_retries(n):
+    """HELP: Set retries of network failures per video"""
+    global retries
+    try: retries = int(n)
+    except ValueError: retries = -1
+    if retries < 0: sys.exit(f"--retries expects a number, got: {n}")
+
+@options.option('E', 'failure-report')
+def set_failure_report(path):
+    """HELP: Write the videos that failed to a file (JSON lines)"""
+    global failure_file
+    failure_file = path.replace('\"', '')
+
+@options.option('D', 'serve')
+def set_serve(address=''):
+    """HELP: Run as a daemon taking jobs on a socket or localhost:port"""
+    global serve_address
+    serve_address = address.replace('\"', '')
+
+@options.option('c', 'connect')
+def set_connect(address=''):
+    """HELP: Hand the downloads to a running daemon"""
+    global connect_address
+    connect_address = address.replace('\"', '')
+
+@options.option('Q', 'status')
+def set_status(job=''):
+    """HELP: Show the jobs of a running daemon"""
+    global status_query
+    status_query = job
+
+@options.option('X', 'cancel')
+def set_cancel(job):
+    """HELP: Cancel a job of a running daemon"""
+    cancel_ids.append(job)
+
+def _import_times(code:str) -> list:
+    import subprocess
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], \
+        cwd=os.path.dirname(os.path.abspath(__file__)), \
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Unable to profile imports: {result.stderr.strip().splitlines()[-1:]}")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line: continue
+        own, total, name = line[len('import time:'):].split('|')
+        times.append((int(own), int(total), name.rstrip()))
+    return times
+
+@options.option('I', 'import-profile')
+def show_import_profile():
+    """HELP: Show import time of the modules a download needs"""
+    startup = sum(own for own, _, _ in _import_times('import ytdl'))
+    times = _import_times('import ytdl, ' + ', '.join(DOWNLOAD_MODULES))
+    print(f"{'self ms':>8} {'total ms':>9}  module")
+    for own, total, name in sorted(times, reverse=True)[:IMPORT_PROFILE_LINES]:
+        print(f"{own/1000:8.1f} {total/1000:9.1f}  {name.strip()}")
+    everything = sum(own for own, _, _ in times)
+    print(f"startup (-h, argument errors): {startup/1000:.1f} ms, " + \
+        f"download path: {everything/1000:.1f} ms, {len(times)} modules")
+    sys.exit()
 
 @options.option('f', 'file')
 def set_fromfile(path):
-    """HELP: Set file source for links"""
-    with open(path, 'r') as f:
-        while l := f.readline():
-            links.append(l)
+    """HELP: Set file source for links ('-' for stdin)"""
+    try: stream = links.open_source(path.replace('\"', ''))
+    except links.LinkError as e: sys.exit(str(e))
+    sources.append(links.read(stream, lambda number, line: \
+        print(f"{path}:{number}: not a video link: {line}", file=sys.stderr)))
+
+class video:
+    def __init__(self, url:str, resolution:str=None, as_audio:bool=None, target:str=None, \
+        format:str=None) -> None:
+        self.url:str = url
+        self.id:str = links.video_id(url)
+        self.resolution:str = resolution or vid_resolution
+        self.audio_only:bool = audio_only if as_audio is None else as_audio
+        self.target:str = target or vid_target
+        self.format:str = format or vid_format
+        # What the options of the run ask for, a daemon job can bring its own
+        self.template:'naming.template' = output_template
+        self.codec:str = audio_codec
+        self.bitrate:str = audio_bitrate
+        self.adaptive:bool = use_adaptive
+        self.cancel:'threading.Event' = None
+        self.queued:int = None
+        self.attempts:int = 0
+        self.title:str = None
+        self.meta:dict = {}
+        self.streams:'pytube.StreamQuery' = None
+        self.stream:'pytube.Stream' = None
+        self.audio:'pytube.Stream' = None
+        self.output:str = None
+        self.path:str = None
+        self.audio_path:str = None
+
+def _stream_entry(stream:'pytube.Stream') -> dict:
+    entry = {
+        'itag': stream.itag, 'url': stream.url, 'mime': stream.mime_type,
+        'mimeType': f'{stream.mime_type}; codecs="{", ".join(stream.codecs)}"',
+        # The size the manifest states, 0 when unknown: pytube's filesize would ask the server
+        'resolution': stream.resolution, 'abr': stream.abr, 'filesize': stream._filesize,
+        'bitrate': stream.bitrate, 'is_otf': stream.is_otf,
+    }
+    if hasattr(stream, 'fps'): entry['fps'] = stream.fps
+    return entry
+
+def _expiration(stream:'pytube.Stream') -> float:
+    try: return stream.expiration.replace(tzinfo=datetime.timezone.utc).timestamp()
+    except (IndexError, KeyError, ValueError): return None
+
+# Template field -> YouTube attribute, read from pages fetched for the streams anyway
+_META = {'channel': 'author', 'channel_id': 'channel_id', 'upload_date': 'publish_date'}
+
+def _meta(yt) -> dict:
+    meta = {}
+    for field, name in _META.items():
+        # A page pytube cannot parse leaves the field empty, not the video
+        try: meta[field] = getattr(yt, name, None)
+        except Exception: meta[field] = None
+    if meta['upload_date'] is not None: meta['upload_date'] = meta['upload_date'].strftime('%Y%m%d')
+    return meta
+
+def _extract(vid) -> dict:
+    yt = _youtube().YouTube(links.watch_url(vid.id))
+    streams = yt.streams
+    entry = {'title': yt.title, 'length': yt.length, 'meta': _meta(yt), \
+        'streams': [_stream_entry(s) for s in streams]}
+    if use_cache:
+        expires = [e for e in map(_expiration, streams) if e is not None]
+        metadata.put(vid.id, entry, min(expires, default=None))
+    return entry
+
+def resolve(vid):
+    if vid.id is None:
+        raise retry.NoStreamError(f"Not a video link: {vid.url}")
+    entry = metadata.get(vid.id) if use_cache and not refresh_cache else None
+    # Entries cached before templates existed lack what the template asks for
+    if entry is None or ('meta' not in entry and stream_to is None and vid.template.fields & set(_META)):
+        entry = _extract(vid)
+    vid.title = entry['title']
+    vid.meta = dict(entry.get('meta') or {}, length=entry['length'])
+    monostate = pytube.monostate.Monostate(None, None, title=entry['title'], duration=entry['length'])
+    vid.streams = pytube.StreamQuery([pytube.Stream(dict(s, contentLength=s['filesize']), \
+        monostate) for s in entry['streams']])
+    return vid
+
+def _format(vid) -> str:
+    """
+    Format selector doing what -r, -l, -a and -d ask for.
+    """
+    if vid.audio_only: return 'bestaudio[ext=mp4]'
+    if vid.resolution in ['high', 'low']:
+        kind = 'best' if vid.resolution == 'high' else 'worst'
+        single, pair = f'{kind}[ext=mp4]', f'{kind}video+bestaudio'
+        return f'{pair}/{single}' if vid.adaptive else single
+    height = vid.resolution.rstrip('p')
+    single, pair = f'best[ext=mp4][height={height}]', f'bestvideo[height={height}]+bestaudio'
+    # Progressive streams stop at 720p, above that only DASH pairs exist
+    return f'{pair}/{single}' if vid.adaptive else f'{single}/{pair}'
+
+def select(vid):
+    try: chooser = formats.compile(vid.format or _format(vid))
+    except formats.FormatError: chooser = None
+    vid.stream, vid.audio = chooser.select(vid.streams) if chooser else (None, None)
+    if vid.stream is None:
+        raise retry.NoStreamError(f"No stream matches format: {vid.format}" if vid.format \
+            else "Resolution: " + vid.resolution + " does not exist.")
+    if vid.audio_only and vid.audio is not None:
+        vid.stream, vid.audio = vid.audio, None
+    if stream_to is None: vid.output = _output(vid)
+    elif vid.audio is not None or vid.stream.is_otf:
+        raise retry.NoStreamError("Only single streams can be streamed, DASH pairs and OTF streams need a file")
+    return vid
+
+def _extension(vid) -> str:
+    if vid.audio_only: return postproc.extension(vid.codec)
+    if vid.audio is not None: return postproc.container(vid.stream.subtype, vid.audio.subtype)
+    return vid.stream.subtype
+
+def _output(vid) -> str:
+    """
+    Final path of vid from the output template, unique in its directory.
+    """
+    stream = vid.stream
+    values = dict(vid.meta, title=vid.title, id=vid.id, ext=_extension(vid), \
+        resolution=stream.resolution, itag=stream.itag)
+    path = os.path.join(vid.target, vid.template.render(values))
+    if 'id' in vid.template.fields:
+        # The name itself tells videos apart
+        same = lambda existing: True
+    elif vid.audio_only or vid.audio is not None: same = None
+    else:
+        # Only a plain download can be told apart from another file by its size
+        same = lambda existing: bool(stream._filesize) and os.path.getsize(existing) == stream._filesize
+    return names.claim(path, same, owner=vid.id)
+
+def _track(vid, stream) -> str:
+    return f"{os.path.splitext(vid.output)[0]}.f{stream.itag}.{stream.subtype}"
+
+def _download_stream(vid, stream, path, throttle=None) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # An unknown size is probed by fetch, for the chosen stream only
+    size = stream._filesize or None
+    with stats.transfer(vid.title, size) as progress:
+        if stream.is_otf:
+            # OTF streams are only served as numbered sequences, leave them to pytube
+            def on_progress(s, chunk, remaining):
+                if throttle: throttle(len(chunk))
+                progress(len(chunk))
+            stream._monostate = pytube.monostate.Monostate(on_progress, None, title=vid.title)
+            return stream.download(*os.path.split(path))
+        return fetch.fetch(stream.url, path, size, segments, progress, \
+            key=f'{vid.id}:{stream.itag}', throttle=throttle, chunk_size=chunk_size)
+
+def _cancellable(throttle, cancel):
+    def check(size):
+        if cancel.is_set(): raise fetch.Cancelled("Download cancelled")
+        if throttle: throttle(size)
+    return check
+
+def download(vid):
+    stream = vid.stream
+    throttle = rate_limiter.job() if rate_limiter.active or rate_file else None
+    if vid.cancel is not None:
+        throttle = _cancellable(throttle, vid.cancel)
+    if vid.audio is None:
+        # Plain videos are written under their final name, nothing is moved afterwards
+        path = _track(vid, stream) if vid.audio_only else vid.output
+        vid.path = _download_stream(vid, stream, path, throttle=throttle)
+        return vid
+
+    # Both DASH tracks are fetched at the same time and muxed afterwards
+    audio = {}
+    # The audio track stops with a failed video track, a retry must not run beside it
+    stop = threading.Event()
+    def fetch_audio():
+        try: audio['path'] = _download_stream(vid, vid.audio, _track(vid, vid.audio), \
+            throttle=_cancellable(throttle, stop))
+        except Exception as e: audio['error'] = e
+    t = threading.Thread(target=fetch_audio, daemon=True)
+    t.start()
+    try: vid.path = _download_stream(vid, stream, _track(vid, stream), throttle=throttle)
+    except BaseException:
+        stop.set(); raise
+    finally: t.join()
+    if 'error' in audio: raise audio['error']
+    vid.audio_path = audio['path']
+    return vid
+
+def postprocess(vid):
+    if vid.audio_only:
+        vid.path = post_pool.run(postproc.transcode_audio, vid.path, vid.output, vid.codec, vid.bitrate)
+    elif vid.audio_path:
+        vid.path = post_pool.run(postproc.mux, vid.path, vid.audio_path, vid.output)
+    return vid
+
+def _start_stream() -> None:
+    """
+    Keep the real stdout for the media and send everything printed to
+    stderr, or create the FIFO.
+    """
+    global stream_fd
+    if stream_to == '-':
+        sys.stdout.flush()
+        stream_fd = os.dup(sys.stdout.fileno())
+        # Child processes inherit this too, nothing else can end up in the stream
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        return
+    try: os.mkfifo(stream_to)
+    except FileExistsError: pass
+    except OSError as e: sys.exit(f"FIFO: {e}")
+    if not stat.S_ISFIFO(os.stat(stream_to).st_mode): sys.exit(f"FIFO: {stream_to} is not a named pipe")
+
+def stream(vid):
+    """
+    Write the stream of vid to stdout, or to the FIFO opened once per
+    video so its reader sees every video end.
+    """
+    throttle = rate_limiter.job() if rate_limiter.active or rate_file else None
+    # Blocks until a reader opens the FIFO
+    fd = stream_fd if stream_fd is not None else os.open(stream_to, os.O_WRONLY)
+    try:
+        size = vid.stream._filesize or None
+        with stats.transfer(vid.title, size) as progress:
+            fetch.stream(vid.stream.url, fd, size, progress, throttle=throttle, \
+                chunk_size=chunk_size)
+    finally:
+        if fd != stream_fd: os.close(fd)
+    vid.path = stream_to
+    return vid
+
+def _streamed(it) -> bool:
+    """
+    Stream a resolved video, in source order, while later ones resolve.
+    """
+    try: stats.timed('stream', _tracked('download', stream) if batch_queue else stream)(it.value)
+    except BrokenPipeError: sys.exit("The reader closed the stream")
+    except Exception as e:
+        it.error, it.stage = e, 'stream'
+        _failed(it)
+        return False
+    return True
+
+_stage_errors = {
+    'source': lambda e: str(e),
+    'resolve': lambda e: "Unable to set YouTUbe stream",
+    'select': lambda e: str(e),
+    'download': lambda e: "Unable to save the file",
+    'stream': lambda e: "Unable to stream the file",
+    'postprocess': lambda e: str(e) if isinstance(e, postproc.PostprocessError) \
+        else "Unable to save the file",
+}
+
+def _describe(stage:str, error:BaseException) -> str:
+    message = _stage_errors[stage](error)
+    detail = str(error)
+    return message if detail in ['', message] else f"{message}: {detail}"
+
+def _classify(error:BaseException) -> str:
+    kind = retry.classify(error)
+    if kind == retry.UNKNOWN and isinstance(error, postproc.PostprocessError): return retry.LOCAL
+    return kind
+
+# Stages talking to a server, by the host they talk to
+_hosts = {
+    'resolve': lambda vid: 'www.youtube.com',
+    'download': lambda vid: urls.urlsplit(vid.stream.url).hostname,
+}
+
+def _refresh(vid, name:str) -> None:
+    """
+    Drop the cached links of vid, a download gets new ones right away.
+    """
+    if use_cache: metadata.remove(vid.id)
+    if name == 'download': select(resolve(vid))
+
+def _retrying(name:str, func):
+    """
+    Run func again on transient and throttled failures, waiting with
+    backoff and while the circuit breaker of the host is open. Links the
+    host refused are resolved again instead of asked for once more.
+    """
+    host_of = _hosts[name]
+    def run(vid):
+        expired = 0
+        for attempt in itertools.count():
+            host = host_of(vid)
+            breakers.wait(host, vid.cancel)
+            vid.attempts = attempt + 1
+            try: result = func(vid)
+            except fetch.Cancelled: raise
+            except Exception as e:
+                kind = _classify(e)
+                # Fresh links refused as well point at the host, e.g. a blocked address
+                refused = kind == retry.EXPIRED and expired > 0
+                if kind in [retry.EXPIRED, retry.UNAVAILABLE, retry.UNSUPPORTED] and not refused:
+                    # The host answered, only this video or its links are the problem
+                    breakers.success(host)
+                if kind != retry.EXPIRED and kind not in retry.RETRYABLE: raise
+                if kind == retry.EXPIRED: expired += 1
+                if kind in retry.RETRYABLE or refused: breakers.failure(host)
+                if attempt >= retries: raise
+                delay = retry.backoff(attempt, kind)
+                if vid.cancel is None: time.sleep(delay)
+                elif vid.cancel.wait(delay): raise
+                if kind == retry.EXPIRED: _refresh(vid, name)
+                continue
+            finally:
+                # A trial that ended any other way must not hold the host shut
+                breakers.release(host)
+            breakers.success(host)
+            return result
+    return run
+
+_queue_states = {
+    'resolve': 'resolving',
+    'select': 'resolving',
+    'download': 'downloading',
+    'postprocess': 'postprocessing',
+}
+
+def _tracked(name:str, func):
+    def run(vid):
+        if vid.queued is not None: batch_queue.update(vid.queued, _queue_states[name])
+        return func(vid)
+    return run
+
+def _stages() -> list:
+    funcs = {'resolve': resolve, 'select': select, 'download': download, 'postprocess': postprocess}
+    for name, func in funcs.items():
+        if name in _hosts: func = _retrying(name, func)
+        funcs[name] = stats.timed(name, _tracked(name, func) if batch_queue else func)
+    return [
+        pipeline.stage('resolve', funcs['resolve'], resolve_workers),
+        pipeline.stage('select', funcs['select']),
+    ] + ([] if stream_to is not None else [
+        pipeline.stage('download', funcs['download'], download_workers),
+        pipeline.stage('postprocess', funcs['postprocess'], post_workers),
+    ])
+
+def _setup() -> None:
+    """
+    Make the shared state of a run, none of it is needed to parse options.
+    """
+    global audio_codec, audio_bitrate, segments, chunk_size, retries
+    global rate_limiter, metadata, stats, breakers, failures
+    if audio_codec is None: audio_codec = postproc.DEFAULT_CODEC
+    if audio_bitrate is None: audio_bitrate = postproc.DEFAULT_BITRATE
+    if segments is None: segments = fetch.DEFAULT_SEGMENTS
+    if chunk_size is None: chunk_size = fetch.CHUNK_SIZE
+    if retries is None: retries = retry.DEFAULT_RETRIES
+    rate_limiter = ratelimit.limiter(total_rate, job_rate)
+    metadata = cache.metadata_cache()
+    stats = metrics.registry()
+    breakers = retry.breaker()
+    failures = retry.failure_report()
+
+def _start():
+    """
+    Start the shared pools and return the metrics dumper, if any.
+    """
+    global post_pool, output_template, names
+    _youtube()
+    post_pool = postproc.pool(post_workers)
+    if stream_to is None:
+        output_template = output_template or naming.template(naming.DEFAULT_TEMPLATE)
+        names = naming.name_index()
+    if rate_file:
+        ratelimit.control_file(rate_file, rate_limiter, \
+            lambda e: print(f"Rate file: {e}", file=sys.stderr))
+    return metrics.dump(metrics_file, stats, on_error=lambda e: print(e, file=sys.stderr)) \
+        if metrics_file else None
+
+def _stop_dumper(dumper) -> None:
+    if dumper is None: return
+    try: dumper.stop()
+    except metrics.MetricsError as e: print(e, file=sys.stderr)
+
+def _pending(skipped:list):
+    """
+    Yield a video for every new link of the sources, archived ones are
+    counted in skipped[0].
+    """
+    seen = links.id_set()
+    for url in itertools.chain.from_iterable(sources):
+        vid = video(url)
+        if vid.id is not None and not seen.add(vid.id):
+            continue
+        if done_archive is not None and vid.id in done_archive:
+            skipped[0] += 1; continue
+        yield vid
+
+def _queued(skipped:list):
+    """
+    Add the links of the sources to the queue on the way and yield the
+    videos claimed from it, oldest first. Jobs left by earlier runs are
+    only taken with --resume-queue.
+    """
+    urls = itertools.chain.from_iterable(sources)
+    while True:
+        batch = [(links.video_id(url) or url, url) for url in itertools.islice(urls, jobqueue.CLAIM_BATCH)]
+        if batch: batch_queue.add(batch)
+        claimed = batch_queue.claim() if resume_queue else batch_queue.claim(ids=[id for id, _ in batch])
+        if not batch and not claimed: return
+        for seq, _, url in claimed:
+            vid = video(url)
+            vid.queued = seq
+            if done_archive is not None and vid.id in done_archive:
+                batch_queue.update(seq, jobqueue.DONE, done_archive[vid.id][1])
+                skipped[0] += 1; continue
+            yield vid
+
+def _open_queue():
+    global batch_queue
+    try:
+        batch_queue = jobqueue.job_queue(queue_path or jobqueue.DEFAULT_PATH)
+        recovered = batch_queue.recover()
+        # Failures that cannot go away by trying again stay failed
+        if resume_queue: recovered += batch_queue.retry(jobqueue.MAX_ATTEMPTS, retry.RETRYABLE + [retry.EXPIRED])
+    except jobqueue.QueueError as e: sys.exit(str(e))
+    if recovered: print(f"{recovered} unfinished jobs queued again")
+
+def _queue_summary() -> str:
+    counts = batch_queue.counts()
+    left = sum(n for state, n in counts.items() if state not in [jobqueue.DONE, jobqueue.FAILED])
+    return f"Queue {batch_queue.path}: {counts.get(jobqueue.DONE, 0)} done, " + \
+        f"{counts.get(jobqueue.FAILED, 0)} failed, {left} left"
+
+def _close_queue(summary:bool) -> None:
+    try:
+        if summary: print(_queue_summary())
+        batch_queue.close()
+    except jobqueue.QueueError as e: print(e, file=sys.stderr)
+
+def _failure(url:str, stage:str, kind:str, message:str, attempts:int) -> None:
+    failures.add(url, stage, kind, message, attempts)
+    print(f"{url}: {message} [{kind}]", file=sys.stderr)
+
+def _finish(skipped:list) -> None:
+    """
+    Report the run, the playlists are only marked as synced when every
+    failed video is gone for good.
+    """
+    if skipped[0]:
+        print(f"{skipped[0]} already in the archive, skipped")
+    permanent = all(f.kind in [retry.UNAVAILABLE, retry.UNSUPPORTED] for f in failures)
+    for result in synced if permanent else []:
+        try: result.commit()
+        except playlist.SyncError as e: sys.exit(str(e))
+    if not failures: return
+    if failure_file:
+        try: failures.save(failure_file)
+        except OSError as e: print(f"Unable to write failure report: {e}", file=sys.stderr)
+    if synced and not permanent:
+        print("Playlist state not saved, the failed videos are tried again next time", file=sys.stderr)
+    again = batch_queue is not None and any(f.kind in retry.RETRYABLE + [retry.EXPIRED] for f in failures)
+    sys.exit(str(failures) + ("\n--resume-queue tries the transient ones again" if again else ''))
+
+def _job_video(job) -> video:
+    vid = video(job.url, job.resolution, job.audio, job.target, job.format)
+    vid.cancel = job.cancel
+    if job.output: vid.template = naming.template(job.output)
+    if job.audio_format:
+        if job.audio_format not in postproc.CODECS: raise ValueError(f"Unknown audio format: {job.audio_format}")
+        vid.codec = job.audio_format
+    vid.bitrate = job.audio_bitrate or vid.bitrate
+    if job.dash is not None: vid.adaptive = job.dash
+    return vid
+
+def _job_done(job, vid) -> None:
+    job.title, job.path, job.itag = vid.title, vid.path, vid.stream.itag
+    if done_archive is not None:
+        done_archive.add(vid.id, vid.stream.itag, vid.path)
+    print(f"{job.id}. {vid.title}")
+
+def serve():
+    dumper = _start()
+    jobs = daemon.job_server(_stages(), _job_video, _job_done, _describe, _classify)
+    stats.depths = jobs.depths
+    try: server = daemon.listen(serve_address, jobs)
+    except daemon.DaemonError as e: sys.exit(str(e))
+    print(f"Serving jobs on {server.address}")
+    import signal
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit())
+    try: jobs.run()
+    except KeyboardInterrupt: pass
+    finally:
+        daemon.close(server)
+        jobs.stop()
+        _stop_dumper(dumper)
+        post_pool.shutdown()
+
+def _job_line(info:dict) -> str:
+    line = f"{info['id']}. {info['state']:<11} {info['title'] or info['url']}"
+    return line + (f": {info['error']}" if info['error'] else '')
+
+def _collect(conn, number:int, vid, id:str) -> None:
+    try: info = conn.wait(id)
+    except daemon.UnknownJob:
+        _failure(vid.url, 'daemon', retry.UNKNOWN, f"Job {id} was forgotten by the daemon", 1)
+        return
+    if info['state'] != daemon.DONE:
+        _failure(vid.url, 'daemon', info['kind'] or info['state'], \
+            info['error'] or f"Job {info['id']} {info['state']}", 1)
+        return
+    print(f"{number}. {info['title']}")
+    if done_archive is not None:
+        try: done_archive.add(vid.id, info['itag'], info['path'])
+        except archive.ArchiveError as e: sys.exit(str(e))
+
+def _submit(conn) -> None:
+    """
+    Send the links in batches, the next batch runs while the previous one
+    is waited for, so only two batches are ever held here or left
+    unread in the daemon.
+    """
+    skipped = [0]
+    vids = _pending(skipped)
+    number = itertools.count(1)
+    # (number, video, job id) of submitted jobs not reported yet, oldest first
+    left = []
+    try:
+        while True:
+            batch = list(itertools.islice(vids, daemon.SUBMIT_BATCH))
+            if not batch and not left: break
+            waiting = len(left)
+            if batch:
+                jobs = conn.submit([{'url': v.url, 'resolution': v.resolution, 'audio': v.audio_only, \
+                    'target': os.path.abspath(v.target), 'format': v.format, \
+                    'output': v.template.text if v.template else None, 'audio_format': v.codec, \
+                    'audio_bitrate': v.bitrate, 'dash': v.adaptive} for v in batch])
+                left += [(next(number), v, job['id']) for v, job in zip(batch, jobs)]
+            for _ in range(waiting): _collect(conn, *left.pop(0))
+    finally:
+        # Leaving early takes the rest of our jobs back from the daemon
+        for _, _, id in left:
+            try: conn.cancel(id)
+            except daemon.DaemonError: pass
+    _finish(skipped)
+
+def remote():
+    try: conn = daemon.client(connect_address)
+    except daemon.DaemonError as e: sys.exit(str(e))
+    try:
+        for id in cancel_ids:
+            print(_job_line(conn.cancel(id)))
+        if status_query is not None:
+            for info in [conn.status(status_query)] if status_query else conn.status():
+                print(_job_line(info))
+        if connect_address is not None:
+            _submit(conn)
+    except daemon.DaemonError as e:
+        sys.exit(str(e))
+    finally:
+        conn.close()
+
+def _failed(it) -> None:
+    vid, kind = it.source, _classify(it.error)
+    message = _describe(it.stage, it.error)
+    _failure(vid.url, it.stage, kind, message, vid.attempts or 1)
+    if batch_queue is not None:
+        batch_queue.update(vid.queued, jobqueue.FAILED, error=f"{kind}: {message}", kind=kind)
 
 def main():
+    if connect_address is not None and (given := _run_options()):
+        sys.exit(f"{', '.join(given)} only work where the downloads run, give them to --serve instead of --connect")
+    _setup()
+    if stream_to is not None and (serve_address is not None or connect_address is not None):
+        sys.exit("Streaming (--output - or --fifo) does not work with --serve or --connect")
+    if serve_address is not None: serve(); return
+    if connect_address is not None or status_query is not None or cancel_ids: remote(); return
+    if stream_to is not None: _start_stream()
+    if queue_path is not None: _open_queue()
+    dumper = _start()
+    pipe = pipeline.pipeline(_stages())
+    stats.depths = pipe.depths
+    screen = metrics.display(stats) if sys.stdout.isatty() else None
+    report = screen.write if screen else print
+
+    skipped = [0]; completed = False
+    try:
+        for it in pipe.run(_queued(skipped) if batch_queue else _pending(skipped)):
+            if not it.ok and it.stage == 'source':
+                sys.exit(_describe(it.stage, it.error))
+            if not it.ok:
+                # One video failing for good does not stop the rest of the batch
+                _failed(it); continue
+            if stream_to is not None and not _streamed(it): continue
+            report(f"{it.index+1}. {it.value.title}")
+            if batch_queue is not None:
+                batch_queue.update(it.value.queued, jobqueue.DONE, it.value.path)
+            if done_archive is not None:
+                try: done_archive.add(it.value.id, it.value.stream.itag, it.value.path)
+                except archive.ArchiveError as e: sys.exit(str(e))
+        completed = True
+    except jobqueue.QueueError as e:
+        sys.exit(str(e))
+    finally:
+        if screen: screen.stop()
+        _stop_dumper(dumper)
+        if batch_queue is not None: _close_queue(completed)
 
-    for i, url in enumerate(links):
-        try:
-            yt = pytube.YouTube(url, on_progress_callback=on_progress)
-            ys = yt.streams
-        except:
-            sys.exit("Unable to set YouTUbe stream")
-        
-        print(f"{i+1}. {yt.title}".ljust(71, ' '))
-        
-        if vid_resolution == 'high':
-            stream = ys.get_highest_resolution()
-        elif vid_resolution == 'low':
-            stream = ys.get_lowest_resolution()
-        else:
-            try:
-                stream = ys.get_by_resolution(int(vid_resolution))
-            except:
-                sys.exit("Resolution: " + vid_resolution + " does not exist.")            
-
-        if audio_only:
-            stream = ys.get_audio_only()
-
-        try:
-            outfile = stream.download(vid_target)
-            head, tail = os.path.split(outfile)
-            base, ext = os.path.splitext(tail)
-            newfile = os.path.join(head, rename_file(base) + ('.mp3' if audio_only else ext))
-            os.rename(outfile, newfile)
-        except:
-            sys.exit("Unable to save the file")
+    post_pool.shutdown()
+    _finish(skipped)
 
 if __name__ == "__main__":
     options.exec()